@@ -9,32 +9,690 @@ Date: Septembre 2025
 Version: 1.8 - Correction erreur import test instructions
 """
 
-import requests
+import atexit
+import base64
+import csv
+import difflib
+import gzip
 import json
+import math
 import os
 import sys
 import re
+import signal
 import argparse
-from datetime import datetime
-from typing import Dict, Any, Optional, Tuple, List
+import codecs
+import concurrent.futures
+import email.errors
+import email.header
+import email.utils
+import functools
+import hashlib
+import heapq
+import http.client
+import io
+import mimetypes
+import random
+import socket
+import sqlite3
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlencode, urlparse
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, Iterable, Optional, Tuple, List
 import logging
-from dotenv import load_dotenv
-
-# Charger les variables d'environnement
-load_dotenv()
-
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('glpi_automation.log'),
-        logging.StreamHandler()
-    ]
-)
+import logging.handlers
+import queue
+
+
+# Le logging et le .env sont chargés par le point d'entrée (voir configurer_journalisation
+# et charger_configuration) : importer le module n'a aucun effet de bord
 logger = logging.getLogger(__name__)
 
 
+def charger_configuration(override: bool = False):
+    """Charge les variables d'environnement du fichier .env"""
+    from dotenv import load_dotenv
+    load_dotenv(override=override)
+
+
+def lire_entier(variable: str, defaut: int) -> int:
+    """Lit un entier positif, la valeur par défaut si la variable est absente ou invalide"""
+    valeur = os.getenv(variable, '').strip()
+    if not valeur:
+        return defaut
+    if not valeur.isdigit():
+        logger.warning("⚠️  %s invalide (%s), valeur par défaut utilisée: %s", variable, valeur, defaut)
+        return defaut
+    return int(valeur)
+
+
+def lire_decimal(variable: str, defaut: float) -> float:
+    """Lit un nombre positif (ex: 2.5), la valeur par défaut si la variable est absente ou invalide"""
+    valeur = os.getenv(variable, '').strip()
+    if not valeur:
+        return defaut
+    try:
+        nombre = float(valeur.replace(',', '.'))
+    except ValueError:
+        nombre = -1.0
+    if not 0 <= nombre < math.inf:
+        logger.warning("⚠️  %s invalide (%s), valeur par défaut utilisée: %s", variable, valeur, defaut)
+        return defaut
+    return nombre
+
+
+class FormateurJSON(logging.Formatter):
+    """Formate chaque enregistrement en une ligne JSON (champs structurés inclus)"""
+
+    CHAMPS_STRUCTURES = ('ticket_id', 'etape', 'duree_ms')
+
+    def format(self, record: logging.LogRecord) -> str:
+        donnees = {
+            'horodatage': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'niveau': record.levelname,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for champ in self.CHAMPS_STRUCTURES:
+            valeur = getattr(record, champ, None)
+            if valeur is not None:
+                donnees[champ] = valeur
+        if record.exc_info:
+            donnees['exception'] = self.formatException(record.exc_info)
+        return json.dumps(donnees, ensure_ascii=False, default=str)
+
+
+def configurer_journalisation(niveau: Optional[str] = None):
+    """
+    Configure un logging non bloquant : les appels ne font qu'empiler l'enregistrement
+    dans une file, un thread dédié écrit dans la console et le fichier (JSON, avec rotation).
+
+    Variables d'environnement :
+        GLPI_LOG_NIVEAU     DEBUG, INFO (défaut), WARNING...
+        GLPI_LOG_FICHIER    Fichier journal (défaut: glpi_automation.log)
+        GLPI_LOG_FORMAT     json (défaut) ou texte, pour le fichier
+        GLPI_LOG_ROTATION   taille (défaut, GLPI_LOG_TAILLE_MAX octets) ou quotidienne
+        GLPI_LOG_ARCHIVES   Nombre de fichiers archivés conservés (défaut: 5)
+    """
+    niveau = (niveau or os.getenv('GLPI_LOG_NIVEAU', 'INFO')).upper()
+    fichier = os.getenv('GLPI_LOG_FICHIER', 'glpi_automation.log')
+    archives = lire_entier('GLPI_LOG_ARCHIVES', 5)
+
+    if os.getenv('GLPI_LOG_ROTATION', 'taille') == 'quotidienne':
+        handler_fichier = logging.handlers.TimedRotatingFileHandler(
+            fichier, when='midnight', backupCount=archives, encoding='utf-8', delay=True)
+    else:
+        handler_fichier = logging.handlers.RotatingFileHandler(
+            fichier, maxBytes=lire_entier('GLPI_LOG_TAILLE_MAX', 10 * 1024 * 1024),
+            backupCount=archives, encoding='utf-8', delay=True)
+
+    format_texte = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    if os.getenv('GLPI_LOG_FORMAT', 'json') == 'json':
+        handler_fichier.setFormatter(FormateurJSON())
+    else:
+        handler_fichier.setFormatter(format_texte)
+
+    handler_console = logging.StreamHandler()
+    handler_console.setFormatter(format_texte)
+    # Le préchargement GLPI tourne pendant la saisie : ses messages d'information
+    # ne vont qu'au fichier pour ne pas s'intercaler avec les questions
+    handler_console.addFilter(lambda record: record.levelno >= logging.WARNING
+                              or not record.threadName.startswith('prechargement'))
+
+    file_attente = queue.SimpleQueue()
+    ecouteur = logging.handlers.QueueListener(file_attente, handler_console, handler_fichier,
+                                              respect_handler_level=True)
+
+    racine = logging.getLogger()
+    for handler in list(racine.handlers):
+        racine.removeHandler(handler)
+    racine.addHandler(logging.handlers.QueueHandler(file_attente))
+    racine.setLevel(niveau)
+
+    ecouteur.start()
+    # Vide la file avant la sortie du processus
+    atexit.register(ecouteur.stop)
+
+
+class Cassette:
+    """
+    Enregistrement/rejeu des échanges HTTP (fichier JSONL compressé, un échange par ligne).
+
+    Les en-têtes d'authentification ne sont jamais enregistrés et les jetons de session
+    présents dans les réponses sont masqués. Au rejeu, les réponses sont retrouvées par
+    méthode, chemin et paramètres (puis corps de requête) sans tenir compte de l'hôte,
+    et servies avec la durée d'origine multipliée par l'échelle de temps.
+    """
+
+    ENTETES_CONSERVES = ('Content-Type', 'Content-Range', 'Accept-Range', 'ETag', 'Last-Modified')
+    MOTIF_JETONS = re.compile(r'("session_token"\s*:\s*")[^"]*(")')
+
+    def __init__(self, chemin: str, mode: str, echelle_temps: float = 1.0):
+        if mode not in ('enregistrement', 'rejeu'):
+            raise ValueError(f"Mode de cassette invalide: {mode}")
+        self.chemin = chemin
+        self.mode = mode
+        self.echelle_temps = echelle_temps
+        self.verrou = threading.Lock()
+        self.fichier = None
+        self.echanges: Dict[Tuple, List[Dict[str, Any]]] = {}
+        self.positions: Dict[Tuple, int] = {}
+
+        if mode == 'enregistrement':
+            self.fichier = gzip.open(chemin, 'at', encoding='utf-8')
+        else:
+            self._charger()
+
+    @staticmethod
+    def _cle_url(url: str) -> str:
+        """Chemin + paramètres triés, sans schéma ni hôte"""
+        decoupe = urlparse(url)
+        parametres = sorted(parse_qs(decoupe.query, keep_blank_values=True).items())
+        return decoupe.path + ('?' + urlencode(parametres, doseq=True) if parametres else '')
+
+    @staticmethod
+    def _empreinte_corps(corps: Any) -> Optional[str]:
+        if isinstance(corps, str):
+            corps = corps.encode('utf-8')
+        if not isinstance(corps, bytes):
+            return None  # Corps en flux (ex: envoi de fichier) : pas d'empreinte
+        return hashlib.sha1(corps).hexdigest()[:16]
+
+    def _charger(self):
+        """Indexe les échanges de la cassette pour le rejeu"""
+        nombre = 0
+        with gzip.open(self.chemin, 'rt', encoding='utf-8') as f:
+            for ligne in f:
+                if not ligne.strip():
+                    continue
+                echange = json.loads(ligne)
+                for cle in ((echange['methode'], echange['url'], echange.get('empreinte')),
+                            (echange['methode'], echange['url'])):
+                    self.echanges.setdefault(cle, []).append(echange)
+                nombre += 1
+        logger.info("📼 %s échange(s) chargé(s) depuis %s", nombre, self.chemin)
+
+    def enregistrer(self, request, response, duree: float, corps: Optional[bytes] = None):
+        """Ajoute un échange à la cassette (jetons masqués) ; corps : celui d'une réponse lue en flux"""
+        if corps is None:
+            corps = response.content
+        echange = {
+            'methode': request.method,
+            'url': self._cle_url(request.url),
+            'empreinte': self._empreinte_corps(request.body),
+            'statut': response.status_code,
+            'entetes': {k: response.headers[k] for k in self.ENTETES_CONSERVES if k in response.headers},
+            'corps': self.MOTIF_JETONS.sub(r'\1***\2', corps.decode('utf-8', errors='replace')),
+            'duree_ms': round(duree * 1000, 2),
+        }
+        with self.verrou:
+            self.fichier.write(json.dumps(echange, ensure_ascii=False) + '\n')
+
+    def trouver(self, request) -> Dict[str, Any]:
+        """Échange enregistré correspondant à la requête (rejoués dans l'ordre, le dernier est réutilisé)"""
+        url = self._cle_url(request.url)
+        for cle in ((request.method, url, self._empreinte_corps(request.body)), (request.method, url)):
+            candidats = self.echanges.get(cle)
+            if candidats:
+                with self.verrou:
+                    position = self.positions.get(cle, 0)
+                    self.positions[cle] = position + 1
+                return candidats[min(position, len(candidats) - 1)]
+        raise requests.exceptions.ConnectionError(f"Aucun échange enregistré pour {request.method} {url}")
+
+    def fermer(self):
+        if self.fichier:
+            with self.verrou:
+                self.fichier.close()
+                self.fichier = None
+
+
+class CopieFlux:
+    """
+    Corps d'une réponse lue en flux (stream=True), recopié au fil de sa lecture pour la cassette.
+
+    Le client lit la réponse par blocs comme sans cassette ; le corps complet est transmis à
+    `terminer` à la fin de la lecture. Si le client ferme la réponse avant la fin, le reste
+    est lu à la fermeture pour que la cassette contienne la réponse entière.
+    """
+
+    def __init__(self, brut, terminer: Callable[[bytes], None]):
+        self.brut = brut
+        self.terminer = terminer
+        self.blocs: List[bytes] = []
+        self.termine = False
+
+    def __getattr__(self, nom: str):
+        return getattr(self.brut, nom)
+
+    def stream(self, taille: int = 2 ** 16, decode_content: Optional[bool] = None):
+        for bloc in self.brut.stream(taille, decode_content=decode_content):
+            self.blocs.append(bloc)
+            yield bloc
+        self._terminer()
+
+    def _terminer(self):
+        if not self.termine:
+            self.termine = True
+            self.terminer(b''.join(self.blocs))
+
+    def close(self):
+        if not self.termine:
+            try:
+                for bloc in self.brut.stream(2 ** 16, decode_content=True):
+                    self.blocs.append(bloc)
+                self._terminer()
+            except Exception as e:  # Échange interrompu : rien n'est enregistré
+                self.termine = True
+                logger.warning("⚠️  Cassette : réponse %s non enregistrée (%s)", type(e).__name__, e)
+        self.brut.close()
+
+
+class DisjoncteurCircuit:
+    """
+    Disjoncteur d'un backend (GLPI, Perplexity).
+
+    Fermé : les appels passent. Après `seuil_echecs` échecs ou appels trop lents
+    consécutifs, il s'ouvre : les appels échouent immédiatement pendant `delai_reouverture`
+    secondes. Il passe ensuite semi-ouvert : un seul appel sonde est autorisé, qui le
+    referme en cas de succès ou le rouvre en cas d'échec.
+    """
+
+    FERME, OUVERT, SEMI_OUVERT = 'ferme', 'ouvert', 'semi_ouvert'
+
+    def __init__(self, nom: str, seuil_echecs: int = 5, seuil_lenteur: float = 10.0,
+                 delai_reouverture: float = 30.0):
+        self.nom = nom
+        self.seuil_echecs = seuil_echecs
+        self.seuil_lenteur = seuil_lenteur
+        self.delai_reouverture = delai_reouverture
+        self.etat = self.FERME
+        self.echecs_consecutifs = 0
+        self.ouvert_depuis = 0.0
+        self.sonde_en_cours = False
+        self.derniere_erreur = ''
+        self.verrou = threading.Lock()
+        metriques.definir_jauge('glpi_automation_disjoncteur_ouvert', {'backend': nom}, 0)
+
+    def autoriser(self) -> bool:
+        """Indique si un appel peut partir maintenant"""
+        with self.verrou:
+            if self.etat == self.FERME:
+                return True
+            if self.etat == self.OUVERT and time.monotonic() - self.ouvert_depuis >= self.delai_reouverture:
+                self._changer_etat(self.SEMI_OUVERT)
+            if self.etat == self.SEMI_OUVERT and not self.sonde_en_cours:
+                self.sonde_en_cours = True
+                return True
+            return False
+
+    def signaler_succes(self, duree: float):
+        """Enregistre un appel réussi (un appel trop lent compte comme un échec)"""
+        if duree > self.seuil_lenteur:
+            self.signaler_echec(f"appel lent ({duree:.1f} s)")
+            return
+        with self.verrou:
+            self.echecs_consecutifs = 0
+            self.sonde_en_cours = False
+            if self.etat != self.FERME:
+                self._changer_etat(self.FERME)
+
+    def signaler_echec(self, raison: str):
+        """Enregistre un échec et ouvre le disjoncteur si nécessaire"""
+        with self.verrou:
+            self.echecs_consecutifs += 1
+            self.derniere_erreur = raison
+            self.sonde_en_cours = False
+            if self.etat == self.SEMI_OUVERT or self.echecs_consecutifs >= self.seuil_echecs:
+                self.ouvert_depuis = time.monotonic()
+                if self.etat != self.OUVERT:
+                    self._changer_etat(self.OUVERT)
+
+    def _changer_etat(self, etat: str):
+        self.etat = etat
+        metriques.definir_jauge('glpi_automation_disjoncteur_ouvert', {'backend': self.nom},
+                                0 if etat == self.FERME else 1)
+        if etat == self.OUVERT:
+            logger.warning("⚡ Disjoncteur %s ouvert (%s) : appels suspendus %.0f s",
+                           self.nom, self.derniere_erreur, self.delai_reouverture)
+        else:
+            logger.info("🔌 Disjoncteur %s : %s", self.nom, etat)
+
+    @property
+    def ouvert(self) -> bool:
+        with self.verrou:
+            return self.etat == self.OUVERT and time.monotonic() - self.ouvert_depuis < self.delai_reouverture
+
+    def decrire(self) -> Dict[str, Any]:
+        """État exposé dans la CLI, le service et les métriques"""
+        with self.verrou:
+            return {'etat': self.etat, 'echecs_consecutifs': self.echecs_consecutifs,
+                    'derniere_erreur': self.derniere_erreur}
+
+
+disjoncteurs: Dict[str, DisjoncteurCircuit] = {}
+verrou_disjoncteurs = threading.Lock()
+
+
+def obtenir_disjoncteur(nom: str) -> DisjoncteurCircuit:
+    """Disjoncteur partagé d'un backend, créé à la demande (réglages DISJONCTEUR_* du .env)"""
+    with verrou_disjoncteurs:
+        if nom not in disjoncteurs:
+            famille = nom.split(':', 1)[0].upper()
+            disjoncteurs[nom] = DisjoncteurCircuit(
+                nom,
+                seuil_echecs=lire_entier('DISJONCTEUR_SEUIL_ECHECS', 3),
+                seuil_lenteur=lire_decimal(f'DISJONCTEUR_SEUIL_LENTEUR_{famille}',
+                                           15 if famille == 'PERPLEXITY' else 10),
+                delai_reouverture=lire_decimal('DISJONCTEUR_DELAI_S', 30),
+            )
+        return disjoncteurs[nom]
+
+
+verrou_http = threading.Lock()
+
+
+def importer_http():
+    """
+    Importe requests et définit les transports HTTP qui en dépendent, au premier appel
+
+    requests est le module le plus coûteux à importer (~50 ms) : seuls les objets qui parlent
+    HTTP (GLPIManager, PerplexityReformulator, DiagnosticConnexions) et creer_session_http
+    l'importent, si bien que --help, --config ou --journal n'en paient pas le coût.
+    """
+    global requests, CircuitOuvert, AdaptateurEnregistreur, AdaptateurRejoueur, SessionProtegee
+    if 'SessionProtegee' in globals():
+        return
+    with verrou_http:
+        if 'SessionProtegee' in globals():
+            return
+        import requests
+
+        class CircuitOuvert(requests.exceptions.ConnectionError):
+            """Appel refusé sans attendre : le disjoncteur du backend est ouvert"""
+
+        class AdaptateurEnregistreur(requests.adapters.HTTPAdapter):
+            """Transport réel qui recopie chaque échange dans une cassette"""
+
+            def __init__(self, cassette: Cassette, **kwargs):
+                super().__init__(**kwargs)
+                self.cassette = cassette
+
+            def send(self, request, **kwargs):
+                debut = time.perf_counter()
+                response = super().send(request, **kwargs)
+
+                def terminer(corps: bytes):
+                    # Lire le corps fait partie de la durée de l'échange
+                    self.cassette.enregistrer(request, response, time.perf_counter() - debut, corps)
+
+                if kwargs.get('stream'):
+                    response.raw = CopieFlux(response.raw, terminer)
+                else:
+                    terminer(response.content)
+                return response
+
+        class AdaptateurRejoueur(requests.adapters.BaseAdapter):
+            """Transport hors ligne servant les réponses d'une cassette"""
+
+            def __init__(self, cassette: Cassette):
+                super().__init__()
+                self.cassette = cassette
+
+            def send(self, request, **kwargs):
+                echange = self.cassette.trouver(request)
+                attente = echange['duree_ms'] / 1000 * self.cassette.echelle_temps
+                if attente > 0:
+                    time.sleep(attente)
+
+                response = requests.Response()
+                response.status_code = echange['statut']
+                response.reason = http.client.responses.get(echange['statut'], '')
+                response.headers = requests.structures.CaseInsensitiveDict(echange['entetes'])
+                if kwargs.get('stream'):
+                    # Lue par blocs, comme la réponse d'origine
+                    response.raw = io.BytesIO(echange['corps'].encode('utf-8'))
+                else:
+                    response._content = echange['corps'].encode('utf-8')
+                    response._content_consumed = True
+                response.encoding = 'utf-8'
+                response.url = request.url
+                response.request = request
+                response.elapsed = timedelta(milliseconds=echange['duree_ms'])
+                return response
+
+            def close(self):
+                pass
+
+        class SessionProtegee(requests.Session):
+            """Session HTTP dont chaque envoi passe par le disjoncteur du backend"""
+
+            def __init__(self, disjoncteur: DisjoncteurCircuit):
+                super().__init__()
+                self.disjoncteur = disjoncteur
+
+            def send(self, request, **kwargs):
+                if not self.disjoncteur.autoriser():
+                    raise CircuitOuvert(f"{self.disjoncteur.nom} indisponible (disjoncteur ouvert), appel non envoyé")
+
+                debut = time.perf_counter()
+                try:
+                    response = super().send(request, **kwargs)
+                except requests.exceptions.RequestException as e:
+                    self.disjoncteur.signaler_echec(type(e).__name__)
+                    raise
+
+                if response.status_code >= 500:
+                    self.disjoncteur.signaler_echec(f"HTTP {response.status_code}")
+                else:
+                    self.disjoncteur.signaler_succes(time.perf_counter() - debut)
+                return response
+
+
+# Cassette utilisée par toutes les sessions HTTP (options --enregistrer / --rejouer)
+cassette_active: Optional[Cassette] = None
+
+
+def creer_session_http(taille_pool: int = 16, disjoncteur: Optional[DisjoncteurCircuit] = None) -> 'requests.Session':
+    """Crée une session HTTP persistante (keep-alive) avec un pool de connexions"""
+    importer_http()
+    session = SessionProtegee(disjoncteur) if disjoncteur else requests.Session()
+    if cassette_active is None:
+        adaptateur = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=taille_pool)
+    elif cassette_active.mode == 'enregistrement':
+        adaptateur = AdaptateurEnregistreur(cassette_active, pool_connections=4, pool_maxsize=taille_pool)
+    else:
+        adaptateur = AdaptateurRejoueur(cassette_active)
+    session.mount('https://', adaptateur)
+    session.mount('http://', adaptateur)
+    return session
+
+
+class MetriquesPerformance:
+    """Histogrammes de durée par étape (nombre, erreurs, p50/p95/p99) exportables"""
+
+    TAILLE_ECHANTILLON = 4096  # Échantillon par étape (mémoire bornée, reservoir sampling)
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self.echantillons: Dict[str, List[float]] = {}
+        self.compteurs: Dict[str, int] = {}
+        self.erreurs: Dict[str, int] = {}
+        self.sommes: Dict[str, float] = {}
+        self.maximums: Dict[str, float] = {}
+        self.jauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.verrou = threading.Lock()
+
+    def definir_jauge(self, nom: str, etiquettes: Dict[str, str], valeur: float):
+        """Valeur instantanée exportée telle quelle (ex: état des disjoncteurs)"""
+        with self.verrou:
+            self.jauges[(nom, tuple(sorted(etiquettes.items())))] = valeur
+
+    def enregistrer(self, etape: str, duree: float, succes: bool = True):
+        """Ajoute une mesure (en secondes) pour une étape"""
+        with self.verrou:
+            compteur = self.compteurs.get(etape, 0) + 1
+            self.compteurs[etape] = compteur
+            self.sommes[etape] = self.sommes.get(etape, 0.0) + duree
+            self.maximums[etape] = max(self.maximums.get(etape, 0.0), duree)
+            if not succes:
+                self.erreurs[etape] = self.erreurs.get(etape, 0) + 1
+
+            echantillon = self.echantillons.setdefault(etape, [])
+            if len(echantillon) < self.TAILLE_ECHANTILLON:
+                echantillon.append(duree)
+            else:
+                position = random.randrange(compteur)
+                if position < self.TAILLE_ECHANTILLON:
+                    echantillon[position] = duree
+
+    @contextmanager
+    def mesurer(self, etape: str):
+        """Chronomètre un bloc : with metriques.mesurer('etape'): ..."""
+        debut = time.perf_counter()
+        succes = False
+        try:
+            yield
+            succes = True
+        finally:
+            self.enregistrer(etape, time.perf_counter() - debut, succes)
+
+    @staticmethod
+    def _quantile(valeurs_triees: List[float], q: float) -> float:
+        """Quantile par rang le plus proche"""
+        if not valeurs_triees:
+            return 0.0
+        rang = min(len(valeurs_triees) - 1, max(0, math.ceil(q * len(valeurs_triees)) - 1))
+        return valeurs_triees[rang]
+
+    def resume(self) -> Dict[str, Dict[str, float]]:
+        """Statistiques par étape (durées en secondes)"""
+        with self.verrou:
+            resume = {}
+            for etape, compteur in self.compteurs.items():
+                valeurs = sorted(self.echantillons.get(etape, []))
+                stats = {
+                    'nombre': compteur,
+                    'erreurs': self.erreurs.get(etape, 0),
+                    'somme': self.sommes[etape],
+                    'moyenne': self.sommes[etape] / compteur,
+                    'max': self.maximums[etape],
+                }
+                for q in self.QUANTILES:
+                    stats[f"p{int(q * 100)}"] = self._quantile(valeurs, q)
+                resume[etape] = stats
+            return resume
+
+    def format_prometheus(self) -> str:
+        """Format texte Prometheus (summary par étape)"""
+        lignes = [
+            "# HELP glpi_automation_etape_duree_secondes Durée des étapes du traitement des tickets",
+            "# TYPE glpi_automation_etape_duree_secondes summary",
+        ]
+        resume = self.resume()
+        for etape, stats in sorted(resume.items()):
+            for q in self.QUANTILES:
+                lignes.append(f'glpi_automation_etape_duree_secondes{{etape="{etape}",quantile="{q}"}} '
+                              f'{stats[f"p{int(q * 100)}"]:.6f}')
+            lignes.append(f'glpi_automation_etape_duree_secondes_sum{{etape="{etape}"}} {stats["somme"]:.6f}')
+            lignes.append(f'glpi_automation_etape_duree_secondes_count{{etape="{etape}"}} {stats["nombre"]}')
+
+        lignes.append("# HELP glpi_automation_etape_erreurs_total Nombre d'échecs par étape")
+        lignes.append("# TYPE glpi_automation_etape_erreurs_total counter")
+        for etape, stats in sorted(resume.items()):
+            lignes.append(f'glpi_automation_etape_erreurs_total{{etape="{etape}"}} {stats["erreurs"]}')
+
+        with self.verrou:
+            jauges = sorted(self.jauges.items())
+        for nom in sorted({nom for (nom, _), _ in jauges}):
+            lignes.append(f"# TYPE {nom} gauge")
+            for (nom_jauge, etiquettes), valeur in jauges:
+                if nom_jauge == nom:
+                    texte = ','.join(f'{cle}="{val}"' for cle, val in etiquettes)
+                    lignes.append(f"{nom}{{{texte}}} {valeur:g}")
+
+        return "\n".join(lignes) + "\n"
+
+    def exporter(self, chemin: str):
+        """Exporte les métriques : textfile Prometheus si .prom, JSON sinon (écriture atomique)"""
+        if chemin.endswith('.prom'):
+            contenu = self.format_prometheus()
+        else:
+            contenu = json.dumps({'genere_le': datetime.now().isoformat(timespec='seconds'),
+                                  'etapes': self.resume(),
+                                  'disjoncteurs': {nom: d.decrire() for nom, d in disjoncteurs.items()},
+                                  'perplexity_jour': comptabilite_jetons.resume_jour() if comptabilite_jetons else None},
+                                 ensure_ascii=False, indent=2)
+
+        temporaire = f"{chemin}.tmp"
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+        os.replace(temporaire, chemin)
+        logger.info("📊 Métriques exportées dans %s", chemin)
+
+    def afficher_resume(self):
+        """Affiche le résumé des durées (option --profile)"""
+        resume = self.resume()
+        if not resume:
+            return
+
+        print("\n" + "=" * 70)
+        print("  ⏱️  PROFIL DES ÉTAPES (ms)")
+        print("=" * 70)
+        for nom, disjoncteur in sorted(disjoncteurs.items()):
+            etat = disjoncteur.decrire()
+            icone = '🟢' if etat['etat'] == DisjoncteurCircuit.FERME else '🔴'
+            print(f"  {icone} {nom}: {etat['etat']}"
+                  + (f" (dernière erreur: {etat['derniere_erreur']})" if etat['derniere_erreur'] else ""))
+        if comptabilite_jetons:
+            jour = comptabilite_jetons.resume_jour()
+            print(f"  💰 Perplexity aujourd'hui: {jour['appels']} appel(s), {jour['jetons_entree']} + "
+                  f"{jour['jetons_sortie']} jetons, {jour['cout']:.4f} $")
+        print("=" * 70)
+        print(f"  {'Étape':<28}{'nb':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'total':>10}")
+        for etape, stats in sorted(resume.items(), key=lambda e: -e[1]['somme']):
+            print(f"  {etape:<28}{stats['nombre']:>6}{stats['erreurs']:>5}"
+                  f"{stats['p50'] * 1000:>9.0f}{stats['p95'] * 1000:>9.0f}{stats['p99'] * 1000:>9.0f}"
+                  f"{stats['somme'] * 1000:>10.0f}")
+
+
+metriques = MetriquesPerformance()
+
+
+def mesure(etape: str, reussi: Callable[[Any], bool]):
+    """
+    Décorateur : chronomètre l'appel, l'enregistre dans les métriques et journalise la durée (DEBUG)
+
+    Args:
+        etape: Nom de l'étape dans les métriques
+        reussi: reussi(résultat) -> True si l'appel a abouti ; une exception compte toujours en échec
+    """
+    def decorateur(fonction):
+        @functools.wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            debut = time.perf_counter()
+            succes = False
+            try:
+                resultat = fonction(*args, **kwargs)
+                succes = reussi(resultat)
+                return resultat
+            finally:
+                duree = time.perf_counter() - debut
+                metriques.enregistrer(etape, duree, succes)
+                logger.debug("⏱️  %s : %.0f ms", etape, duree * 1000,
+                             extra={'etape': etape, 'duree_ms': round(duree * 1000, 1)})
+        return enveloppe
+    return decorateur
+
+
 class ConfigManager:
     """Gestionnaire de configuration interactive"""
 
@@ -53,6 +711,15 @@ class ConfigManager:
         print("\n🔧 CONFIGURATION GLPI")
         print("-" * 30)
 
+        profils = GLPIConfig.profils()
+        if profils:
+            print(f"📚 Profils existants: {', '.join(profils)}")
+        profil = input("Nom du profil GLPI (vide: instance principale, ex: nord): ").strip()
+        if profil and not re.fullmatch(r'\w+', profil):
+            print("❌ Nom de profil invalide (lettres, chiffres et _ uniquement)")
+            return
+        prefixe = GLPIConfig.prefixe(profil)
+
         while True:
             glpi_url = input("URL de l'API GLPI (ex: https://glpi.monentreprise.com/apirest.php): ").strip()
             if glpi_url:
@@ -63,21 +730,21 @@ class ConfigManager:
                         glpi_url += 'apirest.php'
                     else:
                         glpi_url += '/apirest.php'
-                config['GLPI_API_URL'] = glpi_url
+                config[f'{prefixe}API_URL'] = glpi_url
                 break
             print("❌ L'URL de l'API GLPI ne peut pas être vide")
 
         while True:
             app_token = input("App-Token GLPI: ").strip()
             if app_token:
-                config['GLPI_APP_TOKEN'] = app_token
+                config[f'{prefixe}APP_TOKEN'] = app_token
                 break
             print("❌ L'App-Token ne peut pas être vide")
 
         while True:
             user_token = input("User-Token GLPI: ").strip()
             if user_token:
-                config['GLPI_USER_TOKEN'] = user_token
+                config[f'{prefixe}USER_TOKEN'] = user_token
                 break
             print("❌ L'User-Token ne peut pas être vide")
 
@@ -85,8 +752,16 @@ class ConfigManager:
         print("\n🤖 CONFIGURATION PERPLEXITY AI")
         print("-" * 30)
 
+        if profil and profil not in profils:
+            config['GLPI_PROFILS'] = ','.join(profils + [profil])
+
+        cle_actuelle = os.getenv('PERPLEXITY_API_KEY', '')
         while True:
-            perplexity_key = input("Clé API Perplexity (ex: pplx-xxxxx): ").strip()
+            perplexity_key = input("Clé API Perplexity (ex: pplx-xxxxx)"
+                                   + (" ou Entrée pour conserver la clé actuelle" if cle_actuelle else "")
+                                   + ": ").strip()
+            if not perplexity_key and cle_actuelle:
+                break
             if perplexity_key:
                 if not perplexity_key.startswith('pplx-'):
                     print("⚠️  La clé devrait commencer par 'pplx-', continuez quand même? (o/N)")
@@ -96,41 +771,18 @@ class ConfigManager:
                 break
             print("❌ La clé API Perplexity ne peut pas être vide")
 
-        # Sauvegarder dans .env
-        env_content = f"""# Configuration des API - GLPI et Perplexity
-# Généré automatiquement le {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
-# Configuration GLPI
-GLPI_API_URL={config['GLPI_API_URL']}
-GLPI_APP_TOKEN={config['GLPI_APP_TOKEN']}
-GLPI_USER_TOKEN={config['GLPI_USER_TOKEN']}
-
-# Configuration Perplexity
-PERPLEXITY_API_KEY={config['PERPLEXITY_API_KEY']}
-"""
-
         try:
-            with open('.env', 'w', encoding='utf-8') as f:
-                f.write(env_content)
+            ConfigManager.mettre_a_jour_env(config)
 
-            print("\n✅ Configuration sauvegardée dans .env")
+            print("\n✅ Configuration sauvegardée dans .env"
+                  + (f" (profil {profil})" if profil else ""))
             print("\n🧪 Test de la configuration...")
 
             # Recharger les variables d'environnement
-            load_dotenv(override=True)
-
-            # Test rapide
-            print("   🔍 Test de la connexion GLPI...")
-            if ConfigManager.tester_glpi():
-                print("   ✅ Connexion GLPI réussie")
-            else:
-                print("   ❌ Échec de la connexion GLPI")
+            charger_configuration(override=True)
 
-            print("   🔍 Test de la connexion Perplexity...")
-            if ConfigManager.tester_perplexity():
-                print("   ✅ Connexion Perplexity réussie")
-            else:
-                print("   ❌ Échec de la connexion Perplexity")
+            # Test rapide (une connexion par service, --doctor pour un diagnostic complet)
+            DiagnosticConnexions.afficher(DiagnosticConnexions(echantillons=1).executer([profil or None]))
 
             print("\n🎉 Configuration terminée ! Vous pouvez maintenant utiliser le script normalement.")
 
@@ -138,75 +790,87 @@ PERPLEXITY_API_KEY={config['PERPLEXITY_API_KEY']}
             print(f"❌ Erreur lors de la sauvegarde: {e}")
 
     @staticmethod
-    def tester_glpi() -> bool:
-        """Test rapide de la connexion GLPI"""
-        try:
-            api_url = os.getenv('GLPI_API_URL')
-            app_token = os.getenv('GLPI_APP_TOKEN')
-            user_token = os.getenv('GLPI_USER_TOKEN')
-
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'user_token {user_token}',
-                'App-Token': app_token
-            }
-
-            response = requests.get(f"{api_url}/initSession", headers=headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if 'session_token' in data:
-                    # Fermer la session
-                    requests.get(f"{api_url}/killSession", 
-                               headers={'Session-Token': data['session_token'], 'App-Token': app_token})
-                    return True
-            return False
-        except:
-            return False
-
-    @staticmethod
-    def tester_perplexity() -> bool:
-        """Test rapide de la connexion Perplexity"""
+    def mettre_a_jour_env(valeurs: Dict[str, str], chemin: str = '.env'):
+        """Écrit les variables dans le .env en conservant les autres (profils, options)"""
         try:
-            api_key = os.getenv('PERPLEXITY_API_KEY')
-
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
+            with open(chemin, 'r', encoding='utf-8') as f:
+                lignes = f.read().splitlines()
+        except FileNotFoundError:
+            lignes = ["# Configuration des API - GLPI et Perplexity",
+                      f"# Généré automatiquement le {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ""]
 
-            payload = {
-                "model": "sonar-pro",
-                "messages": [{"role": "user", "content": "Test"}],
-                "temperature": 0.1,
-                "max_tokens": 10
-            }
+        restantes = dict(valeurs)
+        for i, ligne in enumerate(lignes):
+            cle = ligne.split('=', 1)[0].strip()
+            if '=' in ligne and not ligne.lstrip().startswith('#') and cle in restantes:
+                lignes[i] = f"{cle}={restantes.pop(cle)}"
+        lignes += [f"{cle}={valeur}" for cle, valeur in restantes.items()]
 
-            response = requests.post("https://api.perplexity.ai/chat/completions", 
-                                   headers=headers, json=payload, timeout=10)
-            return response.status_code == 200
-        except:
-            return False
+        with open(chemin, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lignes) + '\n')
 
 
 class GLPIConfig:
-    """Configuration pour l'API GLPI"""
-    def __init__(self):
-        self.api_url = os.getenv('GLPI_API_URL', 'https://your-glpi-server.com/apirest.php')
-        self.app_token = os.getenv('GLPI_APP_TOKEN', '')
-        self.user_token = os.getenv('GLPI_USER_TOKEN', '')
+    """
+    Configuration pour l'API GLPI
+
+    Sans profil : variables GLPI_API_URL, GLPI_APP_TOKEN et GLPI_USER_TOKEN. Un profil
+    nommé (liste GLPI_PROFILS) lit les mêmes variables préfixées par son nom, ex:
+    GLPI_NORD_API_URL pour le profil « nord ».
+    """
+    def __init__(self, profil: Optional[str] = None):
+        self.profil = profil or self.profil_par_defaut()
+        prefixe = self.prefixe(self.profil)
+        self.api_url = os.getenv(f'{prefixe}API_URL', 'https://your-glpi-server.com/apirest.php')
+        self.app_token = os.getenv(f'{prefixe}APP_TOKEN', '')
+        self.user_token = os.getenv(f'{prefixe}USER_TOKEN', '')
 
         if not self.app_token or not self.user_token:
-            logger.error("Variables d'environnement GLPI_APP_TOKEN et GLPI_USER_TOKEN requises")
+            logger.error("Variables d'environnement %sAPP_TOKEN et %sUSER_TOKEN requises", prefixe, prefixe)
             print("\n❌ Configuration manquante ! Utilisez: python glpi_ticket_automation.py --config")
             sys.exit(1)
 
+    @staticmethod
+    def prefixe(profil: Optional[str]) -> str:
+        """Préfixe des variables d'un profil (GLPI_ pour l'instance principale)"""
+        if not profil:
+            return 'GLPI_'
+        return 'GLPI_' + re.sub(r'\W', '_', profil).upper() + '_'
+
+    @staticmethod
+    def profils() -> List[str]:
+        """Profils déclarés dans GLPI_PROFILS (ex: nord,sud)"""
+        return [p for p in re.split(r'[,;\s]+', os.getenv('GLPI_PROFILS', '')) if p]
+
+    @classmethod
+    def profil_par_defaut(cls) -> Optional[str]:
+        """Profil choisi par --instance, sinon instance principale, sinon premier profil déclaré"""
+        if os.getenv('GLPI_INSTANCE'):
+            return os.getenv('GLPI_INSTANCE')
+        if os.getenv('GLPI_USER_TOKEN'):
+            return None
+        return next(iter(cls.profils()), None)
+
+    @classmethod
+    def instances(cls) -> List[Optional[str]]:
+        """
+        Instances utilisées par les modes multi-instances : celle de --instance, sinon
+        l'instance principale (si GLPI_USER_TOKEN est défini) suivie des profils déclarés
+        """
+        if os.getenv('GLPI_INSTANCE'):
+            return [os.getenv('GLPI_INSTANCE')]
+        principale = [None] if os.getenv('GLPI_USER_TOKEN') else []
+        return principale + cls.profils() or [None]
+
 
 class PerplexityConfig:
     """Configuration pour l'API Perplexity"""
     def __init__(self):
         self.api_key = os.getenv('PERPLEXITY_API_KEY', '')
-        self.api_url = 'https://api.perplexity.ai/chat/completions'
+        self.api_url = os.getenv('PERPLEXITY_API_URL', 'https://api.perplexity.ai/chat/completions')
         self.model = 'sonar-pro'
+        self.jetons_entree_max = lire_entier('PERPLEXITY_JETONS_ENTREE_MAX', 2000)
+        self.jetons_par_ligne = lire_entier('PERPLEXITY_JETONS_PAR_LIGNE', 80)
 
         if not self.api_key:
             logger.error("Variable d'environnement PERPLEXITY_API_KEY requise")
@@ -214,13 +878,548 @@ class PerplexityConfig:
             sys.exit(1)
 
 
+class ComptabiliteJetons:
+    """
+    Consommation Perplexity (appels, jetons, coût) par jour et par opérateur, avec budgets.
+
+    Chaque appel ajoute une ligne JSON en fin de fichier, sans jamais le réécrire :
+    plusieurs processus (--lot, --serveur, mode interactif) partagent le même fichier sans
+    s'écraser, et chacun relit les lignes ajoutées par les autres avant de contrôler un
+    budget. Les lignes de plus de JOURS_CONSERVES jours sont retirées au démarrage. Sans
+    fichier (chemin None), les totaux restent en mémoire.
+    """
+
+    JOURS_CONSERVES = 90
+
+    def __init__(self, chemin: Optional[str], prix_entree: float, prix_sortie: float,
+                 budget_jour: float = 0.0, budget_operateur: float = 0.0):
+        self.chemin = chemin
+        self.prix_entree = prix_entree    # $ par million de jetons
+        self.prix_sortie = prix_sortie
+        self.budget_jour = budget_jour    # $ (0 : pas de limite)
+        self.budget_operateur = budget_operateur
+        self.verrou = threading.Lock()
+        self.totaux: Dict[str, Dict[str, Any]] = {}
+        self.position = 0  # Octets du fichier déjà comptés
+        if chemin:
+            self._purger()
+            self._relire()
+
+    def _purger(self):
+        """Retire les lignes trop anciennes (au démarrage seulement : le fichier est alors réécrit)"""
+        limite = (datetime.now() - timedelta(days=self.JOURS_CONSERVES)).strftime('%Y-%m-%d')
+        try:
+            with open(self.chemin, 'rb') as f:
+                lignes = f.readlines()
+            conservees = []
+            for ligne in lignes:
+                try:
+                    if json.loads(ligne)['date'] < limite:
+                        continue
+                except (ValueError, KeyError, TypeError):
+                    pass  # Ligne illisible : laissée telle quelle, _relire la signale
+                conservees.append(ligne)
+            if len(conservees) == len(lignes):
+                return
+            temporaire = f"{self.chemin}.tmp"
+            with open(temporaire, 'wb') as f:
+                f.writelines(conservees)
+            os.replace(temporaire, self.chemin)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("⚠️  Impossible de purger la consommation Perplexity: %s", e)
+
+    def _relire(self):
+        """Ajoute aux totaux les lignes écrites depuis la dernière lecture, par ce processus ou un autre"""
+        try:
+            with open(self.chemin, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < self.position:
+                    self.totaux, self.position = {}, 0  # Fichier purgé par un autre processus
+                f.seek(self.position)
+                for ligne in f:
+                    if not ligne.endswith(b'\n'):
+                        break  # Ligne en cours d'écriture
+                    self.position += len(ligne)
+                    try:
+                        appel = json.loads(ligne)
+                        self._ajouter(appel['date'], appel['operateur'], int(appel['jetons_entree']),
+                                      int(appel['jetons_sortie']), float(appel['cout']))
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning("⚠️  Ligne de consommation Perplexity illisible ignorée")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("⚠️  Consommation Perplexity illisible: %s", e)
+
+    def _ajouter(self, date: str, operateur: str, jetons_entree: int, jetons_sortie: int, cout: float):
+        jour = self.totaux.setdefault(date, dict(self._compteurs(), operateurs={}))
+        for compteurs in (jour, jour['operateurs'].setdefault(operateur, self._compteurs())):
+            compteurs['appels'] += 1
+            compteurs['jetons_entree'] += jetons_entree
+            compteurs['jetons_sortie'] += jetons_sortie
+            compteurs['cout'] = round(compteurs['cout'] + cout, 6)
+
+    @staticmethod
+    def estimer_jetons(texte: str) -> int:
+        """Estimation locale du nombre de jetons (≈ 4 caractères par jeton)"""
+        return math.ceil(len(texte) / 4) if texte else 0
+
+    def cout(self, jetons_entree: int, jetons_sortie: int) -> float:
+        return (jetons_entree * self.prix_entree + jetons_sortie * self.prix_sortie) / 1_000_000
+
+    @staticmethod
+    def _compteurs() -> Dict[str, Any]:
+        return {'appels': 0, 'jetons_entree': 0, 'jetons_sortie': 0, 'cout': 0.0}
+
+    def _jour(self) -> Dict[str, Any]:
+        if self.chemin:
+            self._relire()
+        return self.totaux.setdefault(datetime.now().strftime('%Y-%m-%d'), dict(self._compteurs(), operateurs={}))
+
+    def depassement(self, operateur: str) -> Optional[str]:
+        """Raison du refus si le budget du jour ou de l'opérateur est atteint, None sinon"""
+        with self.verrou:
+            jour = self._jour()
+            if self.budget_jour and jour['cout'] >= self.budget_jour:
+                return f"budget du jour atteint ({jour['cout']:.4f} $ / {self.budget_jour:.4f} $)"
+            consommation = jour['operateurs'].get(operateur)
+            if self.budget_operateur and consommation and consommation['cout'] >= self.budget_operateur:
+                return f"budget de {operateur} atteint ({consommation['cout']:.4f} $ / {self.budget_operateur:.4f} $)"
+        return None
+
+    def enregistrer(self, operateur: str, jetons_entree: int, jetons_sortie: int) -> float:
+        """Ajoute un appel aux totaux du jour et de l'opérateur, et retourne son coût"""
+        cout = self.cout(jetons_entree, jetons_sortie)
+        date = datetime.now().strftime('%Y-%m-%d')
+        with self.verrou:
+            if self.chemin:
+                # Une seule écriture en mode ajout : les lignes de processus concurrents ne se mêlent pas
+                ligne = json.dumps({'date': date, 'operateur': operateur, 'jetons_entree': jetons_entree,
+                                    'jetons_sortie': jetons_sortie, 'cout': round(cout, 6)},
+                                   ensure_ascii=False) + '\n'
+                try:
+                    fichier = os.open(self.chemin, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    try:
+                        os.write(fichier, ligne.encode('utf-8'))
+                    finally:
+                        os.close(fichier)
+                except OSError as e:
+                    logger.warning("⚠️  Impossible d'enregistrer la consommation Perplexity: %s", e)
+                    self._ajouter(date, operateur, jetons_entree, jetons_sortie, cout)
+            else:
+                self._ajouter(date, operateur, jetons_entree, jetons_sortie, cout)
+            jour = self._jour()  # Relit la ligne écrite avec celles des autres processus
+
+            for mesure_jour in ('appels', 'jetons_entree', 'jetons_sortie', 'cout'):
+                metriques.definir_jauge('glpi_automation_perplexity_consommation_jour',
+                                        {'mesure': mesure_jour}, jour[mesure_jour])
+        return cout
+
+    def resume_jour(self) -> Dict[str, Any]:
+        """Totaux du jour (CLI, service, métriques)"""
+        with self.verrou:
+            return json.loads(json.dumps(self._jour()))
+
+
+comptabilite_jetons: Optional[ComptabiliteJetons] = None
+verrou_comptabilite = threading.Lock()
+
+
+def obtenir_comptabilite() -> ComptabiliteJetons:
+    """
+    Comptabilité Perplexity partagée, créée à la demande (réglages PERPLEXITY_* du .env ;
+    PERPLEXITY_FICHIER_CONSOMMATION=0 la garde en mémoire)
+    """
+    global comptabilite_jetons
+    with verrou_comptabilite:
+        if comptabilite_jetons is None:
+            chemin = os.getenv('PERPLEXITY_FICHIER_CONSOMMATION', 'consommation_perplexity.jsonl')
+            comptabilite_jetons = ComptabiliteJetons(
+                None if chemin == '0' else chemin,
+                prix_entree=lire_decimal('PERPLEXITY_PRIX_ENTREE', 3),
+                prix_sortie=lire_decimal('PERPLEXITY_PRIX_SORTIE', 15),
+                budget_jour=lire_decimal('PERPLEXITY_BUDGET_JOUR', 0),
+                budget_operateur=lire_decimal('PERPLEXITY_BUDGET_OPERATEUR', 0),
+            )
+        return comptabilite_jetons
+
+
+class JournalTickets:
+    """
+    Journal local des tickets traités (SQLite), interrogeable sans appel à GLPI.
+
+    Chaque résultat de création (demandeur, entité, catégorie, textes originaux et
+    reformulés, durées) est inséré dans la table `tickets` ; un index plein texte FTS5
+    couvre titre, appelant, demandeur, numéro de série, entité et textes. Le téléphone
+    est indexé sous forme de chiffres normalisés (+33 → 0).
+    """
+
+    COLONNES = ('date', 'ticket_id', 'operateur', 'titre', 'nom_appelant', 'telephone', 'telephone_chiffres',
+                'email', 'numero_serie', 'demandeur', 'user_id', 'nom_client', 'entity_id', 'entite',
+                'categorie_id', 'categorie', 'technicien_id', 'description_originale', 'description_finale',
+                'solution_originale', 'solution_finale', 'cloture', 'erreurs', 'durees_ms', 'instance')
+    COLONNES_TEXTE = ('titre', 'nom_appelant', 'demandeur', 'nom_client', 'numero_serie', 'entite',
+                      'description_originale', 'description_finale', 'solution_finale')
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        self.verrou = threading.Lock()
+        self.connexion = sqlite3.connect(chemin, check_same_thread=False)
+        self.connexion.row_factory = sqlite3.Row
+        self.connexion.execute('PRAGMA journal_mode=WAL')
+        self.connexion.execute('PRAGMA synchronous=NORMAL')
+        self.connexion.execute(f"""
+            CREATE TABLE IF NOT EXISTS tickets (
+                id INTEGER PRIMARY KEY,
+                {', '.join(self.COLONNES)}
+            )""")
+        # Journaux créés par une version antérieure : colonnes ajoutées depuis
+        existantes = {ligne[1] for ligne in self.connexion.execute('PRAGMA table_info(tickets)')}
+        for colonne in self.COLONNES:
+            if colonne not in existantes:
+                self.connexion.execute(f'ALTER TABLE tickets ADD COLUMN {colonne}')
+        self.connexion.execute('CREATE INDEX IF NOT EXISTS tickets_date ON tickets (date)')
+        self.connexion.execute('CREATE INDEX IF NOT EXISTS tickets_telephone ON tickets (telephone_chiffres, date)')
+        self.connexion.execute('CREATE INDEX IF NOT EXISTS tickets_serie ON tickets (numero_serie COLLATE NOCASE, date)')
+        self.plein_texte = True
+        try:
+            colonnes = ', '.join(self.COLONNES_TEXTE)
+            self.connexion.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+                    {colonnes}, content='tickets', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )""")
+            self.connexion.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS tickets_fts_ajout AFTER INSERT ON tickets BEGIN
+                    INSERT INTO tickets_fts (rowid, {colonnes})
+                    VALUES (new.id, {', '.join('new.' + c for c in self.COLONNES_TEXTE)});
+                END""")
+        except sqlite3.OperationalError as e:
+            logger.warning("⚠️  SQLite sans FTS5 (%s) : recherche plein texte par LIKE", e)
+            self.plein_texte = False
+        self.connexion.commit()
+
+    @staticmethod
+    def chiffres_telephone(telephone: str) -> str:
+        """Chiffres d'un numéro, au format national (+33 1 23... → 0123...)"""
+        chiffres = re.sub(r'\D', '', str(telephone or ''))
+        return '0' + chiffres[2:] if chiffres.startswith('33') and len(chiffres) == 11 else chiffres
+
+    def enregistrer(self, informations: Dict[str, Any], resultat: Dict[str, Any],
+                    glpi: Optional['GLPIManager'] = None):
+        """Ajoute le résultat d'une création de ticket (réussie ou non) au journal"""
+        entite = glpi.toutes_entites.get(resultat.get('entity_id')) if glpi else None
+        categorie_id = informations.get('categorie_id')
+        telephone = informations.get('telephone')
+        ligne = {
+            'date': datetime.now().isoformat(sep=' ', timespec='seconds'),
+            'ticket_id': resultat.get('ticket_id'),
+            'operateur': informations.get('operateur') or os.getenv('OPERATEUR') or os.getenv('USER') or '',
+            'titre': informations.get('titre'),
+            'nom_appelant': informations.get('nom_appelant'),
+            'telephone': telephone,
+            'telephone_chiffres': self.chiffres_telephone(telephone) or None,
+            'email': informations.get('email'),
+            'numero_serie': informations.get('numero_serie') or None,
+            'demandeur': informations.get('demandeur'),
+            'user_id': resultat.get('user_id'),
+            'nom_client': resultat.get('nom_client'),
+            'entity_id': resultat.get('entity_id'),
+            'entite': entite.completename if entite else None,
+            'categorie_id': categorie_id,
+            'categorie': glpi.chemins_categories.get(categorie_id) if glpi and categorie_id else None,
+            'technicien_id': resultat.get('technicien_id'),
+            'description_originale': informations.get('description'),
+            'description_finale': resultat.get('description_finale'),
+            'solution_originale': informations.get('solution') or None,
+            'solution_finale': resultat.get('solution_finale'),
+            'cloture': resultat.get('cloture'),
+            'erreurs': json.dumps(resultat.get('erreurs') or [], ensure_ascii=False),
+            'durees_ms': json.dumps(resultat.get('durees_ms') or {}),
+            'instance': glpi.profil if glpi else None,
+        }
+        try:
+            with self.verrou:
+                self.connexion.execute(f"INSERT INTO tickets ({', '.join(self.COLONNES)}) "
+                                       f"VALUES ({', '.join('?' * len(self.COLONNES))})",
+                                       [ligne[c] for c in self.COLONNES])
+                self.connexion.commit()
+        except sqlite3.Error as e:
+            # Le journal ne doit jamais bloquer la création des tickets
+            logger.warning("⚠️  Ticket %s non journalisé: %s", ligne['ticket_id'], e)
+
+    def rechercher(self, requete: str, depuis: Optional[str] = None, limite: int = 20) -> List[Dict[str, Any]]:
+        """
+        Recherche par téléphone (si la requête est un numéro), sinon par numéro de série
+        exact ou en plein texte (appelant, demandeur, titre, entité, descriptions)
+
+        Args:
+            requete: Numéro, numéro de série ou mots recherchés (vide : derniers tickets)
+            depuis: Date minimale (AAAA-MM-JJ)
+            limite: Nombre maximal de résultats, du plus récent au plus ancien
+        """
+        requete = requete.strip()
+        conditions, valeurs = [], []
+        if depuis:
+            conditions.append('date >= ?')
+            valeurs.append(depuis)
+
+        chiffres = self.chiffres_telephone(requete)
+        if requete and re.fullmatch(r'[\d\s.+()-]+', requete) and len(chiffres) >= 9:
+            conditions.append('telephone_chiffres = ?')
+            valeurs.append(chiffres)
+        elif requete:
+            mots = re.findall(r'\w+', requete)
+            if self.plein_texte and mots:
+                conditions.append('id IN (SELECT rowid FROM tickets_fts WHERE tickets_fts MATCH ? '
+                                  'UNION SELECT id FROM tickets WHERE numero_serie = ? COLLATE NOCASE)')
+                valeurs += [' '.join(f'"{mot}"*' for mot in mots), requete]
+            else:
+                texte = " || ' ' || ".join(f"coalesce({c}, '')" for c in self.COLONNES_TEXTE)
+                conditions.append(f"({texte}) LIKE ?")
+                valeurs.append(f"%{requete}%")
+
+        sql = "SELECT * FROM tickets"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY date DESC, id DESC LIMIT ?"
+        with self.verrou:
+            lignes = self.connexion.execute(sql, valeurs + [limite]).fetchall()
+
+        resultats = []
+        for ligne in lignes:
+            resultat = dict(ligne)
+            resultat['erreurs'] = json.loads(resultat['erreurs'] or '[]')
+            resultat['durees_ms'] = json.loads(resultat['durees_ms'] or '{}')
+            resultats.append(resultat)
+        return resultats
+
+    def tickets_crees(self, apres: int = 0, instance: Optional[str] = None) -> Tuple[List[int], int]:
+        """Numéros GLPI des tickets de l'instance journalisés après la ligne `apres`, et la dernière ligne lue"""
+        with self.verrou:
+            lignes = self.connexion.execute(
+                "SELECT id, ticket_id FROM tickets WHERE id > ? AND ticket_id IS NOT NULL AND instance IS ? "
+                "ORDER BY id", (apres, instance)
+            ).fetchall()
+        return [ligne[1] for ligne in lignes], (lignes[-1][0] if lignes else apres)
+
+    def iterer_appelants(self, instance: Optional[str] = None):
+        """(téléphone, numéro de série, user_id, entity_id) des tickets créés sur l'instance, par ordre de création"""
+        with self.verrou:
+            lignes = self.connexion.execute(
+                "SELECT telephone_chiffres, numero_serie, user_id, entity_id FROM tickets "
+                "WHERE ticket_id IS NOT NULL AND user_id IS NOT NULL AND instance IS ? ORDER BY id", (instance,)
+            ).fetchall()
+        return [tuple(ligne) for ligne in lignes]
+
+    def fermer(self):
+        with self.verrou:
+            self.connexion.close()
+
+
+journal_tickets: Optional[JournalTickets] = None
+verrou_journal = threading.Lock()
+
+
+def obtenir_journal() -> Optional[JournalTickets]:
+    """Journal local partagé, créé à la demande (JOURNAL_TICKETS=0 le désactive)"""
+    global journal_tickets
+    chemin = os.getenv('JOURNAL_TICKETS', 'journal_tickets.db')
+    if chemin == '0':
+        return None
+    with verrou_journal:
+        if journal_tickets is None:
+            try:
+                journal_tickets = JournalTickets(chemin)
+            except sqlite3.Error as e:
+                logger.warning("⚠️  Journal local indisponible (%s): %s", chemin, e)
+                return None
+        return journal_tickets
+
+
+class MasqueurDonnees:
+    """
+    Masquage local des données personnelles avant envoi d'un texte à Perplexity.
+
+    Emails et téléphones sont repérés par motifs (mêmes formats que TicketCollector),
+    les noms par suites de mots : « prénom nom » et « nom prénom » des demandeurs de
+    l'annuaire associé, ainsi que les termes propres au ticket (appelant, demandeur).
+    Un mot isolé de l'annuaire (identifiant, entité) n'est jamais masqué : « normal »,
+    « tech » ou « copieur » sont aussi des mots courants. Chaque valeur est remplacée par
+    une référence ([TEL_1], [EMAIL_1], [NOM_1]) et les correspondances permettent de
+    restaurer le texte.
+    """
+
+    MOTIF_REFERENCE = re.compile(r'\[(?:TEL|EMAIL|NOM)_\d+\]')
+    MOTIF_MOT = re.compile(r"\w+(?:[-'’]\w+)*")
+    MOTS_MAX = 4
+    LONGUEUR_MIN = 3
+
+    def __init__(self, actif: bool = True):
+        self.actif = actif
+        self.motif_email = re.compile(TicketCollector.MOTIF_EMAIL)
+        self.motif_telephone = re.compile(TicketCollector.MOTIF_TELEPHONE_TEXTE)
+        self.annuaires: List['GLPIManager'] = []
+        self.version_annuaires = None
+        self.noms_annuaires: Dict[Tuple[str, ...], str] = {}
+
+    def associer_annuaires(self, glpi: 'GLPIManager'):
+        """Utilise les demandeurs et entités chargés par ce gestionnaire GLPI (cumulable par instance)"""
+        if all(annuaire is not glpi for annuaire in self.annuaires):
+            self.annuaires = self.annuaires + [glpi]
+
+    @classmethod
+    def _ajouter(cls, noms: Dict[Tuple[str, ...], str], texte: str, categorie: str, mots_isoles: bool = False):
+        mots = tuple(sys.intern(m.lower()) for m in cls.MOTIF_MOT.findall(texte or ''))
+        if not mots or len(mots) > cls.MOTS_MAX or sum(map(len, mots)) < cls.LONGUEUR_MIN:
+            return
+        noms.setdefault(mots, categorie)
+        if mots_isoles:
+            for mot in mots:
+                if len(mot) >= cls.LONGUEUR_MIN:
+                    noms.setdefault((mot,), categorie)
+
+    def _noms_annuaires(self) -> Dict[Tuple[str, ...], str]:
+        """Prénoms et noms de l'annuaire, reconstruits quand les annuaires sont rechargés"""
+        annuaires = self.annuaires
+        if not annuaires:
+            return {}
+        version = tuple(id(glpi.annuaire_utilisateurs) for glpi in annuaires)
+        if version != self.version_annuaires:
+            noms: Dict[Tuple[str, ...], str] = {}
+            # Prénoms et noms de famille sont partagés entre fiches : découpés une seule fois
+            decoupes: Dict[str, Tuple[str, ...]] = {}
+            for utilisateur in (u for glpi in annuaires for u in glpi.annuaire_utilisateurs or []):
+                prenom, nom = (decoupes.get(v) or decoupes.setdefault(
+                    v, tuple(sys.intern(m.lower()) for m in self.MOTIF_MOT.findall(v)))
+                    for v in (utilisateur.firstname, utilisateur.realname))
+                # Seule la paire complète est masquée, jamais un prénom ou un nom seul
+                if prenom and nom and len(prenom) + len(nom) <= self.MOTS_MAX:
+                    noms.setdefault(prenom + nom, 'NOM')
+                    noms.setdefault(nom + prenom, 'NOM')
+            self.noms_annuaires, self.version_annuaires = noms, version
+        return self.noms_annuaires
+
+    def _masquer(self, texte: str, locaux: Dict[Tuple[str, ...], str],
+                 noms: Dict[Tuple[str, ...], str]) -> Tuple[str, Dict[str, str]]:
+        correspondances: Dict[str, str] = {}
+        references: Dict[Tuple[str, str], str] = {}
+        compteurs: Dict[str, int] = {}
+
+        def reference(categorie: str, valeur: str) -> str:
+            ref = references.get((categorie, valeur))
+            if ref is None:
+                compteurs[categorie] = compteurs.get(categorie, 0) + 1
+                ref = references[(categorie, valeur)] = f"[{categorie}_{compteurs[categorie]}]"
+                correspondances[ref] = valeur
+            return ref
+
+        texte = self.motif_email.sub(lambda m: reference('EMAIL', m.group()), texte)
+        texte = self.motif_telephone.sub(lambda m: reference('TEL', m.group()), texte)
+
+        # Noms : plus longue suite de mots connue à chaque position
+        mots = list(self.MOTIF_MOT.finditer(texte))
+        minuscules = [m.group().lower() for m in mots]
+        morceaux, curseur, i = [], 0, 0
+        while i < len(mots):
+            for n in range(min(self.MOTS_MAX, len(mots) - i), 0, -1):
+                cle = tuple(minuscules[i:i + n])
+                categorie = locaux.get(cle) or noms.get(cle)
+                if categorie:
+                    break
+            else:
+                i += 1
+                continue
+            debut, fin = mots[i].start(), mots[i + n - 1].end()
+            morceaux.append(texte[curseur:debut])
+            morceaux.append(reference(categorie, texte[debut:fin]))
+            curseur, i = fin, i + n
+        morceaux.append(texte[curseur:])
+
+        return ''.join(morceaux), correspondances
+
+    def masquer_lot(self, textes: List[str], termes: Tuple[str, ...] = ()) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        Masque une série de textes (dictionnaires et motifs préparés une seule fois)
+
+        Returns:
+            Pour chaque texte, le couple (texte masqué, correspondances référence → valeur)
+        """
+        if not self.actif:
+            return [(texte, {}) for texte in textes]
+
+        locaux: Dict[Tuple[str, ...], str] = {}
+        for terme in termes:
+            self._ajouter(locaux, str(terme or ''), 'NOM', mots_isoles=True)
+        noms = self._noms_annuaires()
+        return [self._masquer(texte, locaux, noms) if texte else (texte, {}) for texte in textes]
+
+    def masquer(self, texte: str, termes: Tuple[str, ...] = ()) -> Tuple[str, Dict[str, str]]:
+        """Masque un texte (voir masquer_lot)"""
+        return self.masquer_lot([texte], termes)[0]
+
+    def restaurer(self, texte: str, correspondances: Dict[str, str]) -> str:
+        """Remet les valeurs d'origine à la place des références"""
+        if not correspondances:
+            return texte
+        return self.MOTIF_REFERENCE.sub(lambda m: correspondances.get(m.group(), m.group()), texte)
+
+
 class PerplexityReformulator:
     """Classe pour la reformulation de texte via l'API Perplexity"""
 
+    CONSIGNE_REFERENCES = ("- Les éléments entre crochets ([NOM_1], [TEL_1], [EMAIL_1]...) "
+                           "sont des données masquées : recopie-les tels quels s'ils doivent apparaître")
+    MOTIF_LIGNES_MAX = re.compile(r'Maximum\s+(\d+)\s+lignes?', re.IGNORECASE)
+    # Début de l'historique d'un fil d'emails copié (messages précédents)
+    MOTIF_HISTORIQUE = re.compile(r'^\s*(?:-{2,}\s*(?:Message d\'origine|Original Message)|'
+                                  r'(?:De|From)\s*:.*$\n^\s*(?:Envoyé|Sent|Date)\s*:|'
+                                  r'Le .{5,120} a écrit\s*:)', re.IGNORECASE | re.MULTILINE)
+
     def __init__(self, config: PerplexityConfig):
+        importer_http()
         self.config = config
         self.instructions_manager = None  # Sera initialisé si nécessaire
         self.instructions = {}
+        self.session_http = None
+        self.verrou_http = threading.Lock()
+        self.masqueur = MasqueurDonnees(actif=os.getenv('PERPLEXITY_MASQUAGE', '1') != '0')
+        self.comptabilite = obtenir_comptabilite()
+        self.operateur = os.getenv('OPERATEUR') or os.getenv('USER') or os.getenv('USERNAME') or 'inconnu'
+
+    @property
+    def http(self) -> 'requests.Session':
+        """Session HTTP créée au premier appel à l'API"""
+        if self.session_http is None:
+            with self.verrou_http:
+                if self.session_http is None:
+                    self.session_http = creer_session_http(disjoncteur=obtenir_disjoncteur('perplexity'))
+        return self.session_http
+
+    def max_tokens(self, type_reformulation: str) -> int:
+        """Limite de réponse déduite du « Maximum N lignes » de l'instruction"""
+        lignes = self.MOTIF_LIGNES_MAX.search(self.instructions.get(type_reformulation, ''))
+        return (int(lignes.group(1)) if lignes else 5) * self.config.jetons_par_ligne
+
+    def reduire_texte(self, texte: str, jetons_max: int) -> str:
+        """
+        Ramène un texte trop long sous `jetons_max` jetons estimés : historique d'emails
+        et lignes citées (« > ») retirés, puis début et fin conservés autour d'une coupure
+        """
+        if ComptabiliteJetons.estimer_jetons(texte) <= jetons_max:
+            return texte
+
+        historique = self.MOTIF_HISTORIQUE.search(texte)
+        if historique and texte[:historique.start()].strip():
+            texte = texte[:historique.start()]
+        texte = '\n'.join(ligne for ligne in texte.splitlines() if not ligne.lstrip().startswith('>'))
+        texte = re.sub(r'\n\s*\n+', '\n\n', texte).strip()
+
+        caracteres_max = jetons_max * 4
+        if len(texte) > caracteres_max:
+            debut = caracteres_max * 2 // 3
+            texte = f"{texte[:debut].rstrip()}\n[…]\n{texte[-(caracteres_max - debut - 5):].lstrip()}"
+        return texte
 
     def charger_instructions_si_necessaire(self):
         """Charge les instructions si pas encore fait"""
@@ -229,13 +1428,17 @@ class PerplexityReformulator:
                 self.instructions_manager = InstructionsManager()
             self.instructions = self.instructions_manager.instructions
 
-    def reformuler_texte(self, texte: str, type_reformulation: str) -> str:
+    @mesure('reformuler_texte', lambda texte: True)
+    def reformuler_texte(self, texte: str, type_reformulation: str, termes_sensibles: Tuple[str, ...] = (),
+                         operateur: Optional[str] = None) -> str:
         """
         Reformule un texte via l'API Perplexity
 
         Args:
             texte: Le texte à reformuler
             type_reformulation: 'description' ou 'solution'
+            termes_sensibles: Noms propres au ticket (appelant, demandeur) à masquer en plus de l'annuaire
+            operateur: Opérateur à qui imputer la consommation (par défaut OPERATEUR ou l'utilisateur système)
 
         Returns:
             Le texte reformulé
@@ -245,13 +1448,32 @@ class PerplexityReformulator:
         if type_reformulation not in self.instructions:
             raise ValueError(f"Type de reformulation invalide: {type_reformulation}")
 
+        operateur = operateur or self.operateur
+        depassement = self.comptabilite.depassement(operateur)
+        if depassement:
+            logger.warning("💰 Perplexity : %s, texte original conservé", depassement)
+            return texte
+
+        texte_reduit = self.reduire_texte(texte, self.config.jetons_entree_max)
+        if texte_reduit is not texte:
+            logger.info("✂️  Texte réduit avant envoi : %s → %s jetons estimés",
+                        ComptabiliteJetons.estimer_jetons(texte), ComptabiliteJetons.estimer_jetons(texte_reduit))
+
+        # Les données personnelles ne quittent pas le poste
+        texte_masque, correspondances = self.masqueur.masquer(texte_reduit, termes_sensibles)
+        instruction = self.instructions[type_reformulation]
+        if correspondances:
+            logger.debug("🕶️  %s donnée(s) personnelle(s) masquée(s)", len(correspondances))
+            instruction = f"{instruction}\n{self.CONSIGNE_REFERENCES}"
+
         payload = {
             "model": self.config.model,
             "messages": [
-                {"role": "system", "content": self.instructions[type_reformulation]},
-                {"role": "user", "content": texte}
+                {"role": "system", "content": instruction},
+                {"role": "user", "content": texte_masque}
             ],
-            "temperature": 0.05  # Température très basse pour minimiser la créativité
+            "temperature": 0.05,  # Température très basse pour minimiser la créativité
+            "max_tokens": self.max_tokens(type_reformulation)
         }
 
         headers = {
@@ -260,26 +1482,44 @@ class PerplexityReformulator:
         }
 
         try:
-            logger.info(f"🤖 Reformulation de la {type_reformulation} via Perplexity...")
-            response = requests.post(self.config.api_url, headers=headers, json=payload, timeout=30)
+            logger.info("🤖 Reformulation de la %s via Perplexity...", type_reformulation)
+            response = self.http.post(self.config.api_url, headers=headers, json=payload, timeout=30)
             response.raise_for_status()
 
             data = response.json()
+            self._comptabiliser(data, payload, operateur)
             if 'choices' in data and len(data['choices']) > 0:
-                texte_reformule = data['choices'][0]['message']['content'].strip()
-                logger.info(f"✅ {type_reformulation.capitalize()} reformulée avec succès")
+                texte_reformule = self.masqueur.restaurer(data['choices'][0]['message']['content'].strip(),
+                                                          correspondances)
+                logger.info("✅ %s reformulée avec succès", type_reformulation.capitalize())
                 return texte_reformule
             else:
-                logger.error(f"❌ Réponse inattendue de l'API Perplexity: {data}")
+                logger.error("❌ Réponse inattendue de l'API Perplexity: %s", data)
                 return texte
 
+        except CircuitOuvert as e:
+            logger.warning("⚡ %s : texte original conservé", e)
+            return texte
         except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Erreur lors de la reformulation {type_reformulation}: {e}")
+            logger.error("❌ Erreur lors de la reformulation %s: %s", type_reformulation, e)
             return texte
         except Exception as e:
-            logger.error(f"❌ Erreur inattendue lors de la reformulation: {e}")
+            logger.error("❌ Erreur inattendue lors de la reformulation: %s", e)
             return texte
 
+    def _comptabiliser(self, data: Dict[str, Any], payload: Dict[str, Any], operateur: str):
+        """Impute l'appel : bloc usage de la réponse, ou estimation locale s'il est absent"""
+        usage = data.get('usage') if isinstance(data, dict) else None
+        if isinstance(usage, dict) and 'prompt_tokens' in usage:
+            jetons_entree, jetons_sortie = int(usage['prompt_tokens']), int(usage.get('completion_tokens', 0))
+        else:
+            jetons_entree = sum(ComptabiliteJetons.estimer_jetons(m['content']) for m in payload['messages'])
+            choix = (data.get('choices') or [{}]) if isinstance(data, dict) else [{}]
+            jetons_sortie = ComptabiliteJetons.estimer_jetons(str(choix[0].get('message', {}).get('content', '')))
+
+        cout = self.comptabilite.enregistrer(operateur, jetons_entree, jetons_sortie)
+        logger.info("💰 Perplexity : %s + %s jetons (%.4f $, %s)", jetons_entree, jetons_sortie, cout, operateur)
+
 
 class InstructionsManager:
     """Gestionnaire des instructions de reformulation"""
@@ -333,7 +1573,7 @@ RÈGLES ULTRA-STRICTES :
             else:
                 return self.INSTRUCTIONS_PAR_DEFAUT.copy()
         except Exception as e:
-            logger.warning(f"Erreur lors du chargement des instructions: {e}")
+            logger.warning("Erreur lors du chargement des instructions: %s", e)
             return self.INSTRUCTIONS_PAR_DEFAUT.copy()
 
     def sauvegarder_instructions(self):
@@ -343,7 +1583,7 @@ RÈGLES ULTRA-STRICTES :
                 json.dump(self.instructions, f, ensure_ascii=False, indent=2)
             logger.info("Instructions sauvegardées")
         except Exception as e:
-            logger.error(f"Erreur lors de la sauvegarde des instructions: {e}")
+            logger.error("Erreur lors de la sauvegarde des instructions: %s", e)
 
     def configurer_instructions(self):
         """Configuration interactive des instructions de reformulation"""
@@ -473,15 +1713,517 @@ RÈGLES ULTRA-STRICTES :
             print(instruction)
 
 
+class EvaluationInstructions:
+    """
+    Banc d'évaluation des instructions de reformulation (--evaluer-instructions).
+
+    Chaque texte du corpus est reformulé en parallèle avec les instructions actuelles et,
+    si fourni, avec un jeu d'instructions candidat. Le rapport compare par variante et par
+    type : latence (p50/p95/p99), respect du « Maximum N lignes », jetons et coût imputés
+    (opérateur « evaluation:<variante> »), et fidélité (nombres ou noms propres de la
+    reformulation absents du texte source).
+    """
+
+    MOTIF_NOMBRE = re.compile(r'\d+(?:[.,]\d+)*')
+    MOTIF_MOT_MAJUSCULE = re.compile(r"\b[A-ZÀ-ÖØ-Þ][\w'’-]+")
+    ABREVIATIONS = ('M', 'Mme', 'Mlle', 'Mr', 'Mrs', 'Dr', 'Me', 'Pr', 'St', 'Ste')
+    EXEMPLES_MAX = 5
+
+    def __init__(self, exemples: List[Tuple[str, str]], variantes: Dict[str, Dict[str, str]],
+                 paralleles: int = 4):
+        self.exemples = exemples
+        self.variantes = variantes
+        self.paralleles = max(1, paralleles)
+        self.mesures = MetriquesPerformance()
+        self.reformulateurs: Dict[str, PerplexityReformulator] = {}
+        for variante, instructions in variantes.items():
+            reformulateur = PerplexityReformulator(PerplexityConfig())
+            reformulateur.instructions = instructions
+            self.reformulateurs[variante] = reformulateur
+
+    @staticmethod
+    def lire_corpus(chemin: str) -> List[Tuple[str, str]]:
+        """
+        Corpus JSONL au format du mode --lot : les champs description et solution
+        de chaque ligne donnent un exemple chacun
+        """
+        exemples = []
+        with open(chemin, 'r', encoding='utf-8') as f:
+            for numero_ligne, ligne in enumerate(f, 1):
+                if not ligne.strip():
+                    continue
+                try:
+                    donnees = json.loads(ligne)
+                except ValueError as e:
+                    raise ValueError(f"Ligne {numero_ligne} du corpus invalide: {e}")
+                for type_reformulation in ('description', 'solution'):
+                    texte = str(donnees.get(type_reformulation) or '').strip()
+                    if texte:
+                        exemples.append((type_reformulation, texte))
+        return exemples
+
+    @staticmethod
+    def lire_candidat(chemin: str, actuelles: Dict[str, str]) -> Dict[str, str]:
+        """Instructions candidates (même format que instructions_reformulation.json)"""
+        with open(chemin, 'r', encoding='utf-8') as f:
+            candidat = json.load(f)
+        if not isinstance(candidat, dict) or not all(isinstance(v, str) for v in candidat.values()):
+            raise ValueError(f"{chemin}: objet JSON {{type: instruction}} attendu")
+        # Les types absents du fichier gardent l'instruction actuelle
+        return dict(actuelles, **candidat)
+
+    @classmethod
+    def ajouts(cls, source: str, reformulation: str) -> Dict[str, List[str]]:
+        """Nombres et noms propres de la reformulation absents du texte source"""
+        nombres_source = {n.replace(',', '.') for n in cls.MOTIF_NOMBRE.findall(source)}
+        nombres = [n for n in cls.MOTIF_NOMBRE.findall(reformulation) if n.replace(',', '.') not in nombres_source]
+
+        mots_source = set(IndexHierarchique.decouper(IndexHierarchique.normaliser(source)))
+        noms = []
+        for mot in cls.MOTIF_MOT_MAJUSCULE.finditer(reformulation):
+            # La majuscule d'un début de phrase ou de ligne ne désigne pas un nom propre
+            precedent = reformulation[:mot.start()].rstrip(' \t')
+            debut_phrase = not precedent or precedent[-1] in '.!?:;\n-•*("«'
+            if precedent.endswith('.') and re.split(r'\W+', precedent[:-1])[-1] in cls.ABREVIATIONS:
+                debut_phrase = False
+            if debut_phrase:
+                continue
+            if not set(IndexHierarchique.decouper(IndexHierarchique.normaliser(mot.group()))) <= mots_source:
+                noms.append(mot.group())
+        return {'nombres': nombres, 'noms': noms}
+
+    def _evaluer(self, variante: str, type_reformulation: str, texte: str) -> Dict[str, Any]:
+        """Reformule un exemple et mesure le résultat"""
+        reformulateur = self.reformulateurs[variante]
+        debut = time.perf_counter()
+        reformulation = reformulateur.reformuler_texte(texte, type_reformulation,
+                                                       operateur=f"evaluation:{variante}")
+        duree = time.perf_counter() - debut
+        self.mesures.enregistrer(f"{variante}:{type_reformulation}", duree)
+        return {
+            'variante': variante, 'type': type_reformulation,
+            # reformuler_texte conserve le texte original en cas d'erreur (API, budget, disjoncteur)
+            'inchange': reformulation == texte,
+            'lignes': sum(1 for ligne in reformulation.splitlines() if ligne.strip()),
+            'ajouts': self.ajouts(texte, reformulation),
+            'source': texte, 'reformulation': reformulation,
+        }
+
+    def executer(self) -> Dict[str, Any]:
+        """Lance toutes les reformulations en parallèle et agrège le rapport par variante et par type"""
+        comptabilite = obtenir_comptabilite()
+        avant = comptabilite.resume_jour()['operateurs']
+        taches = [(variante, type_reformulation, texte)
+                  for variante in self.variantes for type_reformulation, texte in self.exemples]
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.paralleles, thread_name_prefix='evaluation') as executeur:
+            resultats = list(executeur.map(lambda tache: self._evaluer(*tache), taches))
+        duree = time.perf_counter() - debut
+        apres = comptabilite.resume_jour()['operateurs']
+
+        latences = self.mesures.resume()
+        rapport: Dict[str, Dict[str, Any]] = {}
+        for variante, instructions in self.variantes.items():
+            operateur = f"evaluation:{variante}"
+            consommation = {cle: apres.get(operateur, {}).get(cle, 0) - avant.get(operateur, {}).get(cle, 0)
+                            for cle in ('appels', 'jetons_entree', 'jetons_sortie', 'cout')}
+            rapport[variante] = {'consommation': dict(consommation, cout=round(consommation['cout'], 6)),
+                                 'types': {}}
+            for type_reformulation in sorted({t for t, _ in self.exemples}):
+                lignes_max = PerplexityReformulator.MOTIF_LIGNES_MAX.search(instructions.get(type_reformulation, ''))
+                lignes_max = int(lignes_max.group(1)) if lignes_max else None
+                selection = [r for r in resultats if r['variante'] == variante and r['type'] == type_reformulation]
+                infideles = [r for r in selection if r['ajouts']['nombres'] or r['ajouts']['noms']]
+                stats = latences.get(f"{variante}:{type_reformulation}", {})
+                rapport[variante]['types'][type_reformulation] = {
+                    'textes': len(selection),
+                    'inchanges': sum(1 for r in selection if r['inchange']),
+                    'latence_ms': {q: round(stats.get(q, 0) * 1000, 1) for q in ('p50', 'p95', 'p99')},
+                    'lignes_max': lignes_max,
+                    'lignes_moyenne': round(sum(r['lignes'] for r in selection) / len(selection), 2),
+                    'hors_limite': sum(1 for r in selection if lignes_max and r['lignes'] > lignes_max),
+                    'nombres_ajoutes': sum(1 for r in selection if r['ajouts']['nombres']),
+                    'noms_ajoutes': sum(1 for r in selection if r['ajouts']['noms']),
+                    'exemples_infideles': [{'source': r['source'], 'reformulation': r['reformulation'],
+                                            'ajouts': r['ajouts']} for r in infideles[:self.EXEMPLES_MAX]],
+                }
+
+        return {
+            'genere_le': datetime.now().isoformat(timespec='seconds'),
+            'exemples': len(self.exemples),
+            'paralleles': self.paralleles,
+            'duree_s': round(duree, 2),
+            'variantes': rapport,
+        }
+
+
+class IndexHierarchique:
+    """Index préfixe/approximatif sur les chemins complets (completename) GLPI"""
+
+    LONGUEUR_PREFIXE_MAX = 6
+
+    def __init__(self):
+        self.elements: List[Tuple[int, str]] = []
+        self.chemins_normalises: List[str] = []
+        self.noms_normalises: List[str] = []
+        self.profondeurs: List[int] = []
+        self.positions_par_mot: Dict[str, List[int]] = {}
+        self.mots_par_prefixe: Dict[str, set] = {}
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    @staticmethod
+    def normaliser(texte: str) -> str:
+        """Met en minuscules et retire les accents pour la comparaison"""
+        decompose = unicodedata.normalize('NFKD', str(texte).lower())
+        return ''.join(c for c in decompose if not unicodedata.combining(c))
+
+    @staticmethod
+    def decouper(texte: str) -> List[str]:
+        """Découpe un texte normalisé en mots"""
+        return re.findall(r'\w+', texte)
+
+    def construire(self, enregistrements: List[Tuple[int, str]]):
+        """Construit l'index à partir de couples (id, chemin complet)"""
+        self.__init__()
+
+        for position, (element_id, chemin) in enumerate(enregistrements):
+            chemin_normalise = self.normaliser(chemin)
+            segments = [s.strip() for s in chemin_normalise.split('>')]
+
+            self.elements.append((element_id, chemin))
+            self.chemins_normalises.append(chemin_normalise)
+            self.noms_normalises.append(segments[-1])
+            self.profondeurs.append(len(segments))
+
+            for mot in set(self.decouper(chemin_normalise)):
+                positions = self.positions_par_mot.get(mot)
+                if positions is None:
+                    positions = self.positions_par_mot[mot] = []
+                    for longueur in range(1, min(len(mot), self.LONGUEUR_PREFIXE_MAX) + 1):
+                        self.mots_par_prefixe.setdefault(mot[:longueur], set()).add(mot)
+                positions.append(position)
+
+    def _positions_terme(self, terme: str) -> set:
+        """Positions des éléments contenant un mot qui commence par le terme (ou proche)"""
+        mots = self.mots_par_prefixe.get(terme[:self.LONGUEUR_PREFIXE_MAX], ())
+        if len(terme) > self.LONGUEUR_PREFIXE_MAX:
+            mots = [m for m in mots if m.startswith(terme)]
+
+        if not mots:
+            # Recherche approximative sur le vocabulaire en cas de faute de frappe
+            mots = difflib.get_close_matches(terme, self.positions_par_mot.keys(), n=5, cutoff=0.75)
+
+        positions = set()
+        for mot in mots:
+            positions.update(self.positions_par_mot[mot])
+        return positions
+
+    def filtrer(self, requete: str, candidats: Optional[set] = None) -> set:
+        """Retourne les positions correspondant à tous les termes de la requête"""
+        termes = self.decouper(self.normaliser(requete))
+        if not termes:
+            return set(range(len(self.elements))) if candidats is None else set(candidats)
+
+        resultat = candidats
+        for terme in sorted(termes, key=len, reverse=True):
+            positions = self._positions_terme(terme)
+            resultat = positions if resultat is None else resultat & positions
+            if not resultat:
+                break
+        return resultat
+
+    def classer(self, positions: set, requete: str, limite: int) -> List[Tuple[int, str]]:
+        """Retourne les meilleurs éléments (feuille correspondante, profondeur, chemin)"""
+        requete_normalisee = self.normaliser(requete).strip()
+
+        def cle(position: int):
+            nom = self.noms_normalises[position]
+            if requete_normalisee and nom == requete_normalisee:
+                rang = 0
+            elif requete_normalisee and nom.startswith(requete_normalisee):
+                rang = 1
+            else:
+                rang = 2
+            return rang, self.profondeurs[position], self.chemins_normalises[position]
+
+        meilleures = heapq.nsmallest(limite, positions, key=cle)
+        return [self.elements[position] for position in meilleures]
+
+    def rechercher(self, requete: str, limite: int = 15) -> List[Tuple[int, str]]:
+        """Recherche directe : filtre puis classe les résultats"""
+        return self.classer(self.filtrer(requete), requete, limite)
+
+
+class SelecteurHierarchique:
+    """Sélection interactive d'une catégorie ou d'une entité avec filtrage incrémental"""
+
+    LIMITE_AFFICHAGE = 15
+
+    @staticmethod
+    def choisir(index: IndexHierarchique, libelle: str,
+                limite: int = LIMITE_AFFICHAGE) -> Optional[Tuple[int, str]]:
+        """
+        Laisse l'opérateur affiner une recherche jusqu'à choisir un élément
+
+        Args:
+            index: L'index des chemins complets
+            libelle: Libellé affiché ('catégorie', 'entité'...)
+            limite: Nombre maximum de résultats affichés
+
+        Returns:
+            Le couple (id, chemin complet) choisi, ou None si ignoré
+        """
+        print(f"   💡 {len(index)} {libelle}(s) disponibles")
+        print("   🔎 Tapez un texte pour filtrer (ex: 'copieur tech'), complétez-le pour affiner")
+        print("   ✅ Numéro pour choisir, '*' pour réinitialiser, Entrée pour ignorer")
+
+        requete = ""
+        candidats = None
+        affiches: List[Tuple[int, str]] = []
+
+        while True:
+            saisie = input(f"\n→ Filtre {libelle} [{requete}]: ").strip()
+
+            if not saisie:
+                print(f"⏩ Aucune {libelle} sélectionnée")
+                return None
+
+            if saisie.isdigit() and affiches:
+                choix_idx = int(saisie) - 1
+                if 0 <= choix_idx < len(affiches):
+                    element_id, chemin = affiches[choix_idx]
+                    print(f"✅ {libelle.capitalize()} sélectionnée: {chemin} (ID: {element_id})")
+                    return element_id, chemin
+                print(f"❌ Numéro invalide. Veuillez choisir entre 1 et {len(affiches)}")
+                continue
+
+            if saisie == '*':
+                requete, candidats = "", None
+            else:
+                # Une requête qui prolonge la précédente ne filtre que les candidats restants
+                prolonge = bool(requete) and IndexHierarchique.normaliser(saisie).startswith(
+                    IndexHierarchique.normaliser(requete))
+                candidats = index.filtrer(saisie, candidats if prolonge else None)
+                requete = saisie
+
+            positions = candidats if candidats is not None else set(range(len(index)))
+            affiches = index.classer(positions, requete, limite)
+
+            if not affiches:
+                print("   ⚠️  Aucun résultat, essayez un autre filtre ('*' pour réinitialiser)")
+                continue
+
+            print(f"   📋 {len(positions)} résultat(s), {len(affiches)} affiché(s):")
+            for i, (element_id, chemin) in enumerate(affiches, 1):
+                print(f"   {i}. {chemin}")
+
+
+class CorpsMultipart:
+    """
+    Corps multipart/form-data produit à la lecture : champs texte puis un fichier lu
+    par blocs sur le disque. La taille totale est connue d'avance (Content-Length),
+    le fichier n'est jamais chargé entièrement en mémoire.
+    """
+
+    def __init__(self, champs: List[Tuple[str, str, str]], nom_champ_fichier: str, chemin: str):
+        """
+        Args:
+            champs: Triplets (nom, valeur, type de contenu) envoyés avant le fichier
+            nom_champ_fichier: Nom du champ du fichier (ex: 'filename[0]')
+            chemin: Fichier à envoyer
+        """
+        self.frontiere = f"----glpi-{os.urandom(12).hex()}"
+        self.chemin = chemin
+        nom_fichier = os.path.basename(chemin).replace('"', '_')
+        type_fichier = mimetypes.guess_type(chemin)[0] or 'application/octet-stream'
+
+        entete = ''.join(f'--{self.frontiere}\r\nContent-Disposition: form-data; name="{nom}"\r\n'
+                         f'Content-Type: {type_contenu}\r\n\r\n{valeur}\r\n'
+                         for nom, valeur, type_contenu in champs)
+        entete += (f'--{self.frontiere}\r\nContent-Disposition: form-data; name="{nom_champ_fichier}"; '
+                   f'filename="{nom_fichier}"\r\nContent-Type: {type_fichier}\r\n\r\n')
+        self.segments = [entete.encode('utf-8'), None, f'\r\n--{self.frontiere}--\r\n'.encode('ascii')]
+        self.taille_fichier = os.path.getsize(chemin)
+        self.fichier = None
+        self.position = 0
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.frontiere}"
+
+    def __len__(self) -> int:
+        return len(self.segments[0]) + self.taille_fichier + len(self.segments[2])
+
+    def seek(self, position: int, whence: int = 0):
+        """Retour au début (nouvel envoi de la même requête)"""
+        if position != 0 or whence != 0:
+            raise OSError("CorpsMultipart ne peut être rembobiné qu'au début")
+        self.position = 0
+        if self.fichier:
+            self.fichier.seek(0)
+
+    def read(self, taille: int = -1) -> bytes:
+        if taille is None or taille < 0:
+            taille = len(self) - self.position
+        morceaux = []
+        while taille > 0 and self.position < len(self):
+            debut_fichier = len(self.segments[0])
+            fin_fichier = debut_fichier + self.taille_fichier
+            if self.position < debut_fichier:
+                morceau = self.segments[0][self.position:self.position + taille]
+            elif self.position < fin_fichier:
+                if self.fichier is None:
+                    self.fichier = open(self.chemin, 'rb')
+                morceau = self.fichier.read(min(taille, fin_fichier - self.position))
+                if not morceau:
+                    raise OSError(f"{self.chemin} a été tronqué pendant l'envoi")
+            else:
+                debut = self.position - fin_fichier
+                morceau = self.segments[2][debut:debut + taille]
+            morceaux.append(morceau)
+            self.position += len(morceau)
+            taille -= len(morceau)
+        return b''.join(morceaux)
+
+    def close(self):
+        if self.fichier:
+            self.fichier.close()
+            self.fichier = None
+
+    def __enter__(self) -> 'CorpsMultipart':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FicheUtilisateur:
+    """Demandeur de l'annuaire, réduit aux champs utilisés (prénoms et noms de famille internés)"""
+
+    __slots__ = ('id', 'name', 'realname', 'firstname', 'entities_id', 'cle_recherche')
+
+    def __init__(self, id: int, name: str, realname: str = '', firstname: str = '',
+                 entities_id: Optional[int] = None):
+        self.id = id
+        self.name = name
+        self.realname = sys.intern(realname)
+        self.firstname = sys.intern(firstname)
+        self.entities_id = entities_id
+        # Identifiant, nom et prénom en minuscules, pour la recherche par sous-chaîne
+        self.cle_recherche = f"{name}\n{realname}\n{firstname}".lower()
+
+    @classmethod
+    def depuis_glpi(cls, donnees: Dict[str, Any]) -> 'FicheUtilisateur':
+        """Construit la fiche depuis un enregistrement GLPI (les autres champs sont ignorés)"""
+        return cls(int(donnees['id']), str(donnees.get('name') or ''), str(donnees.get('realname') or ''),
+                   str(donnees.get('firstname') or ''), donnees.get('entities_id'))
+
+    def en_dict(self) -> Dict[str, Any]:
+        return {'id': self.id, 'name': self.name, 'firstname': self.firstname,
+                'realname': self.realname, 'entities_id': self.entities_id}
+
+
+class FicheEntite:
+    """Entité GLPI réduite à son nom, son chemin complet et son parent"""
+
+    __slots__ = ('id', 'name', 'completename', 'entities_id')
+
+    def __init__(self, id: int, name: str, completename: str, entities_id: Optional[int] = None):
+        self.id = id
+        self.name = name
+        self.completename = completename
+        self.entities_id = entities_id
+
+    @classmethod
+    def depuis_glpi(cls, donnees: Dict[str, Any]) -> 'FicheEntite':
+        """Construit la fiche depuis un enregistrement GLPI (nom absent ou nul : chaîne vide)"""
+        nom = str(donnees.get('name') or '')
+        parent = donnees.get('entities_id')
+        return cls(int(donnees['id']), nom, str(donnees.get('completename') or nom),
+                   int(parent) if parent not in (None, '') else None)
+
+
 class GLPIManager:
     """Gestionnaire pour l'API GLPI"""
 
+    # Options de recherche GLPI (/search/{itemtype}) des seuls champs utilisés par le script.
+    # Les entités et catégories liées sont renvoyées sous forme de chemin complet, les
+    # demandeurs et techniciens d'un ticket sous forme d'identifiant de connexion.
+    CHAMPS_RECHERCHE = {
+        'User': {'id': 2, 'name': 1, 'realname': 34, 'firstname': 9, 'entities_id': 77},
+        'Entity': {'id': 2, 'name': 14, 'completename': 1},
+        'ITILCategory': {'id': 2, 'name': 14, 'completename': 1},
+        'Ticket': {'id': 2, 'name': 1, 'status': 12, 'type': 14, 'priority': 3, 'date': 15, 'date_mod': 19,
+                   'solvedate': 17, 'closedate': 16, 'entities_id': 80, 'itilcategories_id': 7,
+                   'users_id_requester': 4, 'users_id_assign': 5, 'content': 21},
+    }
+    # Filtres booléens des annuaires : paramètre des listes complètes et option de recherche équivalente
+    FILTRES_ANNUAIRE = {
+        'User': {'is_requester': 99},
+    }
+
     def __init__(self, config: GLPIConfig):
+        importer_http()
         self.config = config
+        self.profil = config.profil
         self.session_token = None
         self.entities = {}
         self.categories = {}
-
+        self.index_entites = IndexHierarchique()
+        self.index_categories = IndexHierarchique()
+        self.parents_entites: Dict[int, int] = {}
+        self.toutes_entites: Dict[int, FicheEntite] = {}
+        self.chemins_entites: Dict[str, int] = {}
+        self.chemins_categories: Dict[int, str] = {}
+        self.projection = os.getenv('GLPI_PROJECTION', '1') != '0'
+        self.annuaire_utilisateurs: Optional[List[FicheUtilisateur]] = None
+        self.utilisateurs_par_id: Dict[int, FicheUtilisateur] = {}
+        self.date_annuaire = 0.0
+        self.duree_cache_annuaire = lire_entier('GLPI_CACHE_ANNUAIRE_TTL', 600)
+        self.cloture_automatique = os.getenv(f'{GLPIConfig.prefixe(self.profil)}CLOTURE_AUTOMATIQUE', '0') == '1'
+        self.verrou_session = threading.Lock()
+        # Un disjoncteur par instance : une instance indisponible n'ouvre pas le circuit des autres
+        self.nom_disjoncteur = f"glpi:{self.profil}" if self.profil else 'glpi'
+        self.session_http = None
+        self.verrou_http = threading.Lock()
+        self.appelants: Optional['IndexAppelants'] = None
+        self.verrou_appelants = threading.Lock()
+
+    @property
+    def http(self) -> 'requests.Session':
+        """Session HTTP créée au premier échange"""
+        if self.session_http is None:
+            with self.verrou_http:
+                if self.session_http is None:
+                    session = creer_session_http(disjoncteur=obtenir_disjoncteur(self.nom_disjoncteur))
+                    session.hooks['response'].append(self._renouveler_session_expiree)
+                    self.session_http = session
+        return self.session_http
+
+    def _renouveler_session_expiree(self, response, *args, **kwargs):
+        """Rejoue une fois une requête refusée pour session expirée, après réauthentification"""
+        requete = response.request
+        if (response.status_code != 401 or 'Session-Token' not in requete.headers
+                or requete.headers.get('X-Session-Renouvelee')):
+            return response
+
+        ancien_token = requete.headers['Session-Token']
+        with self.verrou_session:
+            # Un autre thread a peut-être déjà renouvelé la session
+            if self.session_token == ancien_token and not self.authentification():
+                return response
+
+        logger.info("🔄 Session GLPI renouvelée, nouvelle tentative")
+        if hasattr(requete.body, 'seek'):
+            requete.body.seek(0)
+        nouvelle_requete = requete.copy()
+        nouvelle_requete.headers['Session-Token'] = self.session_token
+        nouvelle_requete.headers['X-Session-Renouvelee'] = '1'
+        return self.http.send(nouvelle_requete, **kwargs)
+
+    @mesure('authentification', bool)
     def authentification(self) -> bool:
         """
         Authentification auprès de l'API GLPI
@@ -497,7 +2239,7 @@ class GLPIManager:
 
         try:
             logger.info("🔐 Initialisation de la session GLPI...")
-            response = requests.get(f"{self.config.api_url}/initSession", headers=headers, timeout=30)
+            response = self.http.get(f"{self.config.api_url}/initSession", headers=headers, timeout=30)
             response.raise_for_status()
 
             data = response.json()
@@ -506,11 +2248,11 @@ class GLPIManager:
                 logger.info("✅ Authentification GLPI réussie")
                 return True
             else:
-                logger.error(f"❌ Token de session non trouvé: {data}")
+                logger.error("❌ Token de session non trouvé: %s", data)
                 return False
 
         except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Erreur d'authentification GLPI: {e}")
+            logger.error("❌ Erreur d'authentification GLPI: %s", e)
             return False
 
     def fermer_session(self):
@@ -526,181 +2268,448 @@ class GLPIManager:
 
         try:
             logger.info("🔒 Fermeture de la session GLPI...")
-            response = requests.get(f"{self.config.api_url}/killSession", headers=headers, timeout=30)
+            response = self.http.get(f"{self.config.api_url}/killSession", headers=headers, timeout=30)
             response.raise_for_status()
             logger.info("✅ Session GLPI fermée")
         except Exception as e:
-            logger.warning(f"⚠️  Erreur lors de la fermeture de session: {e}")
-
-    def rechercher_utilisateurs(self, search_term: str) -> List[Dict[str, Any]]:
-        """Recherche des utilisateurs/demandeurs par terme de recherche"""
-        headers = {
-            'Session-Token': self.session_token,
-            'App-Token': self.config.app_token
-        }
-
+            logger.warning("⚠️  Erreur lors de la fermeture de session: %s", e)
+
+    def partager_annuaires(self, source: 'GLPIManager'):
+        """Réutilise les annuaires déjà chargés par un autre gestionnaire (sans requête)"""
+        self.entities, self.categories = source.entities, source.categories
+        self.index_entites, self.index_categories = source.index_entites, source.index_categories
+        self.parents_entites, self.toutes_entites = source.parents_entites, source.toutes_entites
+        self.chemins_entites = source.chemins_entites
+        self.annuaire_utilisateurs, self.date_annuaire = source.annuaire_utilisateurs, source.date_annuaire
+        self.utilisateurs_par_id = source.utilisateurs_par_id
+        self.appelants = source.obtenir_appelants()
+
+    def obtenir_appelants(self) -> 'IndexAppelants':
+        """
+        Index des appelants de l'instance, créé au premier appel et partagé par tous ses
+        pipelines : utilisateurs et imprimantes ne sont téléchargés qu'une fois
+        """
+        with self.verrou_appelants:
+            if self.appelants is None:
+                self.appelants = IndexAppelants(self, obtenir_journal())
+            return self.appelants
+
+    @mesure('charger_utilisateurs', lambda utilisateurs: True)
+    def charger_utilisateurs(self, forcer: bool = False) -> List[FicheUtilisateur]:
+        """Charge l'annuaire des demandeurs (conservé en cache GLPI_CACHE_ANNUAIRE_TTL secondes)"""
+        if (not forcer and self.annuaire_utilisateurs is not None
+                and time.monotonic() - self.date_annuaire < self.duree_cache_annuaire):
+            return self.annuaire_utilisateurs
+
+        utilisateurs = [FicheUtilisateur.depuis_glpi(u)
+                        for u in self._iterer_annuaire('User')
+                        if isinstance(u, dict) and 'id' in u]
+        self.annuaire_utilisateurs = utilisateurs
+        self.utilisateurs_par_id = {u.id: u for u in utilisateurs}
+        self.date_annuaire = time.monotonic()
+        logger.info("👥 %s utilisateurs chargés", len(utilisateurs))
+        return utilisateurs
+
+    def fiche_utilisateur(self, user_id: int) -> Optional[FicheUtilisateur]:
+        """Fiche d'un demandeur de l'annuaire, par identifiant"""
+        self.charger_utilisateurs()
+        return self.utilisateurs_par_id.get(user_id)
+
+    @mesure('rechercher_utilisateurs', lambda utilisateurs: True)
+    def rechercher_utilisateurs(self, search_term: str) -> List[FicheUtilisateur]:
+        """Recherche des utilisateurs/demandeurs par terme de recherche (identifiant, nom ou prénom)"""
         try:
-            params = {
-                'is_requester': True,
-                'range': '0-1000'
-            }
-
-            response = requests.get(f"{self.config.api_url}/User", headers=headers, params=params, timeout=30)
-
-            if response.status_code in [200, 206]:
-                users = response.json()
-
-                matching_users = []
-                search_term_lower = search_term.lower()
+            users = self.charger_utilisateurs()
 
-                for user in users:
-                    name = str(user.get('name', '')).lower()
-                    realname = str(user.get('realname', '')).lower()
-                    firstname = str(user.get('firstname', '')).lower()
+            search_term_lower = search_term.lower().replace('\n', ' ')
+            matching_users = [user for user in users if search_term_lower in user.cle_recherche]
 
-                    if (search_term_lower in name or 
-                        search_term_lower in realname or 
-                        search_term_lower in firstname):
-                        matching_users.append(user)
-
-                if matching_users:
-                    logger.info(f"✅ {len(matching_users)} utilisateur(s) trouvé(s) pour '{search_term}'")
-                    return matching_users
-                else:
-                    logger.warning(f"⚠️  Aucun utilisateur ne correspond à '{search_term}'")
-                    return []
+            if matching_users:
+                logger.info("✅ %s utilisateur(s) trouvé(s) pour '%s'", len(matching_users), search_term)
+                return matching_users
             else:
-                logger.error(f"❌ Erreur lors de la recherche d'utilisateurs. Code : {response.status_code}")
+                logger.warning("⚠️  Aucun utilisateur ne correspond à '%s'", search_term)
                 return []
 
         except Exception as e:
-            logger.error(f"❌ Exception lors de la recherche d'utilisateurs : {str(e)}")
+            logger.error("❌ Exception lors de la recherche d'utilisateurs : %s", e)
             return []
 
-    def charger_toutes_entites(self) -> Dict[int, Dict[str, Any]]:
-        """Charge toutes les entités avec leurs détails complets"""
-        headers = {
-            'Session-Token': self.session_token,
-            'App-Token': self.config.app_token
-        }
-
-        toutes_entites = {}
+    @mesure('charger_toutes_entites', lambda entites: True)
+    def charger_toutes_entites(self) -> Dict[int, FicheEntite]:
+        """Charge toutes les entités (nom, chemin complet) indexées par identifiant"""
+        self.charger_entites()
+        return self.toutes_entites
 
+    @mesure('trouver_entite_utilisateur', lambda entity_id: entity_id is not None)
+    def trouver_entite_utilisateur(self, user_id: int, nom_utilisateur: str) -> Optional[int]:
+        """Trouve l'entité d'un utilisateur"""
         try:
-            params = {
-                'range': '0-1000'
-            }
-
-            response = requests.get(f"{self.config.api_url}/Entity", headers=headers, params=params, timeout=30)
+            entity_id = self._entite_par_defaut(user_id)
+            if entity_id:
+                logger.info("✅ Entité trouvée directement pour l'utilisateur %s: %s", user_id, entity_id)
+                return entity_id
+        except Exception as e:
+            logger.warning("⚠️  Erreur lors de la récupération directe de l'entité : %s", e)
 
-            if response.status_code in [200, 206]:
-                entities = response.json()
+        logger.info("🔍 Recherche de l'entité pour '%s' dans toutes les entités...", nom_utilisateur)
 
-                for entity in entities:
-                    if isinstance(entity, dict) and 'id' in entity:
-                        toutes_entites[entity['id']] = entity
+        toutes_entites = self.toutes_entites or self.charger_toutes_entites()
+        nom_lower = nom_utilisateur.lower()
 
-                logger.info(f"📋 {len(toutes_entites)} entités chargées")
-                return toutes_entites
-            else:
-                logger.error(f"❌ Erreur lors du chargement des entités. Code : {response.status_code}")
-                return {}
+        entites_prioritaires = ['CLIENTS_HORS_CONTRAT', 'CLIENTS_SOUS_CONTRAT', 'COPIEUR']
 
-        except Exception as e:
-            logger.error(f"❌ Exception lors du chargement des entités : {str(e)}")
-            return {}
-
-    def trouver_entite_utilisateur(self, user_id: int, nom_utilisateur: str) -> Optional[int]:
-        """Trouve l'entité d'un utilisateur"""
-        headers = {
-            'Session-Token': self.session_token,
-            'App-Token': self.config.app_token
-        }
-
-        try:
-            response = requests.get(f"{self.config.api_url}/User/{user_id}", headers=headers, timeout=30)
-
-            if response.status_code == 200:
-                user_data = response.json()
-                entity_id = user_data.get('entities_id')
-                if entity_id:
-                    logger.info(f"✅ Entité trouvée directement pour l'utilisateur {user_id}: {entity_id}")
-                    return entity_id
-        except Exception as e:
-            logger.warning(f"⚠️  Erreur lors de la récupération directe de l'entité : {str(e)}")
-
-        logger.info(f"🔍 Recherche de l'entité pour '{nom_utilisateur}' dans toutes les entités...")
-
-        toutes_entites = self.charger_toutes_entites()
-        nom_lower = nom_utilisateur.lower()
-
-        entites_prioritaires = ['CLIENTS_HORS_CONTRAT', 'CLIENTS_SOUS_CONTRAT', 'COPIEUR']
-
-        for entity_id, entity_data in toutes_entites.items():
-            entity_name = str(entity_data.get('name', '')).lower()
-            entity_completename = str(entity_data.get('completename', '')).lower()
+        for entity_id, entity_data in toutes_entites.items():
+            entity_name = entity_data.name.lower()
+            entity_completename = entity_data.completename.lower()
 
             for prioritaire in entites_prioritaires:
                 if prioritaire.lower() in entity_completename and nom_lower in entity_name:
-                    logger.info(f"✅ Entité trouvée dans {prioritaire}: {entity_data['name']} (ID: {entity_id})")
-                    logger.info(f"📍 Chemin complet: {entity_data.get('completename', '')}")
+                    logger.info("✅ Entité trouvée dans %s: %s (ID: %s)", prioritaire, entity_data.name, entity_id)
+                    logger.info("📍 Chemin complet: %s", entity_data.completename)
                     return entity_id
 
         for entity_id, entity_data in toutes_entites.items():
-            entity_name = str(entity_data.get('name', '')).lower()
+            entity_name = entity_data.name.lower()
 
             if nom_lower in entity_name:
-                logger.info(f"✅ Entité trouvée: {entity_data['name']} (ID: {entity_id})")
-                logger.info(f"📍 Chemin complet: {entity_data.get('completename', '')}")
+                logger.info("✅ Entité trouvée: %s (ID: %s)", entity_data.name, entity_id)
+                logger.info("📍 Chemin complet: %s", entity_data.completename)
                 return entity_id
 
-        logger.warning(f"⚠️  Aucune entité trouvée pour '{nom_utilisateur}'")
+        logger.warning("⚠️  Aucune entité trouvée pour '%s'", nom_utilisateur)
+        return None
+
+    def _entite_par_defaut(self, user_id: int) -> Optional[int]:
+        """Entité par défaut d'un utilisateur, sans rapatrier sa fiche complète"""
+        if self.projection:
+            resultat = self.rechercher_items('User', [{'field': 2, 'searchtype': 'equals', 'value': user_id}],
+                                             forcedisplay=[self.CHAMPS_RECHERCHE['User']['entities_id']])
+            lignes = resultat.get('data') or []
+            if not lignes:
+                return None
+            if not self.chemins_entites:
+                self.charger_entites()
+            return self.chemins_entites.get(lignes[0].get(str(self.CHAMPS_RECHERCHE['User']['entities_id'])))
+
+        headers = {
+            'Session-Token': self.session_token,
+            'App-Token': self.config.app_token
+        }
+        response = self.http.get(f"{self.config.api_url}/User/{user_id}", headers=headers, timeout=30)
+        response.raise_for_status()
+        return response.json().get('entities_id')
+
+    @staticmethod
+    def _elements_json_flux(response, cle: Optional[str] = None, taille_bloc: int = 65536):
+        """
+        Décode au fil de l'eau les éléments d'un tableau JSON (racine, ou valeur de `cle`)
+        sans charger le corps complet en mémoire
+        """
+        decodeur = json.JSONDecoder()
+        utf8 = codecs.getincrementaldecoder('utf-8')()
+        blocs = response.iter_content(taille_bloc)
+        tampon, position, termine = '', 0, False
+
+        def lire_bloc() -> bool:
+            nonlocal tampon, position, termine
+            if termine:
+                return False
+            bloc = next(blocs, None)
+            termine = bloc is None
+            tampon = tampon[position:] + utf8.decode(bloc or b'', final=termine)
+            position = 0
+            return True
+
+        # Début du tableau
+        debut = re.compile(r'\s*\[' if cle is None else r'"%s"\s*:\s*\[' % re.escape(cle))
+        while True:
+            trouve = debut.match(tampon) if cle is None else debut.search(tampon)
+            if trouve:
+                position = trouve.end()
+                break
+            if cle is None and tampon.strip():
+                return  # La racine n'est pas un tableau
+            if not lire_bloc():
+                return
+
+        while True:
+            while position < len(tampon) and tampon[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(tampon):
+                if lire_bloc():
+                    continue
+                return
+            if tampon[position] == ']':
+                return
+            try:
+                element, fin = decodeur.raw_decode(tampon, position)
+            except json.JSONDecodeError:
+                if not lire_bloc():
+                    raise
+                continue
+            position = fin
+            yield element
+
+    @staticmethod
+    def _total_content_range(response) -> Optional[int]:
+        """Extrait le nombre total d'éléments de l'en-tête Content-Range (ex: 0-999/12345)"""
+        content_range = response.headers.get('Content-Range', '')
+        if '/' in content_range:
+            total = content_range.rsplit('/', 1)[1]
+            if total.isdigit():
+                return int(total)
         return None
 
-    def charger_entites(self):
-        """Charge la liste des entités"""
+    def _iterer_liste_paginee(self, endpoint: str, taille_page: int = 1000,
+                              params: Optional[Dict[str, Any]] = None, cle: Optional[str] = None):
+        """Parcourt tous les éléments d'un endpoint GLPI, page par page, en flux"""
         headers = {
             'Content-Type': 'application/json',
             'Session-Token': self.session_token,
             'App-Token': self.config.app_token
         }
 
-        try:
-            response = requests.get(f"{self.config.api_url}/Entity", headers=headers, timeout=30)
-            response.raise_for_status()
+        debut = 0
 
-            data = response.json()
-            for entity in data:
+        while True:
+            params_page = dict(params or {}, range=f"{debut}-{debut + taille_page - 1}")
+            with self.http.get(f"{self.config.api_url}/{endpoint}", headers=headers, params=params_page,
+                               timeout=30, stream=True) as response:
+                response.raise_for_status()
+
+                nombre = 0
+                for element in self._elements_json_flux(response, cle):
+                    nombre += 1
+                    yield element
+
+            if not nombre:
+                break
+            debut += nombre
+
+            total = self._total_content_range(response)
+            if total is not None:
+                if debut >= total:
+                    break
+            elif nombre < taille_page:
+                break
+
+    def iterer_recherche(self, itemtype: str, champs: Iterable[int], taille_page: int = 1000,
+                         criteres: Optional[List[Dict[str, Any]]] = None):
+        """Parcourt tous les résultats de /search/{itemtype} (colonnes champs), page par page, en flux"""
+        params = self.parametres_recherche(criteres or [], list(champs))
+        yield from self._iterer_liste_paginee(f"search/{itemtype}", taille_page, params, cle='data')
+
+    @classmethod
+    def criteres_annuaire(cls, itemtype: str) -> List[Dict[str, Any]]:
+        """Critères de recherche des FILTRES_ANNUAIRE de l'itemtype (ex: demandeurs seulement)"""
+        return [{'field': numero, 'searchtype': 'equals', 'value': 1}
+                for numero in cls.FILTRES_ANNUAIRE.get(itemtype, {}).values()]
+
+    def _charger_liste_paginee(self, endpoint: str, taille_page: int = 1000,
+                               params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Charge tous les éléments d'un endpoint GLPI, page par page"""
+        return list(self._iterer_liste_paginee(endpoint, taille_page, params))
+
+    def _iterer_annuaire(self, itemtype: str):
+        """
+        Parcourt un annuaire GLPI en ne rapatriant que les champs de CHAMPS_RECHERCHE
+        (moteur de recherche + forcedisplay), ou en liste complète si la projection est désactivée
+        (GLPI_PROJECTION=0) ou refusée par le serveur. Les FILTRES_ANNUAIRE s'appliquent dans
+        les deux cas, en critères de recherche ou en paramètres de la liste.
+        """
+        if self.projection:
+            champs = self.CHAMPS_RECHERCHE[itemtype]
+            if itemtype == 'User' and not self.chemins_entites:
+                self.charger_entites()
+            premier = True
+            try:
+                for ligne in self.iterer_recherche(itemtype, champs.values(),
+                                                   criteres=self.criteres_annuaire(itemtype)):
+                    premier = False
+                    element = {nom: ligne.get(str(numero)) for nom, numero in champs.items()}
+                    element['id'] = int(element['id'])
+                    if itemtype == 'User':
+                        element['entities_id'] = self.chemins_entites.get(element['entities_id'])
+                    yield element
+                return
+            except requests.exceptions.HTTPError as e:
+                if not premier:
+                    raise
+                logger.warning("⚠️  Recherche %s refusée (%s) : chargement des fiches complètes", itemtype, e)
+                self.projection = False
+
+        yield from self._iterer_liste_paginee(itemtype, params={nom: True for nom in
+                                                                self.FILTRES_ANNUAIRE.get(itemtype, {})})
+
+    @mesure('charger_entites', bool)
+    def charger_entites(self) -> bool:
+        """Charge la liste des entités et construit l'index des chemins complets"""
+        try:
+            entities, parents, chemins, toutes_entites = {}, {}, [], {}
+            for entity in self._iterer_annuaire('Entity'):
                 if isinstance(entity, dict) and 'id' in entity and 'name' in entity:
-                    self.entities[entity['name']] = entity['id']
+                    fiche = FicheEntite.depuis_glpi(entity)
+                    entities[fiche.name] = fiche.id
+                    chemins.append((fiche.id, fiche.completename))
+                    toutes_entites[fiche.id] = fiche
+                    if fiche.entities_id is not None:
+                        parents[fiche.id] = fiche.entities_id
+
+            # Sans la fiche complète, le parent se déduit du chemin complet ("A > B > C")
+            chemins_entites = {chemin: entity_id for entity_id, chemin in chemins}
+            for entity_id, chemin in chemins:
+                if entity_id not in parents and ' > ' in chemin:
+                    parent = chemins_entites.get(chemin.rsplit(' > ', 1)[0])
+                    if parent is not None:
+                        parents[entity_id] = toutes_entites[entity_id].entities_id = parent
+
+            index = IndexHierarchique()
+            index.construire(chemins)
+            self.entities, self.parents_entites, self.index_entites = entities, parents, index
+            self.toutes_entites, self.chemins_entites = toutes_entites, chemins_entites
+            logger.info("📋 %s entités chargées", len(self.entities))
+            return True
+
+        except Exception as e:
+            logger.warning("⚠️  Erreur lors du chargement des entités: %s", e)
+            return False
+
+    @mesure('charger_categories', bool)
+    def charger_categories(self) -> bool:
+        """Charge la liste des catégories ITIL et construit l'index des chemins complets"""
+        try:
+            categories, chemins = {}, []
+            for category in self._iterer_annuaire('ITILCategory'):
+                if isinstance(category, dict) and 'id' in category and 'name' in category:
+                    categories[category['name']] = category['id']
+                    chemins.append((category['id'], category.get('completename') or category['name']))
 
-            logger.info(f"📋 {len(self.entities)} entités chargées")
+            index = IndexHierarchique()
+            index.construire(chemins)
+            self.categories, self.index_categories, self.chemins_categories = categories, index, dict(chemins)
+            logger.info("📂 %s catégories chargées", len(self.index_categories))
+            return True
 
         except Exception as e:
-            logger.warning(f"⚠️  Erreur lors du chargement des entités: {e}")
+            logger.warning("⚠️  Erreur lors du chargement des catégories: %s", e)
+            return False
+
+    def ancetres_entite(self, entity_id: int) -> List[int]:
+        """Retourne l'entité et ses ancêtres (de la plus proche à la racine)"""
+        chaine = []
+        courante = entity_id
+        while courante is not None and courante not in chaine:
+            chaine.append(courante)
+            parent = self.parents_entites.get(courante)
+            courante = parent if parent != courante else None
+        return chaine
+
+    def rechercher_items(self, itemtype: str, criteres: List[Dict[str, Any]],
+                         forcedisplay: Optional[List[int]] = None, plage: str = '0-0',
+                         **options) -> Dict[str, Any]:
+        """
+        Interroge le moteur de recherche GLPI (/search/{itemtype})
+
+        Args:
+            itemtype: Type d'objet GLPI (Ticket, User...)
+            criteres: Liste de critères ({'field': 12, 'searchtype': 'equals', 'value': 'notold'})
+            forcedisplay: Identifiants des colonnes à retourner
+            plage: Plage de résultats demandée (ex: '0-49')
 
-    def charger_categories(self):
-        """Charge la liste des catégories ITIL"""
+        Returns:
+            La réponse de recherche (totalcount, data...)
+        """
         headers = {
             'Content-Type': 'application/json',
             'Session-Token': self.session_token,
             'App-Token': self.config.app_token
         }
 
-        try:
-            response = requests.get(f"{self.config.api_url}/ITILCategory", headers=headers, timeout=30)
+        params = dict(self.parametres_recherche(criteres, forcedisplay), range=plage, **options)
+
+        response = self.http.get(f"{self.config.api_url}/search/{itemtype}", headers=headers, params=params, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    @classmethod
+    def parametres_recherche(cls, criteres: List[Dict[str, Any]], forcedisplay: Optional[List[int]] = None,
+                             prefixe: str = 'criteria') -> Dict[str, Any]:
+        """Paramètres de requête d'une recherche ; un critère {'criteria': [...]} forme un groupe"""
+        params = {}
+        for i, critere in enumerate(criteres):
+            for cle, valeur in critere.items():
+                if cle == 'criteria':
+                    params.update(cls.parametres_recherche(valeur, prefixe=f"{prefixe}[{i}][criteria]"))
+                else:
+                    params[f"{prefixe}[{i}][{cle}]"] = valeur
+        for i, champ in enumerate(forcedisplay or []):
+            params[f"forcedisplay[{i}]"] = champ
+        return params
+
+    @mesure('page_recherche', lambda page: True)
+    def lire_page_recherche(self, itemtype: str, params: Dict[str, Any], debut: int, taille: int,
+                            validateurs: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Lit une page du moteur de recherche en flux
+
+        Args:
+            validateurs: Requête conditionnelle : l'ETag de la réponse précédente y est lu et
+                le nouveau y est noté ; 'non_modifie' vaut True si le serveur a répondu 304
+
+        Returns:
+            Le couple (lignes de la page, nombre total de résultats)
+        """
+        headers = {
+            'Content-Type': 'application/json',
+            'Session-Token': self.session_token,
+            'App-Token': self.config.app_token
+        }
+        if validateurs is not None and validateurs.get('etag'):
+            headers['If-None-Match'] = validateurs['etag']
+
+        params_page = dict(params, range=f"{debut}-{debut + taille - 1}")
+        with self.http.get(f"{self.config.api_url}/search/{itemtype}", headers=headers, params=params_page,
+                           timeout=60, stream=True) as response:
+            if validateurs is not None:
+                validateurs['non_modifie'] = response.status_code == 304
+                if validateurs['non_modifie']:
+                    return [], None
+                validateurs['etag'] = response.headers.get('ETag')
+            if response.status_code == 400 and 'ERROR_RANGE_EXCEEDED_TOTAL' in response.text:
+                return [], debut
             response.raise_for_status()
+            lignes = list(self._elements_json_flux(response, 'data'))
+        return lignes, self._total_content_range(response)
 
-            data = response.json()
-            for category in data:
-                if isinstance(category, dict) and 'id' in category and 'name' in category:
-                    self.categories[category['name']] = category['id']
+    def lister_sous_items(self, itemtype: str, item_id: int, sous_itemtype: str) -> List[Dict[str, Any]]:
+        """Liste les sous-éléments d'un objet (ex: /Group/12/Group_User)"""
+        headers = {
+            'Content-Type': 'application/json',
+            'Session-Token': self.session_token,
+            'App-Token': self.config.app_token
+        }
 
-            logger.info(f"📂 {len(self.categories)} catégories chargées")
+        response = self.http.get(f"{self.config.api_url}/{itemtype}/{item_id}/{sous_itemtype}",
+                                headers=headers, params={'range': '0-1000'}, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        return data if isinstance(data, list) else []
 
-        except Exception as e:
-            logger.warning(f"⚠️  Erreur lors du chargement des catégories: {e}")
+    def compter(self, itemtype: str) -> Optional[int]:
+        """Nombre d'éléments d'un type, lu dans le Content-Range d'une page d'un seul élément"""
+        headers = {
+            'Content-Type': 'application/json',
+            'Session-Token': self.session_token,
+            'App-Token': self.config.app_token
+        }
+
+        response = self.http.get(f"{self.config.api_url}/{itemtype}", headers=headers,
+                                 params={'range': '0-0'}, timeout=30)
+        response.raise_for_status()
+        return self._total_content_range(response)
 
+    @mesure('creer_ticket', lambda ticket_id: ticket_id is not None)
     def creer_ticket(self, ticket_data: Dict[str, Any]) -> Optional[int]:
         """Crée un ticket dans GLPI"""
         headers = {
@@ -713,26 +2722,63 @@ class GLPIManager:
 
         try:
             logger.info("🎫 Création du ticket dans GLPI...")
-            response = requests.post(f"{self.config.api_url}/Ticket", headers=headers, json=payload, timeout=30)
+            response = self.http.post(f"{self.config.api_url}/Ticket", headers=headers, json=payload, timeout=30)
             response.raise_for_status()
 
             data = response.json()
             if isinstance(data, dict) and 'id' in data:
                 ticket_id = data['id']
-                logger.info(f"✅ Ticket créé avec l'ID: {ticket_id}")
+                logger.info("✅ Ticket créé avec l'ID: %s", ticket_id, extra={'ticket_id': ticket_id})
                 return ticket_id
             elif isinstance(data, list) and len(data) > 0 and 'id' in data[0]:
                 ticket_id = data[0]['id']
-                logger.info(f"✅ Ticket créé avec l'ID: {ticket_id}")
+                logger.info("✅ Ticket créé avec l'ID: %s", ticket_id, extra={'ticket_id': ticket_id})
                 return ticket_id
             else:
-                logger.error(f"❌ Réponse inattendue lors de la création: {data}")
+                logger.error("❌ Réponse inattendue lors de la création: %s", data)
                 return None
 
         except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Erreur lors de la création du ticket: {e}")
+            logger.error("❌ Erreur lors de la création du ticket: %s", e)
+            return None
+
+    @mesure('joindre_document', lambda document_id: document_id is not None)
+    def joindre_document(self, ticket_id: int, chemin: str) -> Optional[int]:
+        """
+        Envoie un fichier sur /Document (multipart, lu par blocs) et le rattache au ticket
+
+        Returns:
+            L'identifiant du document créé, None en cas d'échec
+        """
+        headers = {
+            'Session-Token': self.session_token,
+            'App-Token': self.config.app_token
+        }
+
+        nom_fichier = os.path.basename(chemin)
+        manifeste = {'input': {'name': nom_fichier, '_filename': [nom_fichier],
+                               'itemtype': 'Ticket', 'items_id': ticket_id}}
+
+        try:
+            logger.info("📎 Envoi de %s au ticket %s...", nom_fichier, ticket_id, extra={'ticket_id': ticket_id})
+            with CorpsMultipart([('uploadManifest', json.dumps(manifeste, ensure_ascii=False), 'application/json')],
+                                'filename[0]', chemin) as corps:
+                headers['Content-Type'] = corps.content_type
+                response = self.http.post(f"{self.config.api_url}/Document", headers=headers, data=corps,
+                                          timeout=(30, 300))
+            response.raise_for_status()
+
+            data = response.json()
+            document_id = data.get('id') if isinstance(data, dict) else (data[0].get('id') if data else None)
+            logger.info("✅ %s joint au ticket %s (document %s)", nom_fichier, ticket_id, document_id,
+                        extra={'ticket_id': ticket_id})
+            return document_id
+
+        except (OSError, requests.exceptions.RequestException) as e:
+            logger.error("❌ Échec de l'envoi de %s : %s", nom_fichier, e, extra={'ticket_id': ticket_id})
             return None
 
+    @mesure('ajouter_solution', bool)
     def ajouter_solution(self, ticket_id: int, solution: str) -> bool:
         """Ajoute une solution à un ticket via ITILSolution"""
         headers = {
@@ -751,8 +2797,8 @@ class GLPIManager:
         payload = {"input": solution_data}
 
         try:
-            logger.info(f"💡 Ajout de solution au ticket {ticket_id}...")
-            response = requests.post(f"{self.config.api_url}/ITILSolution", headers=headers, json=payload, timeout=30)
+            logger.info("💡 Ajout de solution au ticket %s...", ticket_id, extra={'ticket_id': ticket_id})
+            response = self.http.post(f"{self.config.api_url}/ITILSolution", headers=headers, json=payload, timeout=30)
             response.raise_for_status()
 
             data = response.json()
@@ -760,10 +2806,11 @@ class GLPIManager:
             return True
 
         except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Erreur lors de l'ajout de solution: {e}")
-            logger.error(f"Réponse: {e.response.text if hasattr(e, 'response') else 'N/A'}")
+            logger.error("❌ Erreur lors de l'ajout de solution: %s", e)
+            logger.error("Réponse: %s", e.response.text if hasattr(e, 'response') else 'N/A')
             return False
 
+    @mesure('mettre_a_jour_statut', bool)
     def mettre_a_jour_statut(self, ticket_id: int, statut: int) -> bool:
         """Met à jour le statut d'un ticket"""
         headers = {
@@ -775,17 +2822,187 @@ class GLPIManager:
         payload = {"input": {"status": statut}}
 
         try:
-            logger.info(f"📝 Mise à jour du statut du ticket {ticket_id} vers {statut}...")
-            response = requests.put(f"{self.config.api_url}/Ticket/{ticket_id}", headers=headers, json=payload, timeout=30)
+            logger.info("📝 Mise à jour du statut du ticket %s vers %s...", ticket_id, statut,
+                        extra={'ticket_id': ticket_id})
+            response = self.http.put(f"{self.config.api_url}/Ticket/{ticket_id}", headers=headers, json=payload, timeout=30)
             response.raise_for_status()
 
             logger.info("✅ Statut mis à jour avec succès")
             return True
 
         except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Erreur lors de la mise à jour du statut: {e}")
+            logger.error("❌ Erreur lors de la mise à jour du statut: %s", e)
             return False
 
+    @mesure('resoudre_ticket', lambda rapport: not rapport['erreurs'])
+    def resoudre_ticket(self, ticket_id: int, solution: str, cloturer: bool = True,
+                        avant_cloture=None) -> Dict[str, Any]:
+        """
+        Solution puis clôture d'un ticket qui vient d'être créé (ticket résolu pendant l'appel)
+
+        GLPI refuse une solution sur un ticket clos et n'a pas d'écriture groupée entre types :
+        les deux écritures se suivent sur la connexion déjà ouverte. Avec
+        GLPI_CLOTURE_AUTOMATIQUE=1 (entités à délai de clôture automatique nul), la solution
+        clôt le ticket et la mise à jour du statut est omise.
+
+        Args:
+            avant_cloture: Appelé avant que le ticket ne soit clos (ex: attente des pièces jointes)
+
+        Returns:
+            solution_ajoutee, cloture et erreurs. Un ticket dont la solution échoue reste
+            ouvert (jamais supprimé) pour que l'opérateur ajoute la solution à nouveau ; si
+            seule la clôture échoue, il reste résolu.
+        """
+        rapport: Dict[str, Any] = {'erreurs': []}
+        if cloturer and self.cloture_automatique and avant_cloture:
+            avant_cloture()
+
+        rapport['solution_ajoutee'] = self.ajouter_solution(ticket_id, solution)
+        if not rapport['solution_ajoutee']:
+            rapport['erreurs'].append(f"Échec de l'ajout de la solution (ticket {ticket_id} resté ouvert, "
+                                      "solution à ajouter à nouveau)")
+            return rapport
+
+        if cloturer:
+            if self.cloture_automatique:
+                rapport['cloture'] = True
+            else:
+                if avant_cloture:
+                    avant_cloture()
+                rapport['cloture'] = self.mettre_a_jour_statut(ticket_id, 6)
+            if not rapport['cloture']:
+                rapport['erreurs'].append("Échec de la clôture du ticket (ticket résolu, non clos)")
+        return rapport
+
+
+class RepartiteurTechniciens:
+    """Attribution équilibrée des tickets entre les techniciens d'un pool configuré"""
+
+    TECHNICIEN_PAR_DEFAUT = 233
+    DUREE_CACHE = 300  # secondes entre deux rafraîchissements des charges
+
+    def __init__(self, glpi: GLPIManager):
+        self.glpi = glpi
+        self.technicien_defaut = lire_entier('GLPI_TECHNICIEN_DEFAUT', self.TECHNICIEN_PAR_DEFAUT)
+        self.duree_cache = lire_entier('GLPI_REPARTITION_TTL', self.DUREE_CACHE)
+        self.techniciens_configures = self._lire_ids('GLPI_TECHNICIENS')
+        self.groupes = self._lire_ids('GLPI_GROUPES_TECHNICIENS')
+
+        self.charges: Dict[int, int] = {}
+        self.entites_techniciens: Dict[int, List[Tuple[int, bool]]] = {}
+        self.dernier_rafraichissement: Optional[float] = None
+        self.verrou = threading.Lock()
+
+    @staticmethod
+    def _lire_ids(variable: str) -> List[int]:
+        """Lit une liste d'identifiants séparés par des virgules"""
+        valeur = os.getenv(variable, '')
+        return [int(v) for v in re.split(r'[,;\s]+', valeur) if v.isdigit()]
+
+    @property
+    def actif(self) -> bool:
+        """Le répartiteur n'est actif que si un pool est configuré"""
+        return bool(self.techniciens_configures or self.groupes)
+
+    def _charger_pool(self) -> List[int]:
+        """Construit le pool : techniciens configurés + membres des groupes"""
+        pool = list(self.techniciens_configures)
+
+        for groupe_id in self.groupes:
+            try:
+                for membre in self.glpi.lister_sous_items('Group', groupe_id, 'Group_User'):
+                    user_id = membre.get('users_id')
+                    if user_id and user_id not in pool:
+                        pool.append(user_id)
+            except Exception as e:
+                logger.warning("⚠️  Impossible de charger les membres du groupe %s: %s", groupe_id, e)
+
+        return pool
+
+    def _charger_habilitations(self, technicien_id: int) -> List[Tuple[int, bool]]:
+        """Entités (et récursivité) sur lesquelles le technicien a un profil"""
+        try:
+            profils = self.glpi.lister_sous_items('User', technicien_id, 'Profile_User')
+            return [(p['entities_id'], bool(p.get('is_recursive'))) for p in profils if 'entities_id' in p]
+        except Exception as e:
+            logger.warning("⚠️  Habilitations du technicien %s indisponibles: %s", technicien_id, e)
+            return []
+
+    def _compter_tickets_ouverts(self, technicien_id: int) -> int:
+        """Nombre de tickets non résolus attribués au technicien (une seule requête de comptage)"""
+        criteres = [
+            {'field': 12, 'searchtype': 'equals', 'value': 'notold'},
+            {'link': 'AND', 'field': 5, 'searchtype': 'equals', 'value': technicien_id}
+        ]
+        resultat = self.glpi.rechercher_items('Ticket', criteres, forcedisplay=[2], plage='0-0')
+        return int(resultat.get('totalcount', 0))
+
+    def rafraichir(self):
+        """Recharge le pool, les habilitations et les charges de tous les techniciens"""
+        pool = self._charger_pool()
+        if not pool:
+            return
+
+        logger.info("👨‍💻 Rafraîchissement de la charge de %s technicien(s)...", len(pool))
+
+        with ThreadPoolExecutor(max_workers=min(8, len(pool))) as executor:
+            charges = dict(zip(pool, executor.map(self._compter_tickets_ouverts_sans_erreur, pool)))
+            habilitations = dict(zip(pool, executor.map(self._charger_habilitations, pool)))
+
+        with self.verrou:
+            self.charges = {tech: charge for tech, charge in charges.items() if charge is not None}
+            self.entites_techniciens = habilitations
+            self.dernier_rafraichissement = time.monotonic()
+
+    def _compter_tickets_ouverts_sans_erreur(self, technicien_id: int) -> Optional[int]:
+        """Comptage tolérant aux erreurs (None si la charge est inconnue)"""
+        try:
+            return self._compter_tickets_ouverts(technicien_id)
+        except Exception as e:
+            logger.warning("⚠️  Charge du technicien %s indisponible: %s", technicien_id, e)
+            return None
+
+    def _peut_traiter(self, technicien_id: int, ancetres: List[int]) -> bool:
+        """Vérifie qu'un technicien a un profil sur l'entité (ou un parent récursif)"""
+        habilitations = self.entites_techniciens.get(technicien_id)
+        if not habilitations:
+            return True  # Habilitations inconnues : on ne filtre pas
+
+        for entite, recursif in habilitations:
+            if entite == ancetres[0] or (recursif and entite in ancetres):
+                return True
+        return False
+
+    def choisir_technicien(self, entity_id: int) -> Tuple[int, Optional[int]]:
+        """
+        Choisit le technicien le moins chargé habilité sur l'entité
+
+        Returns:
+            Le couple (id du technicien, nombre de tickets ouverts ou None si inconnu)
+        """
+        if not self.actif:
+            return self.technicien_defaut, None
+
+        if (self.dernier_rafraichissement is None
+                or time.monotonic() - self.dernier_rafraichissement > self.duree_cache):
+            self.rafraichir()
+
+        ancetres = self.glpi.ancetres_entite(entity_id)
+
+        with self.verrou:
+            if not self.charges:
+                return self.technicien_defaut, None
+
+            eligibles = [t for t in self.charges if self._peut_traiter(t, ancetres)] or list(self.charges)
+            technicien_id = min(eligibles, key=lambda t: (self.charges[t], t))
+            return technicien_id, self.charges[technicien_id]
+
+    def enregistrer_affectation(self, technicien_id: int):
+        """Met à jour la charge locale sans attendre le prochain rafraîchissement"""
+        with self.verrou:
+            if technicien_id in self.charges:
+                self.charges[technicien_id] += 1
+
 
 class TicketCollector:
     """Collecteur d'informations pour le ticket"""
@@ -800,12 +3017,16 @@ class TicketCollector:
         print("  🤖 Powered by Perplexity AI")
         print("=" * 70)
 
+    MOTIF_EMAIL = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+    # Téléphone dans un texte libre : format de valider_telephone, séparateurs « . » ou « - » et +33 acceptés
+    MOTIF_TELEPHONE_TEXTE = r'(?<![\d+])(?:\+33\s?|0)[1-9](?:[\s.-]?\d{2}){4}(?!\d)'
+
     @staticmethod
     def valider_email(email: str) -> bool:
         """Valide le format d'un email"""
         if not email:
             return True
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+        pattern = rf'^{TicketCollector.MOTIF_EMAIL}$'
         return re.match(pattern, email) is not None
 
     @staticmethod
@@ -924,6 +3145,16 @@ class TicketCollector:
                 break
             print("   ❌ La description ne peut pas être vide")
 
+        # Pièces jointes (optionnelles)
+        while True:
+            print("\n📎 Pièces jointes (chemins séparés par « ; », Entrée pour aucune):")
+            chemins = [c.strip().strip('"') for c in input("   → ").split(';') if c.strip()]
+            introuvables = [c for c in chemins if not os.path.isfile(c)]
+            if not introuvables:
+                informations['pieces_jointes'] = chemins
+                break
+            print(f"   ❌ Fichier(s) introuvable(s): {', '.join(introuvables)}")
+
         # Nom du demandeur
         while True:
             print("\n🏢 Nom du demandeur (utilisateur GLPI):")
@@ -971,150 +3202,3137 @@ class TicketCollector:
         return template
 
 
-def afficher_aide():
-    """Affiche l'aide du script"""
-    print("""
-🎫 SCRIPT D'AUTOMATISATION DE TICKETS GLPI
-==========================================
-
-UTILISATION:
-  python glpi_ticket_automation.py [OPTIONS]
-
-OPTIONS:
-  --config         Configuration interactive des variables d'environnement
-  --instructions   Configuration des instructions de reformulation IA
-  --help, -h       Affiche cette aide
+class IndexAppelants:
+    """
+    Reconnaissance des appelants : téléphone ou numéro de série → (demandeur, entité).
 
-EXEMPLES:
-  python glpi_ticket_automation.py --config
-    └─ Configure les tokens GLPI et la clé Perplexity
+    L'index est alimenté par le journal local (tickets déjà créés, le plus récent
+    l'emporte), par les téléphones des fiches utilisateurs et les numéros de série des
+    imprimantes GLPI (chargés en arrière-plan), puis par chaque ticket créé. Une
+    recherche est une simple lecture de dictionnaire.
+    """
 
-  python glpi_ticket_automation.py --instructions  
-    └─ Modifie les instructions de reformulation
+    # Options de recherche GLPI des champs lus pour l'index
+    CHAMPS_RECHERCHE = {
+        'User': {'id': 2, 'phone': 6, 'phone2': 10, 'mobile': 11, 'entities_id': 77},
+        'Printer': {'id': 2, 'serial': 5, 'entities_id': 80},
+    }
 
-  python glpi_ticket_automation.py
-    └─ Lance le script normal de création de tickets
+    def __init__(self, glpi: GLPIManager, journal: Optional[JournalTickets] = None):
+        self.glpi = glpi
+        self.journal = journal
+        self.par_telephone: Dict[int, Tuple[Optional[int], Optional[int]]] = {}
+        self.par_serie: Dict[str, Tuple[Optional[int], Optional[int]]] = {}
+        self.verrou = threading.Lock()
+        self.journal_charge = False
+        self.chargement_glpi: Optional[threading.Thread] = None
 
-PRÉREQUIS:
-  - Fichier .env configuré (utilisez --config)
-  - Instructions de reformulation (utilisez --instructions si besoin)
-""")
+    def __len__(self) -> int:
+        return len(self.par_telephone) + len(self.par_serie)
 
+    @staticmethod
+    def cle_telephone(telephone: Optional[str]) -> Optional[int]:
+        """Numéro normalisé (chiffres au format national) sous forme d'entier compact"""
+        chiffres = JournalTickets.chiffres_telephone(telephone or '')
+        return int(chiffres) if len(chiffres) >= 9 else None
 
-def main_creation_tickets():
-    """Fonction principale de création de tickets"""
-    try:
-        # Configuration
-        glpi_config = GLPIConfig()
-        perplexity_config = PerplexityConfig()
+    @staticmethod
+    def cle_serie(numero_serie: Optional[str]) -> Optional[str]:
+        cle = re.sub(r'[^0-9A-Za-z]', '', numero_serie or '').upper()
+        return cle if len(cle) >= 4 else None
+
+    def _ajouter(self, telephones: Tuple[Optional[str], ...], numero_serie: Optional[str],
+                 appelant: Tuple[Optional[int], Optional[int]], remplacer: bool = True):
+        for telephone in telephones:
+            cle = self.cle_telephone(telephone)
+            if cle is not None and (remplacer or cle not in self.par_telephone):
+                self.par_telephone[cle] = appelant
+        cle = self.cle_serie(numero_serie)
+        if cle is not None and (remplacer or cle not in self.par_serie):
+            self.par_serie[cle] = appelant
+
+    def _charger_journal(self):
+        if self.journal_charge:
+            return
+        with self.verrou:
+            if self.journal_charge:
+                return
+            if self.journal:
+                for telephone, numero_serie, user_id, entity_id in self.journal.iterer_appelants(self.glpi.profil):
+                    self._ajouter((telephone,), numero_serie, (user_id, entity_id))
+            self.journal_charge = True
+
+    def charger_glpi(self):
+        """Téléphones des utilisateurs et numéros de série des imprimantes (sans écraser le journal)"""
+        if not self.glpi.chemins_entites:
+            self.glpi.charger_entites()
+        nombre = len(self)
+        for itemtype, champs in self.CHAMPS_RECHERCHE.items():
+            try:
+                for ligne in self.glpi.iterer_recherche(itemtype, champs.values(),
+                                                        criteres=self.glpi.criteres_annuaire(itemtype)):
+                    valeurs = {nom: ligne.get(str(numero)) for nom, numero in champs.items()}
+                    entity_id = self.glpi.chemins_entites.get(valeurs['entities_id'])
+                    if itemtype == 'User':
+                        appelant = (int(valeurs['id']), entity_id)
+                        telephones = (valeurs['phone'], valeurs['phone2'], valeurs['mobile'])
+                        numero_serie = None
+                    else:
+                        appelant = (None, entity_id)
+                        telephones, numero_serie = (), valeurs['serial']
+                    with self.verrou:
+                        self._ajouter(telephones, numero_serie, appelant, remplacer=False)
+            except requests.exceptions.RequestException as e:
+                logger.warning("⚠️  Index des appelants : %s non chargés (%s)", itemtype, e)
+        logger.info("📇 Index des appelants : %s numéro(s) ajouté(s) depuis GLPI", len(self) - nombre)
+
+    def _preparer(self):
+        """Charge le journal au premier appel et lance le chargement GLPI en arrière-plan"""
+        self._charger_journal()
+        if self.chargement_glpi is None and self.glpi.session_token:
+            with self.verrou:
+                if self.chargement_glpi is None:
+                    self.chargement_glpi = threading.Thread(target=self.charger_glpi, name='index-appelants',
+                                                            daemon=True)
+                    self.chargement_glpi.start()
+
+    def trouver(self, telephone: Optional[str], numero_serie: Optional[str] = None
+                ) -> Optional[Tuple[Optional[int], Optional[int], str]]:
+        """
+        Recherche un appelant connu
 
-        # Initialisation des managers
-        glpi = GLPIManager(glpi_config)
-        reformulator = PerplexityReformulator(perplexity_config)
+        Returns:
+            Le triplet (id utilisateur ou None, id entité ou None, 'telephone' ou 'serie'), ou None
+        """
+        self._preparer()
+        cle = self.cle_telephone(telephone)
+        if cle is not None and cle in self.par_telephone:
+            return self.par_telephone[cle] + ('telephone',)
+        cle = self.cle_serie(numero_serie)
+        if cle is not None and cle in self.par_serie:
+            return self.par_serie[cle] + ('serie',)
+        return None
 
-        # Authentification GLPI
-        if not glpi.authentification():
-            logger.error("❌ Échec de l'authentification GLPI")
-            sys.exit(1)
+    def enregistrer(self, telephone: Optional[str], numero_serie: Optional[str],
+                    user_id: Optional[int], entity_id: Optional[int]):
+        """Met à jour l'index après un ticket créé pour un demandeur identifié"""
+        if user_id:
+            with self.verrou:
+                self._ajouter((telephone,), numero_serie, (user_id, entity_id))
+
+
+class PipelineTicket:
+    """Création de ticket non interactive : demandeur → entité → technicien → reformulation → GLPI"""
+
+    CHAMPS_OBLIGATOIRES = ['titre', 'nom_appelant', 'telephone', 'description', 'demandeur']
+    TYPES_TICKETS = {'1': 'Incident', '2': 'Demande'}
+
+    def __init__(self, glpi: GLPIManager, reformulator: PerplexityReformulator,
+                 repartiteur: Optional[RepartiteurTechniciens] = None):
+        self.glpi = glpi
+        self.reformulator = reformulator
+        self.repartiteur = repartiteur or RepartiteurTechniciens(glpi)
+        self.reformulator.masqueur.associer_annuaires(glpi)
+        self.envois = ThreadPoolExecutor(max_workers=max(1, lire_entier('GLPI_ENVOIS_PARALLELES', 4)),
+                                         thread_name_prefix='envoi')
+        self.journal = obtenir_journal()
+        self.appelants = glpi.obtenir_appelants()
+
+    def fermer(self):
+        """Arrête le pool d'envois (pièces jointes et reformulations en cours terminées)"""
+        self.envois.shutdown(wait=True)
+
+    @classmethod
+    def valider(cls, informations: Dict[str, Any]) -> Dict[str, Any]:
+        """Contrôle les informations avec les mêmes règles que la saisie interactive"""
+        informations = dict(informations)
+
+        manquants = [c for c in cls.CHAMPS_OBLIGATOIRES if not str(informations.get(c) or '').strip()]
+        if manquants:
+            raise ValueError(f"Champs obligatoires manquants: {', '.join(manquants)}")
+        non_textes = [c for c in cls.CHAMPS_OBLIGATOIRES if not isinstance(informations[c], str)]
+        if non_textes:
+            raise ValueError(f"Champs à renseigner en texte: {', '.join(non_textes)}")
+
+        if informations['telephone'] != "Non renseigné" and not TicketCollector.valider_telephone(informations['telephone']):
+            raise ValueError(f"Format de téléphone invalide: {informations['telephone']}")
+
+        numero_serie = str(informations.get('numero_serie') or '').strip()
+        if not TicketCollector.valider_numero_serie(numero_serie):
+            raise ValueError(f"Format de numéro de série invalide: {numero_serie}")
+        informations['numero_serie'] = numero_serie
+
+        email = str(informations.get('email') or '').strip()
+        if email == "Non renseigné":
+            email = ''
+        if not TicketCollector.valider_email(email):
+            raise ValueError(f"Format d'email invalide: {email}")
+        informations['email'] = email if email else "Non renseigné"
+
+        type_ticket = str(informations.get('type_ticket', '1'))
+        if type_ticket not in cls.TYPES_TICKETS:
+            raise ValueError(f"Type de ticket invalide: {type_ticket} (1=Incident, 2=Demande)")
+        informations['type_ticket'] = type_ticket
+        informations['type_ticket_nom'] = cls.TYPES_TICKETS[type_ticket]
+
+        pieces_jointes = informations.get('pieces_jointes') or []
+        if isinstance(pieces_jointes, str):
+            pieces_jointes = [pieces_jointes]
+        if not isinstance(pieces_jointes, list) or not all(isinstance(p, str) for p in pieces_jointes):
+            raise ValueError("pieces_jointes doit être un chemin ou une liste de chemins")
+        informations['pieces_jointes'] = pieces_jointes
+
+        # Résolu pendant l'appel : solution et clôture enchaînées dès la création
+        if informations.get('resolu_en_ligne'):
+            if not str(informations.get('solution') or '').strip():
+                raise ValueError("resolu_en_ligne demande une solution")
+            informations['cloturer'] = True
 
-        # Chargement des données GLPI
-        glpi.charger_entites()
-        glpi.charger_categories()
+        return informations
 
+    @classmethod
+    def preparer(cls, numero_ligne: int, ligne: str) -> Tuple[int, Optional[Dict[str, Any]], Optional[str]]:
+        """Étage CPU d'un import --lot (voir ImportParallele) : (n° de ligne, informations contrôlées, erreur)"""
         try:
-            # Collecte des informations
-            informations = TicketCollector.collecter_informations()
+            informations = json.loads(ligne)
+            if not isinstance(informations, dict):
+                raise ValueError("Un objet JSON est attendu")
+            return numero_ligne, cls.valider(informations), None
+        except ValueError as e:
+            return numero_ligne, None, str(e)
+
+    def resoudre_demandeur(self, demandeur: str) -> Tuple[Optional[int], int, str]:
+        """
+        Recherche le demandeur et son entité sans interaction
 
-            print("\n" + "=" * 70)
-            print("  📝 RÉSUMÉ DES INFORMATIONS COLLECTÉES")
-            print("=" * 70)
-            print(f"🎯 Titre: {informations['titre']}")
-            print(f"👤 Appelant: {informations['nom_appelant']}")
-            print(f"🏢 Demandeur recherché: {informations['demandeur']}")
-            print(f"🎫 Type: {informations['type_ticket_nom']}")
+        Returns:
+            Le triplet (id utilisateur ou None, id entité, nom du client)
+        """
+        users_found = self.glpi.rechercher_utilisateurs(demandeur)
+        if not users_found:
+            return None, 1, demandeur
 
-            # Recherche de l'utilisateur/demandeur
-            print("\n🔍 RECHERCHE DE L'UTILISATEUR DANS GLPI")
-            print("=" * 50)
+        # Priorité à l'identifiant exact, sinon premier résultat
+        demandeur_lower = demandeur.lower()
+        user = next((u for u in users_found if u.name.lower() == demandeur_lower), users_found[0])
+        user_name = user.name or 'Inconnu'
 
-            users_found = glpi.rechercher_utilisateurs(informations['demandeur'])
-            user_id = None
-            entity_id = 1
-            nom_client_reel = informations['demandeur']
+        entity_id = self.glpi.trouver_entite_utilisateur(user.id, user_name) or 1
+        return user.id, entity_id, user_name.upper()
 
-            if users_found:
-                if len(users_found) == 1:
-                    user_id = users_found[0]['id']
-                    user_name = users_found[0].get('name', 'Inconnu')
-                    nom_client_reel = user_name.upper()
-                    print(f"✅ Utilisateur trouvé: {user_name} (ID: {user_id})")
-                    print(f"✅ Nom du client qui sera utilisé: {nom_client_reel}")
+    @mesure('pipeline_ticket', lambda resultat: bool(resultat['ticket_id']))
+    def traiter(self, informations: Dict[str, Any], valide: bool = False) -> Dict[str, Any]:
+        """
+        Traite un ticket de bout en bout
 
-                    entity_id = glpi.trouver_entite_utilisateur(user_id, user_name)
-                    if not entity_id:
-                        entity_id = 1
-                        print("⚠️  Utilisation de l'entité par défaut (ID: 1)")
+        Args:
+            informations: Champs de TicketCollector.collecter_informations, plus en option
+                user_id, entite_id, technicien_id, categorie_id, reformuler (bool),
+                solution, cloturer (bool), resolu_en_ligne (solution + clôture),
+                pieces_jointes (chemins) et operateur (imputation de la consommation Perplexity)
+            valide: Informations déjà contrôlées par valider (étage CPU d'un import)
 
-                else:
-                    print(f"🔍 Plusieurs utilisateurs trouvés ({len(users_found)}):")
-                    for i, user in enumerate(users_found, 1):
-                        user_info = []
-                        if user.get('id'):
-                            user_info.append(f"ID: {user['id']}")
-                        if user.get('name'):
-                            user_info.append(f"Nom: {user['name']}")
-                        if user.get('firstname'):
-                            user_info.append(f"Prénom: {user['firstname']}")
-                        if user.get('realname'):
-                            user_info.append(f"Nom complet: {user['realname']}")
-
-                        print(f"   {i}. " + " - ".join(user_info))
-
-                    while True:
-                        try:
-                            choix = input("\n→ Choisir un utilisateur (numéro) ou Entrée pour défaut: ").strip()
-                            if not choix:
-                                break
-                            choix_idx = int(choix) - 1
-                            if 0 <= choix_idx < len(users_found):
-                                user_id = users_found[choix_idx]['id']
-                                user_name = users_found[choix_idx].get('name', 'Inconnu')
-                                nom_client_reel = user_name.upper()
-                                print(f"✅ Utilisateur sélectionné: {user_name}")
-                                print(f"✅ Nom du client qui sera utilisé: {nom_client_reel}")
-
-                                entity_id = glpi.trouver_entite_utilisateur(user_id, user_name)
-                                if not entity_id:
-                                    entity_id = 1
-                                    print("⚠️  Utilisation de l'entité par défaut (ID: 1)")
-                                break
-                        except (ValueError, IndexError):
-                            print("❌ Choix invalide")
+        Returns:
+            Le résultat (ticket_id, demandeur, entité, technicien, étapes, durées et erreurs),
+            également ajouté au journal local
+        """
+        if not valide:
+            informations = self.valider(informations)
+        resultat: Dict[str, Any] = {'ticket_id': None, 'erreurs': [], 'durees_ms': {}}
+        if self.glpi.profil:
+            resultat['instance'] = self.glpi.profil
+        etape_precedente = time.perf_counter()
+
+        def chronometrer(etape: str):
+            nonlocal etape_precedente
+            maintenant = time.perf_counter()
+            resultat['durees_ms'][etape] = round((maintenant - etape_precedente) * 1000, 1)
+            etape_precedente = maintenant
+
+        # Demandeur et entité : un appelant reconnu évite la recherche dans l'annuaire
+        user_id = informations.get('user_id')
+        if user_id:
+            nom_client_reel = str(informations.get('nom_client') or informations['demandeur']).upper()
+            entity_id = informations.get('entite_id') or \
+                self.glpi.trouver_entite_utilisateur(user_id, informations['demandeur']) or 1
+        else:
+            appelant = self.appelants.trouver(informations['telephone'], informations['numero_serie'])
+            fiche = self.glpi.fiche_utilisateur(appelant[0]) if appelant and appelant[0] else None
+            if fiche and informations['demandeur'].lower().replace('\n', ' ') in fiche.cle_recherche:
+                logger.info("📇 Appelant reconnu par %s : %s", appelant[2], fiche.name)
+                resultat['appelant_reconnu'] = appelant[2]
+                user_id, nom_client_reel = fiche.id, (fiche.name or 'Inconnu').upper()
+                entity_id = appelant[1] or fiche.entities_id or 1
             else:
-                print(f"⚠️  Utilisateur '{informations['demandeur']}' non trouvé")
-                print(f"⚠️  Nom du client utilisé par défaut: {nom_client_reel}")
-                print("⚠️  Utilisation de l'entité par défaut (ID: 1)")
+                user_id, entity_id, nom_client_reel = self.resoudre_demandeur(informations['demandeur'])
+                if entity_id == 1 and appelant and appelant[1]:
+                    entity_id = appelant[1]  # Entité du copieur
+            entity_id = informations.get('entite_id') or entity_id
+
+        technicien_id = informations.get('technicien_id') or self.repartiteur.choisir_technicien(entity_id)[0]
+
+        resultat.update({'user_id': user_id, 'entity_id': entity_id,
+                         'nom_client': nom_client_reel, 'technicien_id': technicien_id})
+        chronometrer('demandeur')
+
+        # La solution est reformulée en même temps que la description
+        termes_sensibles = (informations.get('nom_appelant'), informations['demandeur'], nom_client_reel)
+        solution = str(informations.get('solution') or '').strip()
+        reformulation_solution = None
+        if solution and informations.get('reformuler', True):
+            reformulation_solution = self.envois.submit(self.reformulator.reformuler_texte, solution, 'solution',
+                                                        termes_sensibles, informations.get('operateur'))
+
+        # Reformulation de la description
+        if informations.get('reformuler', True):
+            description_finale = self.reformulator.reformuler_texte(informations['description'], 'description',
+                                                                    termes_sensibles, informations.get('operateur'))
+        else:
+            description_finale = informations['description']
+        resultat['description_finale'] = description_finale
+        chronometrer('reformulation')
+
+        contenu_final_ticket = TicketCollector.formater_ticket(informations, description_finale, nom_client_reel)
+
+        ticket_data = {
+            "name": informations['titre'],
+            "content": contenu_final_ticket,
+            "entities_id": entity_id,
+            "type": int(informations['type_ticket']),
+            "status": 1,
+            "_users_id_assign": technicien_id
+        }
+        if user_id:
+            ticket_data["_users_id_requester"] = user_id
+        if informations.get('categorie_id'):
+            ticket_data["itilcategories_id"] = informations['categorie_id']
+
+        ticket_id = self.glpi.creer_ticket(ticket_data)
+        chronometrer('creation')
+        if not ticket_id:
+            resultat['erreurs'].append("Échec de la création du ticket")
+            if reformulation_solution:
+                reformulation_solution.cancel()
+            self._journaliser(informations, resultat)
+            return resultat
+
+        resultat['ticket_id'] = ticket_id
+        self.repartiteur.enregistrer_affectation(technicien_id)
+        self.appelants.enregistrer(informations['telephone'], informations['numero_serie'], user_id, entity_id)
+
+        # Pièces jointes envoyées en parallèle de la solution
+        envois = [(chemin, self.envois.submit(self.glpi.joindre_document, ticket_id, chemin))
+                  for chemin in informations['pieces_jointes']]
+
+        # GLPI refuse les documents sur un ticket clos : la clôture attend la fin des envois
+        def attendre_documents():
+            if envois and 'documents' not in resultat:
+                resultat['documents'] = {}
+                for chemin, envoi in envois:
+                    resultat['documents'][chemin] = envoi.result()
+                    if not resultat['documents'][chemin]:
+                        resultat['erreurs'].append(f"Échec de l'envoi de la pièce jointe {chemin}")
+                chronometrer('documents')
+
+        # Solution et clôture optionnelles, émises dès la création
+        if solution:
+            if reformulation_solution:
+                solution = reformulation_solution.result()
+            resultat['solution_finale'] = solution
+            chronometrer('reformulation_solution')
+
+            rapport = self.glpi.resoudre_ticket(ticket_id, solution, bool(informations.get('cloturer')),
+                                                attendre_documents)
+            resultat['erreurs'].extend(rapport.pop('erreurs'))
+            resultat.update(rapport)
+            chronometrer('resolution')
+
+        attendre_documents()
+        self._journaliser(informations, resultat)
+        return resultat
+
+    def _journaliser(self, informations: Dict[str, Any], resultat: Dict[str, Any]):
+        resultat['durees_ms']['total'] = round(sum(resultat['durees_ms'].values()), 1)
+        if self.journal:
+            self.journal.enregistrer(informations, resultat, self.glpi)
+
+
+class InstancesGLPI:
+    """
+    Plusieurs instances GLPI (profils de GLPI_PROFILS) derrière une seule interface.
+
+    Chaque instance a sa session, son pool HTTP, son disjoncteur et ses annuaires. Les
+    recherches de demandeurs et d'entités sont lancées sur toutes les instances en
+    parallèle puis fusionnées ; chaque ticket est créé sur l'instance où son appelant ou
+    son demandeur est connu (voir router). L'instance principale (variables GLPI_ sans
+    profil) est gardée en tête dès que GLPI_USER_TOKEN est défini.
+    """
+
+    def __init__(self, reformulator: PerplexityReformulator, profils: Optional[List[str]] = None):
+        if profils is None:
+            profils = GLPIConfig.instances()
+        self.glpi: Dict[Optional[str], GLPIManager] = {}
+        for profil in profils or [None]:
+            glpi = GLPIManager(GLPIConfig(profil))
+            self.glpi[glpi.profil] = glpi
+        self.pipelines = {profil: PipelineTicket(glpi, reformulator) for profil, glpi in self.glpi.items()}
+        self.principal = next(iter(self.glpi.values()))
+        self.journal = self.pipelines[self.principal.profil].journal
+        self.executeur = ThreadPoolExecutor(max_workers=max(2, len(self.glpi)), thread_name_prefix='instances')
+
+    def __len__(self) -> int:
+        return len(self.glpi)
+
+    def sur_toutes(self, fonction, toutes: bool = False) -> Dict[Optional[str], Any]:
+        """
+        Appelle fonction(glpi) sur chaque instance en parallèle
 
-            # Attribution à un technicien
-            print("\n👨‍💻 ATTRIBUTION DU TECHNICIEN")
-            print("=" * 50)
-            print("💡 Technicien par défaut: ID 233")
+        Args:
+            toutes: Inclure les instances sans session (authentification échouée)
 
-            technicien_id = input("→ Entrez l'ID du technicien ou laissez vide pour le défaut (233): ").strip()
-            if not technicien_id or not technicien_id.isdigit():
-                technicien_id = 233
-                print(f"✅ Utilisation du technicien par défaut: ID {technicien_id}")
-            else:
-                technicien_id = int(technicien_id)
+        Returns:
+            Les résultats par profil ; une instance en erreur est absente du résultat
+        """
+        futurs = {profil: self.executeur.submit(fonction, glpi) for profil, glpi in self.glpi.items()
+                  if toutes or glpi.session_token}
+        resultats = {}
+        for profil, futur in futurs.items():
+            try:
+                resultats[profil] = futur.result()
+            except Exception as e:
+                logger.warning("⚠️  Instance GLPI %s : %s", profil or 'principale', e)
+        return resultats
+
+    def authentification(self) -> bool:
+        """Ouvre une session par instance ; il suffit qu'une instance réponde"""
+        succes = self.sur_toutes(lambda glpi: glpi.authentification(), toutes=True)
+        echecs = [profil or 'principale' for profil in self.glpi if not succes.get(profil)]
+        if echecs and len(echecs) < len(self.glpi):
+            logger.warning("⚠️  Instance(s) GLPI indisponible(s), ignorée(s) : %s", ', '.join(echecs))
+        return len(echecs) < len(self.glpi)
+
+    def fermer_sessions(self):
+        self.sur_toutes(lambda glpi: glpi.fermer_session())
+        self.executeur.shutdown(wait=False)
+        for pipeline in self.pipelines.values():
+            pipeline.fermer()
+
+    def rechercher_utilisateurs(self, terme: str) -> List[Tuple[Optional[str], FicheUtilisateur]]:
+        """Demandeurs de toutes les instances, dans l'ordre des profils : (profil, fiche)"""
+        resultats = self.sur_toutes(lambda glpi: glpi.rechercher_utilisateurs(terme))
+        return [(profil, fiche) for profil in self.glpi for fiche in resultats.get(profil, [])]
+
+    def rechercher_entites(self, terme: str, limite: int = 15) -> List[Tuple[Optional[str], int, str]]:
+        """Entités de toutes les instances (recherche par chemin complet) : (profil, id, chemin)"""
+        def rechercher(glpi: GLPIManager):
+            if not len(glpi.index_entites):
+                glpi.charger_entites()
+            return glpi.index_entites.rechercher(terme, limite)
+
+        resultats = self.sur_toutes(rechercher)
+        return [(profil, entity_id, chemin) for profil in self.glpi for entity_id, chemin in resultats.get(profil, [])]
+
+    def _score(self, pipeline: PipelineTicket, informations: Dict[str, Any]) -> int:
+        """
+        Pertinence d'une instance pour un ticket : 3 appelant reconnu et demandeur
+        confirmé, 2 identifiant exact du demandeur, 1 demandeur approchant ou copieur connu
+        """
+        demandeur = str(informations.get('demandeur') or '').lower().replace('\n', ' ')
+        appelant = pipeline.appelants.trouver(informations.get('telephone'), informations.get('numero_serie'))
+        if appelant and appelant[0]:
+            fiche = pipeline.glpi.fiche_utilisateur(appelant[0])
+            if fiche and demandeur in fiche.cle_recherche:
+                return 3
+        utilisateurs = pipeline.glpi.rechercher_utilisateurs(demandeur) if demandeur else []
+        if any((u.name or '').lower() == demandeur for u in utilisateurs):
+            return 2
+        return 1 if utilisateurs or appelant else 0
+
+    def router(self, informations: Dict[str, Any]) -> Optional[str]:
+        """Profil de l'instance où créer le ticket (champ 'instance', sinon la plus pertinente)"""
+        if informations.get('instance'):
+            if informations['instance'] not in self.glpi:
+                raise ValueError(f"Instance GLPI inconnue: {informations['instance']}")
+            return informations['instance']
+        if len(self.glpi) == 1:
+            return self.principal.profil
+
+        scores = self.sur_toutes(lambda glpi: self._score(self.pipelines[glpi.profil], informations))
+        if not scores:
+            return self.principal.profil
+        # À pertinence égale, l'instance principale puis l'ordre de GLPI_PROFILS départagent
+        profil = max(scores, key=lambda p: (scores[p], -list(self.glpi).index(p)))
+        logger.info("🧭 Ticket routé vers l'instance %s (pertinence %s)", profil, scores[profil])
+        return profil
+
+    def traiter(self, informations: Dict[str, Any], valide: bool = False) -> Dict[str, Any]:
+        """Crée le ticket sur l'instance choisie par router (voir PipelineTicket.traiter)"""
+        return self.pipelines[self.router(informations)].traiter(informations, valide)
+
+
+def serveur_http(adresse: Tuple[str, int], gestionnaire: type) -> 'http.server.ThreadingHTTPServer':
+    """
+    Serveur HTTP multi-thread servi par `gestionnaire`, classe de routes combinée ici à
+    BaseHTTPRequestHandler (http.server n'est importé que par les commandes qui servent du HTTP)
+    """
+    import http.server
+
+    classe = type(gestionnaire.__name__, (gestionnaire, http.server.BaseHTTPRequestHandler), {})
+    serveur = http.server.ThreadingHTTPServer(adresse, classe)
+    serveur.daemon_threads = True
+    return serveur
+
+
+class GestionnaireRequetesService:
+    """Routes HTTP/JSON du service local (voir ServiceTickets et serveur_http)"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # En-têtes et corps sont écrits séparément
+    LIMITE_JOURNAL_MAX = 500        # Résultats au plus par GET /journal
+
+    def log_message(self, format, *args):
+        logger.debug("🌐 %s - %s", self.address_string(), format % args)
+
+    def _repondre(self, code: int, donnees: Any):
+        """Envoie une réponse JSON"""
+        corps = json.dumps(donnees, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def _lire_json(self) -> Dict[str, Any]:
+        """Lit le corps JSON de la requête"""
+        longueur = int(self.headers.get('Content-Length') or 0)
+        donnees = json.loads(self.rfile.read(longueur) or b'{}')
+        if not isinstance(donnees, dict):
+            raise ValueError("Un objet JSON est attendu")
+        return donnees
+
+    def _autorise(self) -> bool:
+        """Vérifie le jeton partagé si SERVICE_JETON est défini"""
+        jeton = self.server.service.jeton
+        if jeton and self.headers.get('X-Jeton-Service') != jeton:
+            self._repondre(401, {'erreur': 'Jeton de service invalide'})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._autorise():
+            return
+
+        service = self.server.service
+        url = urlparse(self.path)
+
+        if url.path == '/sante':
+            self._repondre(200, service.etat())
+        elif url.path == '/metriques':
+            if parse_qs(url.query).get('format', [''])[0] == 'prometheus':
+                corps = metriques.format_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(corps)))
+                self.end_headers()
+                self.wfile.write(corps)
+            else:
+                self._repondre(200, metriques.resume())
+        elif url.path == '/utilisateurs':
+            terme = parse_qs(url.query).get('q', [''])[0].strip()
+            if not terme:
+                self._repondre(400, {'erreur': "Paramètre 'q' requis"})
+                return
+            self._repondre(200, service.rechercher_utilisateurs(terme))
+        elif url.path == '/entites':
+            terme = parse_qs(url.query).get('q', [''])[0].strip()
+            if not terme:
+                self._repondre(400, {'erreur': "Paramètre 'q' requis"})
+                return
+            self._repondre(200, service.rechercher_entites(terme))
+        elif url.path == '/journal':
+            if not service.pipeline.journal:
+                self._repondre(404, {'erreur': "Journal local désactivé (JOURNAL_TICKETS=0)"})
+                return
+            parametres = parse_qs(url.query)
+            try:
+                limite = int(parametres.get('limite', ['20'])[0])
+            except ValueError:
+                limite = 0
+            if limite < 1:
+                self._repondre(400, {'erreur': "Paramètre 'limite' : entier positif attendu"})
+                return
+            self._repondre(200, service.pipeline.journal.rechercher(
+                parametres.get('q', [''])[0], parametres.get('depuis', [None])[0],
+                min(limite, self.LIMITE_JOURNAL_MAX)))
+        else:
+            self._repondre(404, {'erreur': f"Route inconnue: {url.path}"})
+
+    def do_POST(self):
+        if not self._autorise():
+            return
+
+        service = self.server.service
+        url = urlparse(self.path)
+
+        try:
+            donnees = self._lire_json()
+
+            if url.path == '/reformulation':
+                texte = str(donnees.get('texte') or '').strip()
+                if not texte:
+                    raise ValueError("Champ 'texte' requis")
+                type_reformulation = donnees.get('type', 'description')
+                texte = service.reformulator.reformuler_texte(texte, type_reformulation,
+                                                              operateur=donnees.get('operateur'))
+                self._repondre(200, {'texte': texte})
+            elif url.path == '/tickets':
+                resultat = service.pipeline.traiter(service.verifier_pieces_jointes(donnees))
+                self._repondre(201 if resultat['ticket_id'] else 502, resultat)
+            else:
+                self._repondre(404, {'erreur': f"Route inconnue: {url.path}"})
+
+        except ValueError as e:
+            self._repondre(400, {'erreur': str(e)})
+        except Exception as e:
+            logger.error("❌ Erreur du service sur %s: %s", url.path, e)
+            self._repondre(500, {'erreur': str(e)})
+
+
+class ServiceTickets:
+    """Service local persistant : session GLPI, pools HTTP et annuaires restent chauds"""
+
+    def __init__(self, hote: str = '127.0.0.1', port: int = 8787):
+        self.hote = hote
+        self.port = port
+        self.jeton = os.getenv('SERVICE_JETON', '')
+        dossier = os.getenv('SERVICE_DOSSIER_PIECES', '')
+        self.dossier_pieces = os.path.realpath(dossier) if dossier else None
+
+        self.reformulator = PerplexityReformulator(PerplexityConfig())
+        self.pipeline = InstancesGLPI(self.reformulator)
+        self.glpi = self.pipeline.principal
+
+        self.arret = threading.Event()
+        self.demarrage = time.time()
+
+    def verifier_pieces_jointes(self, donnees: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Limite les pièces jointes d'un ticket reçu par le service au dossier SERVICE_DOSSIER_PIECES
+
+        Les chemins sont relatifs à ce dossier et résolus (liens symboliques compris) : un
+        chemin qui en sort est refusé. Sans dossier configuré, aucune pièce jointe n'est
+        acceptée, le service ne lisant pas de fichier arbitraire pour un client HTTP.
+
+        Raises:
+            ValueError: Pièce jointe refusée (réponse 400)
+        """
+        pieces_jointes = donnees.get('pieces_jointes') or []
+        if not pieces_jointes:
+            return donnees
+        if not self.dossier_pieces:
+            raise ValueError("pieces_jointes refusées par le service (SERVICE_DOSSIER_PIECES non défini)")
+        if isinstance(pieces_jointes, str):
+            pieces_jointes = [pieces_jointes]
+        if not isinstance(pieces_jointes, list) or not all(isinstance(p, str) for p in pieces_jointes):
+            raise ValueError("pieces_jointes doit être un chemin ou une liste de chemins")
+
+        chemins = []
+        for piece in pieces_jointes:
+            chemin = os.path.realpath(os.path.join(self.dossier_pieces, piece))
+            if os.path.commonpath([self.dossier_pieces, chemin]) != self.dossier_pieces or chemin == self.dossier_pieces:
+                raise ValueError(f"Pièce jointe hors de SERVICE_DOSSIER_PIECES: {piece}")
+            chemins.append(chemin)
+        return dict(donnees, pieces_jointes=chemins)
+
+    def charger_annuaires(self):
+        """Charge (ou recharge) entités, catégories et utilisateurs de chaque instance"""
+        def charger(glpi: GLPIManager):
+            glpi.charger_entites()
+            glpi.charger_categories()
+            glpi.charger_utilisateurs(forcer=True)
+
+        # Une instance indisponible au démarrage est réessayée à chaque rafraîchissement
+        self.pipeline.sur_toutes(lambda glpi: glpi.session_token or glpi.authentification(), toutes=True)
+        self.pipeline.sur_toutes(charger)
+
+    def _rafraichir_periodiquement(self):
+        """Recharge les annuaires en arrière-plan pour ne jamais les charger sur une requête"""
+        while not self.arret.wait(self.glpi.duree_cache_annuaire):
+            try:
+                self.charger_annuaires()
+            except Exception as e:
+                logger.warning("⚠️  Rafraîchissement des annuaires impossible: %s", e)
+
+    def rechercher_utilisateurs(self, terme: str) -> List[Dict[str, Any]]:
+        """Recherche de demandeurs limitée aux champs utiles (instance précisée si profils nommés)"""
+        return [dict(u.en_dict(), instance=profil) if profil else u.en_dict()
+                for profil, u in self.pipeline.rechercher_utilisateurs(terme)]
+
+    def rechercher_entites(self, terme: str) -> List[Dict[str, Any]]:
+        """Recherche d'entités par chemin complet, toutes instances confondues"""
+        return [dict({'id': entity_id, 'completename': chemin}, **({'instance': profil} if profil else {}))
+                for profil, entity_id, chemin in self.pipeline.rechercher_entites(terme)]
+
+    def etat(self) -> Dict[str, Any]:
+        """État du service et taille des caches"""
+        instances = self.pipeline.glpi
+        etat = {
+            'statut': 'ok' if all(glpi.session_token for glpi in instances.values()) else 'degrade',
+            'uptime_s': round(time.time() - self.demarrage, 1),
+            'entites': sum(len(glpi.index_entites) for glpi in instances.values()),
+            'categories': sum(len(glpi.index_categories) for glpi in instances.values()),
+            'utilisateurs': sum(len(glpi.annuaire_utilisateurs or []) for glpi in instances.values()),
+            'appelants': sum(len(glpi.appelants or ()) for glpi in instances.values()),
+            'disjoncteurs': {nom: d.decrire() for nom, d in disjoncteurs.items()},
+            'perplexity_jour': self.reformulator.comptabilite.resume_jour(),
+        }
+        if len(instances) > 1:
+            etat['instances'] = {profil: {'session': bool(glpi.session_token), 'entites': len(glpi.index_entites),
+                                          'utilisateurs': len(glpi.annuaire_utilisateurs or [])}
+                                 for profil, glpi in instances.items()}
+        return etat
+
+    def demarrer(self):
+        """Authentifie, préchauffe les caches puis sert les requêtes jusqu'à interruption"""
+        if not self.pipeline.authentification():
+            logger.error("❌ Échec de l'authentification GLPI")
+            sys.exit(1)
+
+        try:
+            self.charger_annuaires()
+            self.reformulator.charger_instructions_si_necessaire()
+
+            threading.Thread(target=self._rafraichir_periodiquement, daemon=True).start()
+
+            serveur = serveur_http((self.hote, self.port), GestionnaireRequetesService)
+            serveur.service = self
+
+            # Arrêt propre (fermeture de la session GLPI) sur SIGTERM, ex: systemd
+            signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=serveur.shutdown).start())
+
+            print(f"\n🚀 Service GLPI démarré sur http://{self.hote}:{self.port}")
+            print("   GET  /sante · GET /metriques · GET /utilisateurs?q=… · GET /entites?q=… · POST /reformulation "
+                  "· POST /tickets")
+            print("   ⏹️  Ctrl+C pour arrêter")
+
+            try:
+                serveur.serve_forever()
+            except KeyboardInterrupt:
+                print("\n⏹️  Arrêt du service")
+            finally:
+                serveur.server_close()
+        finally:
+            self.arret.set()
+            self.pipeline.fermer_sessions()
+
+
+class DiagnosticConnexions:
+    """
+    Diagnostic de connectivité et de latence de GLPI et Perplexity (--doctor).
+
+    Chaque échantillon ouvre une connexion neuve et chronomètre séparément la résolution
+    DNS, la connexion TCP, la négociation TLS, l'attente du premier octet de la réponse
+    et la réponse complète : un réseau lent se voit sur dns/tcp/tls, un serveur lent sur
+    premier_octet. Les sondes (une par instance GLPI, une pour Perplexity) tournent en
+    parallèle ; les échantillons d'une même sonde se suivent pour ne pas se gêner.
+
+    Les sondes suivent la configuration de requests : mandataire HTTP(S)_PROXY (hors
+    NO_PROXY), dont dns/tcp mesurent alors l'accès et « mandataire » l'ouverture du
+    tunnel CONNECT, et certificats de REQUESTS_CA_BUNDLE (ou CURL_CA_BUNDLE).
+    """
+
+    PHASES = ('dns', 'tcp', 'mandataire', 'tls', 'premier_octet', 'total')
+    ANNUAIRES = ('User', 'Entity', 'ITILCategory')
+
+    def __init__(self, echantillons: int = 5, delai: float = 10.0):
+        self.echantillons = max(1, echantillons)
+        self.delai = delai
+
+    @staticmethod
+    def raison(erreur: Exception) -> str:
+        """Cause lisible d'un échec réseau"""
+        if isinstance(erreur, socket.gaierror):
+            return f"nom introuvable ({erreur.strerror or erreur})"
+        if isinstance(erreur, ssl.SSLCertVerificationError):
+            return f"certificat refusé ({erreur.verify_message})"
+        if isinstance(erreur, ssl.SSLError):
+            return f"erreur TLS ({erreur.reason or erreur})"
+        if isinstance(erreur, TimeoutError):
+            return "délai dépassé"
+        if isinstance(erreur, ConnectionRefusedError):
+            return "connexion refusée"
+        if isinstance(erreur, OSError) and erreur.strerror:
+            return erreur.strerror
+        return str(erreur) or type(erreur).__name__
+
+    @staticmethod
+    def mandataire(url: str) -> Optional[str]:
+        """Mandataire que requests utiliserait pour url (HTTPS_PROXY, HTTP_PROXY, ALL_PROXY, NO_PROXY)"""
+        importer_http()
+        return requests.utils.select_proxy(url, requests.utils.get_environ_proxies(url))
+
+    @staticmethod
+    def contexte_tls() -> ssl.SSLContext:
+        """Mêmes certificats racines que requests : REQUESTS_CA_BUNDLE, CURL_CA_BUNDLE, sinon certifi"""
+        importer_http()
+        chemin = (os.getenv('REQUESTS_CA_BUNDLE') or os.getenv('CURL_CA_BUNDLE')
+                  or requests.utils.DEFAULT_CA_BUNDLE_PATH)
+        if os.path.isdir(chemin):
+            return ssl.create_default_context(capath=chemin)
+        return ssl.create_default_context(cafile=chemin)
+
+    def mesurer_requete(self, url: str, methode: str = 'GET', entetes: Optional[Dict[str, str]] = None,
+                        corps: Optional[bytes] = None) -> Dict[str, Any]:
+        """
+        Un échantillon sur une connexion neuve (à travers le mandataire configuré, s'il y en a un)
+
+        Returns:
+            durees (ms par phase atteinte), statut et contenu de la réponse, ou echec
+            (« phase: raison ») si la requête n'a pas abouti
+        """
+        adresse = urlparse(url)
+        securise = adresse.scheme == 'https'
+        port = adresse.port or (443 if securise else 80)
+        chemin = (adresse.path or '/') + (f"?{adresse.query}" if adresse.query else '')
+        entetes = dict(entetes or {})
+        hote, port_connexion = adresse.hostname, port
+        mandataire = self.mandataire(url)
+        entetes_mandataire = {}
+        if mandataire:
+            proxy = urlparse(mandataire if '://' in mandataire else f"http://{mandataire}")
+            if proxy.scheme != 'http':
+                return {'durees': {}, 'echec': f"mandataire: schéma {proxy.scheme} non pris en charge par --doctor"}
+            hote, port_connexion = proxy.hostname, proxy.port or 80
+            utilisateur, mot_de_passe = requests.utils.get_auth_from_url(mandataire)
+            if utilisateur:
+                identifiants = base64.b64encode(f"{utilisateur}:{mot_de_passe}".encode()).decode()
+                entetes_mandataire['Proxy-Authorization'] = f"Basic {identifiants}"
+            if not securise:
+                chemin = url  # Requête HTTP en clair : URL complète adressée au mandataire
+                entetes.update(entetes_mandataire)
+        mesure: Dict[str, Any] = {'durees': {}}
+        connexion = None
+        phase = 'dns'
+        debut = precedent = time.perf_counter()
+
+        def fin_phase(nom: str):
+            nonlocal precedent
+            maintenant = time.perf_counter()
+            mesure['durees'][nom] = (maintenant - precedent) * 1000
+            precedent = maintenant
+
+        try:
+            adresse_ip = socket.getaddrinfo(hote, port_connexion, type=socket.SOCK_STREAM)[0][4]
+            fin_phase('dns')
+            phase = 'tcp'
+            connexion_tcp = socket.create_connection(adresse_ip[:2], timeout=self.delai)
+            fin_phase('tcp')
+            if mandataire and securise:
+                phase = 'mandataire'
+                cible = f"{adresse.hostname}:{port}"
+                demande = f"CONNECT {cible} HTTP/1.1\r\nHost: {cible}\r\n" + ''.join(
+                    f"{cle}: {valeur}\r\n" for cle, valeur in entetes_mandataire.items()) + "\r\n"
+                connexion_tcp.sendall(demande.encode('latin-1'))
+                reponse_tunnel = http.client.HTTPResponse(connexion_tcp, method='CONNECT')
+                reponse_tunnel.begin()
+                if reponse_tunnel.status != 200:
+                    raise OSError(f"tunnel refusé (HTTP {reponse_tunnel.status} {reponse_tunnel.reason})")
+                fin_phase('mandataire')
+            if securise:
+                phase = 'tls'
+                connexion_tcp = self.contexte_tls().wrap_socket(connexion_tcp, server_hostname=adresse.hostname)
+                fin_phase('tls')
+            phase = 'premier_octet'
+            classe = http.client.HTTPSConnection if securise else http.client.HTTPConnection
+            connexion = classe(adresse.hostname, port, timeout=self.delai)
+            connexion.sock = connexion_tcp
+            connexion.request(methode, chemin, body=corps, headers=entetes)
+            reponse = connexion.getresponse()
+            fin_phase('premier_octet')
+            phase = 'total'
+            mesure['contenu'] = reponse.read()
+            mesure['statut'] = reponse.status
+            mesure['durees']['total'] = (time.perf_counter() - debut) * 1000
+        except Exception as e:
+            mesure['echec'] = f"{phase}: {self.raison(e)}"
+        finally:
+            if connexion:
+                connexion.close()
+            elif phase in ('mandataire', 'tls', 'premier_octet'):
+                connexion_tcp.close()
+
+        if mesure.get('statut', 0) >= 400:
+            mesure['echec'] = f"HTTP {mesure['statut']}: {self.message_erreur(mesure['contenu'])}"
+        return mesure
+
+    @staticmethod
+    def message_erreur(contenu: bytes) -> str:
+        """Message d'erreur d'une réponse GLPI (["ERROR_...", "message"]) ou Perplexity ({"error": ...})"""
+        try:
+            donnees = json.loads(contenu)
+        except ValueError:
+            return contenu[:150].decode('utf-8', 'replace').strip() or 'réponse vide'
+        if isinstance(donnees, list):
+            return ' - '.join(str(d) for d in donnees[:2])
+        if isinstance(donnees, dict) and 'error' in donnees:
+            erreur = donnees['error']
+            return str(erreur.get('message', erreur) if isinstance(erreur, dict) else erreur)
+        return json.dumps(donnees, ensure_ascii=False)[:150]
+
+    def _agreger(self, mesures: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Percentiles par phase des échantillons réussis et causes des échecs"""
+        reussis = [m for m in mesures if 'echec' not in m]
+        durees = MetriquesPerformance()
+        for m in reussis:
+            for phase, duree in m['durees'].items():
+                durees.enregistrer(phase, duree)
+        resume = durees.resume()
+        phases = {phase: {cle: round(resume[phase][cle], 1) for cle in ('p50', 'p95', 'max')}
+                  for phase in self.PHASES if phase in resume}
+        echecs: Dict[str, int] = {}
+        for m in mesures:
+            if 'echec' in m:
+                echecs[m['echec']] = echecs.get(m['echec'], 0) + 1
+        return {'echantillons': len(mesures), 'reussis': len(reussis), 'phases': phases, 'echecs': echecs}
+
+    def sonder_glpi(self, profil: Optional[str]) -> Dict[str, Any]:
+        """Connexions initSession répétées, puis session applicative et taille des annuaires"""
+        prefixe = GLPIConfig.prefixe(profil)
+        if not os.getenv(f'{prefixe}APP_TOKEN') or not os.getenv(f'{prefixe}USER_TOKEN'):
+            return {'echecs': {f"configuration: {prefixe}APP_TOKEN et {prefixe}USER_TOKEN requis": 1}}
+        config = GLPIConfig(profil)
+        entetes = {'Content-Type': 'application/json', 'Authorization': f'user_token {config.user_token}',
+                   'App-Token': config.app_token}
+
+        mesures = []
+        for _ in range(self.echantillons):
+            mesure = self.mesurer_requete(f"{config.api_url}/initSession", entetes=entetes)
+            mesures.append(mesure)
+            try:
+                jeton = json.loads(mesure.get('contenu') or b'{}').get('session_token')
+            except (ValueError, AttributeError):
+                jeton = None
+            if jeton:
+                self.mesurer_requete(f"{config.api_url}/killSession",
+                                     entetes={'Session-Token': jeton, 'App-Token': config.app_token})
+            elif 'echec' not in mesure:
+                mesure['echec'] = "HTTP 200: réponse sans session_token"
+        resultat = dict(self._agreger(mesures), url=config.api_url)
+
+        if resultat['reussis']:
+            glpi = GLPIManager(config)
+            annuaires = {}
+            if glpi.authentification():
+                try:
+                    for itemtype in self.ANNUAIRES:
+                        debut = time.perf_counter()
+                        try:
+                            annuaires[itemtype] = {'nombre': glpi.compter(itemtype)}
+                        except Exception as e:
+                            annuaires[itemtype] = {'echec': self.raison(e)}
+                        annuaires[itemtype]['duree_ms'] = round((time.perf_counter() - debut) * 1000, 1)
+                finally:
+                    glpi.fermer_session()
+                resultat['session'] = 'ok'
+            else:
+                resultat['session'] = "échec de l'authentification (voir le journal)"
+            resultat['annuaires'] = annuaires
+        return resultat
+
+    def sonder_perplexity(self) -> Dict[str, Any]:
+        """Complétions d'un jeton (imputées à l'opérateur « diagnostic »)"""
+        if not os.getenv('PERPLEXITY_API_KEY'):
+            return {'echecs': {"configuration: PERPLEXITY_API_KEY requise": 1}}
+        config = PerplexityConfig()
+        entetes = {'Authorization': f"Bearer {config.api_key}", 'Content-Type': 'application/json'}
+        corps = json.dumps({'model': config.model, 'messages': [{'role': 'user', 'content': 'Test'}],
+                            'temperature': 0, 'max_tokens': 1}).encode()
+
+        mesures = []
+        for _ in range(self.echantillons):
+            mesure = self.mesurer_requete(config.api_url, 'POST', entetes, corps)
+            mesures.append(mesure)
+            if 'echec' not in mesure:
+                try:
+                    usage = json.loads(mesure['contenu']).get('usage') or {}
+                except (ValueError, AttributeError):
+                    usage = {}
+                obtenir_comptabilite().enregistrer('diagnostic', int(usage.get('prompt_tokens', 1)),
+                                                   int(usage.get('completion_tokens', 1)))
+        return dict(self._agreger(mesures), url=config.api_url, modele=config.model)
+
+    def executer(self, profils: Optional[List[Optional[str]]] = None) -> Dict[str, Any]:
+        """Lance toutes les sondes en parallèle (profils GLPI : ceux de InstancesGLPI par défaut)"""
+        if profils is None:
+            profils = GLPIConfig.instances()
+        sondes = {f"glpi:{profil}" if profil else 'glpi': functools.partial(self.sonder_glpi, profil)
+                  for profil in profils or [None]}
+        sondes['perplexity'] = self.sonder_perplexity
+
+        with ThreadPoolExecutor(max_workers=len(sondes), thread_name_prefix='diagnostic') as executeur:
+            futurs = {nom: executeur.submit(sonde) for nom, sonde in sondes.items()}
+        resultats = {}
+        for nom, futur in futurs.items():
+            try:
+                resultats[nom] = futur.result()
+            except Exception as e:
+                resultats[nom] = {'echecs': {f"sonde: {self.raison(e)}": 1}}
+        return {
+            'genere_le': datetime.now().isoformat(timespec='seconds'),
+            'echantillons': self.echantillons,
+            'mandataire': os.getenv('HTTPS_PROXY') or os.getenv('https_proxy') or None,
+            'sondes': resultats,
+        }
+
+    @staticmethod
+    def en_echec(resultat: Dict[str, Any]) -> bool:
+        """Sonde sans aucun échantillon réussi ou dont la session GLPI a échoué"""
+        return not resultat.get('reussis') or resultat.get('session', 'ok') != 'ok'
+
+    @classmethod
+    def afficher(cls, resultats: Dict[str, Any]):
+        """Affiche le rapport : phases par sonde, causes d'échec, session et annuaires"""
+        if resultats['mandataire']:
+            print(f"  🔀 Mandataire {resultats['mandataire']} : dns et tcp mesurent l'accès au mandataire")
+        for nom, resultat in resultats['sondes'].items():
+            icone = '❌' if cls.en_echec(resultat) else '✅'
+            print(f"\n  {icone} {nom}  {resultat.get('url', '')}")
+            if resultat.get('echantillons'):
+                print(f"     {resultat['reussis']}/{resultat['echantillons']} échantillon(s) réussi(s)")
+            if resultat.get('phases'):
+                print(f"     {'Phase':<16}{'p50':>9}{'p95':>9}{'max':>9}  (ms)")
+                for phase, stats in resultat['phases'].items():
+                    print(f"     {phase:<16}{stats['p50']:>9.1f}{stats['p95']:>9.1f}{stats['max']:>9.1f}")
+                phases = resultat['phases']
+                reseau = sum(phases[p]['p50'] for p in ('dns', 'tcp', 'mandataire', 'tls') if p in phases)
+                if 'premier_octet' in phases:
+                    print(f"     ⏱️  Réseau (dns+tcp+tls): {reseau:.0f} ms · "
+                          f"Serveur (premier octet): {phases['premier_octet']['p50']:.0f} ms")
+            for raison, nombre in resultat.get('echecs', {}).items():
+                print(f"     ❌ {nombre}× {raison}")
+            if 'session' in resultat:
+                print(f"     🔑 Session: {resultat['session']}")
+            for itemtype, annuaire in resultat.get('annuaires', {}).items():
+                valeur = annuaire.get('nombre', annuaire.get('echec'))
+                print(f"     📚 {itemtype}: {valeur} ({annuaire['duree_ms']:.0f} ms)")
+
+
+def preparer_paquet(preparer: Callable, paquet: List[Tuple[Any, Any]]) -> List[Tuple[Any, Any, Optional[str]]]:
+    """
+    Étage CPU d'un import, exécuté dans un processus de travail (voir ImportParallele)
+
+    Returns:
+        Pour chaque enregistrement (clé, brut) du paquet, preparer(clé, brut) :
+        le triplet (clé, informations ou None, erreur ou None)
+    """
+    resultats = []
+    for cle, brut in paquet:
+        try:
+            resultats.append(preparer(cle, brut))
+        except Exception as e:
+            resultats.append((cle, None, f"{type(e).__name__}: {e}"))
+    return resultats
+
+
+class ImportParallele:
+    """
+    Import en deux étages pour les gros volumes (--lot, --mails).
+
+    L'étage CPU (analyse JSON ou MIME, extraction, contrôles de PipelineTicket.valider)
+    traite les enregistrements par paquets dans un pool de processus, hors du GIL ; l'étage
+    réseau crée les tickets dans un pool de threads. Chaque étage est borné : au plus
+    2×processus paquets en préparation et 2×paralleles tickets en attente de GLPI. Quand
+    l'étage réseau ralentit, la lecture de la source s'interrompt et la mémoire reste
+    constante quel que soit le volume. Avec processus=0, les paquets sont préparés dans
+    le thread de lecture.
+    """
+
+    def __init__(self, preparer: Callable, traiter: Callable, rejeter: Callable,
+                 processus: int = 0, paralleles: int = 4, taille_paquet: int = 64,
+                 ignorer: Optional[Callable] = None):
+        """
+        Args:
+            preparer: preparer(clé, brut) -> (clé, informations, erreur), exécuté dans les processus
+                (fonction ou méthode de classe du module : elle est transmise par son nom)
+            traiter: traiter(clé, informations) -> résultat de PipelineTicket.traiter
+            rejeter: rejeter(clé, erreur) pour un enregistrement refusé par l'étage CPU
+            ignorer: ignorer(clé) -> True pour un enregistrement déjà traité
+        """
+        self.preparer = preparer
+        self.traiter = traiter
+        self.rejeter = rejeter
+        self.ignorer = ignorer
+        self.processus = max(0, processus)
+        self.paralleles = max(1, paralleles)
+        self.taille_paquet = max(1, taille_paquet)
+
+    def _paquets(self, enregistrements: Iterable[Tuple[Any, Any]], compteurs: Dict[str, int]):
+        paquet = []
+        for enregistrement in enregistrements:
+            compteurs['lus'] += 1
+            paquet.append(enregistrement)
+            if len(paquet) >= self.taille_paquet:
+                yield paquet
+                paquet = []
+        if paquet:
+            yield paquet
+
+    def executer(self, enregistrements: Iterable[Tuple[Any, Any]]) -> Dict[str, int]:
+        """
+        Prépare puis traite les enregistrements (clé, brut) de la source
+
+        Returns:
+            Les compteurs lus, ignores, crees et echecs
+
+        Raises:
+            Exception: Erreur de l'aiguillage (ignorer, soumission à l'étage réseau) ; la
+                lecture s'arrête et les tickets déjà soumis sont terminés avant qu'elle soit relevée
+        """
+        compteurs = {'lus': 0, 'ignores': 0, 'crees': 0, 'echecs': 0}
+        verrou = threading.Lock()
+        paquets = queue.Queue(maxsize=max(1, self.processus) * 2)
+        places = threading.BoundedSemaphore(self.paralleles * 2)
+        echecs_aiguillage: List[Exception] = []
+
+        def terminer(envoi):
+            places.release()
+            try:
+                cree = bool(envoi.result().get('ticket_id'))
+            except Exception as e:
+                logger.error("❌ Import : %s", e)
+                cree = False
+            with verrou:
+                compteurs['crees' if cree else 'echecs'] += 1
+
+        def refuser(cle, erreur: str) -> Dict[str, Any]:
+            self.rejeter(cle, erreur)
+            return {'ticket_id': None}
+
+        def aiguiller_paquet(reseau: ThreadPoolExecutor, paquet, preparation: Future):
+            try:
+                prepares = preparation.result()
+            except Exception as e:  # Processus de travail arrêté (mémoire, signal...)
+                prepares = [(cle, None, f"Préparation interrompue : {e}") for cle, _ in paquet]
+            for cle, informations, erreur in prepares:
+                if self.ignorer and self.ignorer(cle):
+                    with verrou:
+                        compteurs['ignores'] += 1
+                    continue
+                places.acquire()
+                try:
+                    envoi = reseau.submit(refuser, cle, erreur) if erreur else \
+                        reseau.submit(self.traiter, cle, informations)
+                except BaseException:
+                    places.release()
+                    raise
+                envoi.add_done_callback(terminer)
+
+        def aiguiller(reseau: ThreadPoolExecutor):
+            # Paquets préparés, dans l'ordre de lecture, vers l'étage réseau (les refus aussi :
+            # avec un seul thread réseau, les résultats sortent dans l'ordre de la source).
+            # Après une erreur, la file est vidée jusqu'à la sentinelle pour ne jamais bloquer
+            # la lecture ; l'erreur est relevée dans le thread principal.
+            while True:
+                element = paquets.get()
+                if element is None:
+                    return
+                if echecs_aiguillage:
+                    continue
+                try:
+                    aiguiller_paquet(reseau, *element)
+                except Exception as e:
+                    logger.error("❌ Import interrompu : %s", e)
+                    echecs_aiguillage.append(e)
+
+        import multiprocessing
+
+        # spawn : un fork hériterait des verrous des threads HTTP et de journalisation en cours
+        pool = concurrent.futures.ProcessPoolExecutor(
+            self.processus, mp_context=multiprocessing.get_context('spawn')) if self.processus else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.paralleles, thread_name_prefix='import') as reseau:
+                aiguillage = threading.Thread(target=aiguiller, args=(reseau,), name='aiguillage', daemon=True)
+                aiguillage.start()
+                try:
+                    for paquet in self._paquets(enregistrements, compteurs):
+                        if echecs_aiguillage:
+                            break
+                        if pool:
+                            preparation = pool.submit(preparer_paquet, self.preparer, paquet)
+                        else:
+                            preparation = Future()
+                            preparation.set_result(preparer_paquet(self.preparer, paquet))
+                        paquets.put((paquet, preparation))  # Bloque tant que l'étage CPU est plein
+                finally:
+                    paquets.put(None)
+                    aiguillage.join()
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+        if echecs_aiguillage:
+            raise echecs_aiguillage[0]
+        return compteurs
+
+
+def main_lot(args: argparse.Namespace):
+    """Crée les tickets décrits dans un fichier JSONL (un ticket par ligne), sans interaction"""
+    reformulator = PerplexityReformulator(PerplexityConfig())
+    pipeline = InstancesGLPI(reformulator)
+
+    if not pipeline.authentification():
+        logger.error("❌ Échec de l'authentification GLPI")
+        sys.exit(1)
+
+    verrou = threading.Lock()
+
+    def afficher(resultat: Dict[str, Any]):
+        with verrou:
+            print(json.dumps(resultat, ensure_ascii=False), flush=True)
+
+    def traiter(numero_ligne: int, informations: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            resultat = pipeline.traiter(informations, valide=True)
+        except Exception as e:
+            logger.error("❌ Ligne %s : %s", numero_ligne, e)
+            resultat = {'ticket_id': None, 'erreurs': [str(e)]}
+        resultat['ligne'] = numero_ligne
+        afficher(resultat)
+        return resultat
+
+    def rejeter(numero_ligne: int, erreur: str):
+        afficher({'ticket_id': None, 'erreurs': [erreur], 'ligne': numero_ligne})
+
+    def lignes():
+        with open(args.lot, 'r', encoding='utf-8') as f:
+            for numero_ligne, ligne in enumerate(f, 1):
+                if ligne.strip():
+                    yield numero_ligne, ligne
+
+    debut = time.perf_counter()
+    try:
+        compteurs = ImportParallele(PipelineTicket.preparer, traiter, rejeter, args.processus,
+                                    args.lot_paralleles, args.taille_paquet).executer(lignes())
+    finally:
+        pipeline.fermer_sessions()
+
+    logger.info("📦 Lot terminé : %s ticket(s) créé(s), %s échec(s) en %.1f s",
+                compteurs['crees'], compteurs['echecs'], time.perf_counter() - debut)
+
+
+class IngestionMails:
+    """
+    Crée un ticket par email d'une boîte mbox ou Maildir, en flux.
+
+    Appelant, téléphone, email et numéro de série sont extraits du message et contrôlés
+    avec les validateurs de TicketCollector ; le demandeur est recherché dans l'annuaire
+    GLPI (toutes les instances) puis le message suit la chaîne PipelineTicket. Les Message-ID traités sont
+    ajoutés au fichier d'état : une nouvelle exécution ne reprend que les nouveaux messages.
+    """
+
+    MOTIF_SERIE = re.compile(r'(?:n[°o]|num[ée]ro)\s*(?:de\s+)?s[ée]rie|\bS/?N\b|\bserial(?:\s+number)?',
+                             re.IGNORECASE)
+    MOTIF_VALEUR_SERIE = re.compile(r'\s*[:#]?\s*([A-Za-z0-9_-]{4,})')
+    MOTIF_PREFIXE_SUJET = re.compile(r'^\s*(?:(?:re|tr|fwd?|aw|wg)\s*:\s*)+', re.IGNORECASE)
+
+    def __init__(self, pipeline: InstancesGLPI, chemin: str, fichier_etat: str, paralleles: int = 4):
+        self.pipeline = pipeline
+        self.chemin = chemin
+        self.fichier_etat = fichier_etat
+        self.paralleles = paralleles
+        self.verrou = threading.Lock()
+        self.deja_traites = set()
+        if os.path.exists(fichier_etat):
+            with open(fichier_etat, 'r', encoding='utf-8') as f:
+                self.deja_traites = {ligne.strip() for ligne in f if ligne.strip()}
+
+    def messages(self):
+        """
+        Messages bruts (octets) de la boîte, un par un : un mbox est lu ligne à ligne (sans
+        index préalable ni chargement complet), un Maildir fichier par fichier. L'analyse
+        MIME est laissée à l'étage CPU (voir preparer)
+        """
+        import mailbox
+
+        if os.path.isdir(self.chemin):
+            boite = mailbox.Maildir(self.chemin, create=False)
+            try:
+                for cle in boite.iterkeys():
+                    yield boite.get_bytes(cle)
+            finally:
+                boite.close()
+            return
+
+        with open(self.chemin, 'rb') as f:
+            lignes, precedente_vide = [], True
+            for ligne in f:
+                if ligne.startswith(b'From ') and precedente_vide:
+                    if lignes:
+                        yield b''.join(lignes)
+                    lignes = []
+                else:
+                    lignes.append(ligne[1:] if ligne.startswith(b'>From ') else ligne)
+                precedente_vide = not ligne.strip()
+            if lignes:
+                yield b''.join(lignes)
+
+    @staticmethod
+    def entete(message, nom: str) -> str:
+        """En-tête décodé (encodages RFC 2047)"""
+        valeur = message.get(nom)
+        if valeur is None:
+            return ''
+        try:
+            return str(email.header.make_header(email.header.decode_header(str(valeur)))).strip()
+        except (LookupError, ValueError, email.errors.HeaderParseError):
+            return str(valeur).strip()
+
+    @classmethod
+    def identifiant(cls, message) -> str:
+        """Message-ID, ou empreinte des en-têtes s'il est absent"""
+        message_id = str(message.get('Message-ID') or '').strip()
+        if message_id:
+            return message_id
+        entetes = '|'.join(cls.entete(message, cle) for cle in ('From', 'Date', 'Subject'))
+        return 'sha1:' + hashlib.sha1(entetes.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def corps_texte(message) -> str:
+        """Partie texte du message (HTML réduit au texte), sans l'historique cité"""
+        parties = [p for p in message.walk() if p.get_content_maintype() == 'text'
+                   and not str(p.get('Content-Disposition') or '').lower().startswith('attachment')]
+        partie = next((p for p in parties if p.get_content_subtype() == 'plain'), None) or \
+            next((p for p in parties if p.get_content_subtype() == 'html'), None)
+        if partie is None:
+            return ''
+        contenu = partie.get_payload(decode=True) or b''
+        try:
+            texte = contenu.decode(partie.get_content_charset() or 'utf-8', errors='replace')
+        except LookupError:
+            texte = contenu.decode('utf-8', errors='replace')
+        if partie.get_content_subtype() == 'html':
+            texte = re.sub(r'(?is)<(script|style).*?</\1>|<br\s*/?>|</p>', '\n', texte)
+            texte = re.sub(r'<[^>]+>', '', texte).replace('&nbsp;', ' ')
+
+        historique = PerplexityReformulator.MOTIF_HISTORIQUE.search(texte)
+        if historique and texte[:historique.start()].strip():
+            texte = texte[:historique.start()]
+        texte = texte.split('\n-- \n', 1)[0]  # Signature
+        lignes = [ligne.rstrip() for ligne in texte.splitlines() if not ligne.lstrip().startswith('>')]
+        return re.sub(r'\n{3,}', '\n\n', '\n'.join(lignes)).strip()
+
+    @classmethod
+    def extraire(cls, message) -> Dict[str, Any]:
+        """Informations du ticket extraites d'un message"""
+        nom, adresse = email.utils.parseaddr(cls.entete(message, 'From'))
+        adresse = adresse if TicketCollector.valider_email(adresse) else ''
+        corps = cls.corps_texte(message)
+
+        telephone = "Non renseigné"
+        for candidat in re.finditer(TicketCollector.MOTIF_TELEPHONE_TEXTE, corps):
+            chiffres = re.sub(r'\D', '', candidat.group())
+            chiffres = '0' + chiffres[2:] if chiffres.startswith('33') else chiffres
+            formate = ' '.join(chiffres[i:i + 2] for i in range(0, 10, 2))
+            if TicketCollector.valider_telephone(formate):
+                telephone = formate
+                break
+
+        numero_serie = ''
+        for mention in cls.MOTIF_SERIE.finditer(corps):
+            valeur = cls.MOTIF_VALEUR_SERIE.match(corps, mention.end())
+            if valeur and any(c.isdigit() for c in valeur.group(1)) and \
+                    TicketCollector.valider_numero_serie(valeur.group(1)):
+                numero_serie = valeur.group(1)
+                break
+
+        titre = cls.MOTIF_PREFIXE_SUJET.sub('', cls.entete(message, 'Subject')).strip()
+        return {
+            'titre': titre[:250] or "Demande reçue par email",
+            'nom_appelant': nom or adresse.split('@')[0] or "Inconnu",
+            'telephone': telephone,
+            'email': adresse,
+            'numero_serie': numero_serie,
+            'description': corps or titre or "(message vide)",
+            'demandeur': nom or adresse or "Inconnu",
+            'candidats_demandeur': [c for c in (adresse, adresse.split('@')[0], nom) if c],
+            'operateur': 'mail',
+        }
+
+    @classmethod
+    def preparer(cls, numero: int, brut: bytes) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+        """Étage CPU (voir ImportParallele) : (identifiant du message, informations contrôlées, erreur)"""
+        message = email.message_from_bytes(brut)
+        message_id = cls.identifiant(message)
+        try:
+            return message_id, PipelineTicket.valider(cls.extraire(message)), None
+        except ValueError as e:
+            return message_id, None, str(e)
+        except Exception as e:
+            return message_id, None, f"Message illisible : {e}"
+
+    def _choisir_demandeur(self, candidats: List[str]) -> Optional[str]:
+        """Premier candidat (adresse, identifiant, nom affiché) connu de l'annuaire"""
+        for candidat in candidats:
+            if self.pipeline.rechercher_utilisateurs(candidat):
+                return candidat
+        return None
+
+    def _traiter(self, message_id: str, informations: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            informations['demandeur'] = self._choisir_demandeur(informations.pop('candidats_demandeur')) \
+                or informations['demandeur']
+            resultat = self.pipeline.traiter(informations, valide=True)
+        except ValueError as e:
+            resultat = {'ticket_id': None, 'erreurs': [str(e)]}
+        except Exception as e:
+            logger.error("❌ Message %s : %s", message_id, e)
+            resultat = {'ticket_id': None, 'erreurs': [str(e)]}
+
+        resultat['message_id'] = message_id
+        with self.verrou:
+            if resultat['ticket_id']:
+                with open(self.fichier_etat, 'a', encoding='utf-8') as f:
+                    f.write(message_id + '\n')
+            print(json.dumps(resultat, ensure_ascii=False), flush=True)
+        return resultat
+
+    def _rejeter(self, message_id: str, erreur: str):
+        logger.error("❌ Message %s : %s", message_id, erreur)
+        with self.verrou:
+            print(json.dumps({'ticket_id': None, 'erreurs': [erreur], 'message_id': message_id},
+                             ensure_ascii=False), flush=True)
+
+    def _ignorer(self, message_id: str) -> bool:
+        if message_id in self.deja_traites:
+            return True
+        self.deja_traites.add(message_id)
+        return False
+
+    def executer(self, processus: int = 0, taille_paquet: int = 64) -> Dict[str, int]:
+        """
+        Parcourt la boîte et traite les nouveaux messages (au plus 2×paralleles en attente)
+
+        Args:
+            processus: Processus d'analyse des messages (0 : dans le thread de lecture)
+        """
+        return ImportParallele(self.preparer, self._traiter, self._rejeter, processus, self.paralleles,
+                               taille_paquet, self._ignorer).executer(enumerate(self.messages(), 1))
+
+
+def main_mails(args: argparse.Namespace):
+    """Ingestion d'une boîte mbox ou Maildir (--mails)"""
+    reformulator = PerplexityReformulator(PerplexityConfig())
+    instances = InstancesGLPI(reformulator)
+
+    if not instances.authentification():
+        logger.error("❌ Échec de l'authentification GLPI")
+        sys.exit(1)
+
+    debut = time.perf_counter()
+    try:
+        instances.sur_toutes(lambda glpi: glpi.charger_utilisateurs())
+        compteurs = IngestionMails(instances, args.mails, args.mails_etat,
+                                    args.mails_paralleles).executer(args.processus, args.taille_paquet)
+    finally:
+        instances.fermer_sessions()
+
+    duree = time.perf_counter() - debut
+    logger.info("📬 %s message(s) lu(s), %s déjà traité(s), %s ticket(s) créé(s), %s échec(s) en %.1f s",
+                compteurs['lus'], compteurs['ignores'], compteurs['crees'], compteurs['echecs'], duree)
+
+
+class EcrivainExport:
+    """
+    Écriture incrémentale d'enregistrements exportés en JSONL, CSV ou Parquet.
+
+    JSONL et CSV sont vidés sur disque après chaque lot ; Parquet est écrit en fichiers
+    `part-NNNNN.parquet` d'au plus LIGNES_PAR_PARTIE lignes dans le dossier de sortie,
+    chacun complet dès sa fermeture. `dernier_id_durable` est le dernier identifiant
+    dont l'écriture est définitive.
+    """
+
+    FORMATS = ('jsonl', 'csv', 'parquet')
+    LIGNES_PAR_PARTIE = 20000
+
+    def __init__(self, chemin: str, format_sortie: str, colonnes: List[str], ajout: bool = False):
+        self.chemin = chemin
+        self.format = format_sortie
+        self.colonnes = colonnes
+        self.dernier_id_durable: Optional[int] = None
+        self.fichier = None
+        self.tampon: List[Dict[str, Any]] = []
+
+        if format_sortie == 'parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise RuntimeError("L'export Parquet nécessite pyarrow (pip install pyarrow)")
+            self.pyarrow, self.parquet = pyarrow, pyarrow.parquet
+            entiers = {'id', 'status', 'type', 'priority'}
+            self.schema = pyarrow.schema([(c, pyarrow.int64() if c in entiers else pyarrow.string()) for c in colonnes])
+            os.makedirs(chemin, exist_ok=True)
+            if not ajout:
+                for nom in os.listdir(chemin):
+                    if nom.startswith('part-') and nom.endswith('.parquet'):
+                        os.remove(os.path.join(chemin, nom))
+            self.numero_partie = sum(1 for nom in os.listdir(chemin) if nom.startswith('part-'))
+            return
+
+        entete = not (ajout and os.path.exists(chemin) and os.path.getsize(chemin))
+        self.fichier = open(chemin, 'a' if ajout else 'w', encoding='utf-8', newline='')
+        if format_sortie == 'csv':
+            self.csv = csv.DictWriter(self.fichier, colonnes, extrasaction='ignore')
+            if entete:
+                self.csv.writeheader()
+
+    def ecrire(self, lignes: List[Dict[str, Any]]):
+        if not lignes:
+            return
+        if self.format == 'parquet':
+            self.tampon.extend(lignes)
+            if len(self.tampon) >= self.LIGNES_PAR_PARTIE:
+                self._ecrire_partie()
+            return
+
+        if self.format == 'csv':
+            self.csv.writerows(lignes)
+        else:
+            self.fichier.write(''.join(json.dumps(ligne, ensure_ascii=False) + '\n' for ligne in lignes))
+        self.fichier.flush()
+        self.dernier_id_durable = lignes[-1]['id']
+
+    def _ecrire_partie(self):
+        """Écrit le tampon dans un nouveau fichier Parquet (renommé une fois complet)"""
+        partie = os.path.join(self.chemin, f"part-{self.numero_partie:05d}.parquet")
+        table = self.pyarrow.Table.from_pylist(self.tampon, schema=self.schema)
+        self.parquet.write_table(table, partie + '.tmp', compression='zstd')
+        os.replace(partie + '.tmp', partie)
+        self.numero_partie += 1
+        self.dernier_id_durable = self.tampon[-1]['id']
+        self.tampon = []
+
+    def fermer(self):
+        if self.tampon:
+            self._ecrire_partie()
+        if self.fichier:
+            self.fichier.close()
+
+
+class ExportTickets:
+    """
+    Export des tickets GLPI au fil de l'eau, avec filtres de date et d'entités.
+
+    Les tickets sont lus par tranches d'identifiants disjointes (id > a ET id <= b), jamais
+    par décalage : un ticket supprimé ou créé pendant l'export ne décale aucune page, donc
+    aucun ticket n'est sauté ni doublé. La largeur des tranches suit la densité
+    d'identifiants de la première page ; elles sont téléchargées en parallèle puis écrites
+    dans l'ordre (au plus 2×paralleles tranches en mémoire). Le dernier identifiant écrit
+    est noté dans `<sortie>.reprise.json` ; une exécution interrompue, ou la suivante avec
+    les mêmes filtres, reprend après ce ticket.
+    """
+
+    COLONNES_ENTIERES = ('id', 'status', 'type', 'priority')
+
+    def __init__(self, glpi: GLPIManager, sortie: str, format_sortie: Optional[str] = None,
+                 depuis: Optional[str] = None, jusqu_a: Optional[str] = None, entites: Tuple[int, ...] = (),
+                 paralleles: int = 4, taille_page: int = 500):
+        self.glpi = glpi
+        self.sortie = sortie
+        self.format = format_sortie or self.format_depuis_extension(sortie)
+        if self.format not in EcrivainExport.FORMATS:
+            raise ValueError(f"Format d'export inconnu: {self.format}")
+        self.depuis = depuis
+        self.jusqu_a = jusqu_a
+        self.entites = tuple(entites)
+        self.paralleles = max(1, paralleles)
+        self.taille_page = max(1, taille_page)
+        self.fichier_reprise = sortie.rstrip('/\\') + '.reprise.json'
+        self.champs = GLPIManager.CHAMPS_RECHERCHE['Ticket']
+
+    @staticmethod
+    def format_depuis_extension(chemin: str) -> str:
+        extension = os.path.splitext(chemin.rstrip('/\\'))[1].lstrip('.').lower()
+        return extension if extension in EcrivainExport.FORMATS else 'jsonl'
+
+    @property
+    def filtres(self) -> Dict[str, Any]:
+        return {'depuis': self.depuis, 'jusqu_a': self.jusqu_a, 'entites': list(self.entites), 'format': self.format}
+
+    def criteres(self, apres_id: Optional[int] = None, jusqu_a_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Critères de recherche : période d'ouverture, entités (avec sous-entités), tranche d'identifiants"""
+        criteres = []
+        if self.depuis:
+            criteres.append({'field': self.champs['date'], 'searchtype': 'morethan',
+                             'value': f"{self.depuis} 00:00:00"})
+        if self.jusqu_a:
+            lendemain = datetime.strptime(self.jusqu_a, '%Y-%m-%d') + timedelta(days=1)
+            criteres.append({'field': self.champs['date'], 'searchtype': 'lessthan',
+                             'value': lendemain.strftime('%Y-%m-%d 00:00:00')})
+        if self.entites:
+            criteres.append({'criteria': [
+                dict({'link': 'OR'} if i else {}, field=self.champs['entities_id'], searchtype='under', value=entite)
+                for i, entite in enumerate(self.entites)
+            ]})
+        if apres_id is not None:
+            criteres.append({'field': self.champs['id'], 'searchtype': 'morethan', 'value': apres_id})
+        if jusqu_a_id is not None:
+            criteres.append({'field': self.champs['id'], 'searchtype': 'lessthan', 'value': jusqu_a_id + 1})
+        for critere in criteres[1:]:
+            critere['link'] = 'AND'
+        return criteres
+
+    def _lire_reprise(self) -> Optional[int]:
+        """Dernier identifiant exporté avec les mêmes filtres (None : export complet)"""
+        if not os.path.exists(self.fichier_reprise):
+            return None
+        try:
+            with open(self.fichier_reprise, 'r', encoding='utf-8') as f:
+                reprise = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️  Fichier de reprise illisible (%s) : export complet", e)
+            return None
+        if reprise.get('filtres') != self.filtres:
+            logger.info("🔁 Filtres modifiés depuis le dernier export : export complet")
+            return None
+        return reprise.get('dernier_id')
+
+    def _noter_reprise(self, dernier_id: Optional[int], termine: bool = False):
+        temporaire = self.fichier_reprise + '.tmp'
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            json.dump({'filtres': self.filtres, 'dernier_id': dernier_id, 'termine': termine,
+                       'date': datetime.now().isoformat(timespec='seconds')}, f)
+        os.replace(temporaire, self.fichier_reprise)
+
+    def convertir(self, ligne: Dict[str, Any]) -> Dict[str, Any]:
+        """Ligne de recherche (colonnes numérotées) → enregistrement nommé"""
+        enregistrement = {}
+        for nom, numero in self.champs.items():
+            valeur = ligne.get(str(numero))
+            if isinstance(valeur, list):
+                valeur = ', '.join(str(v) for v in valeur if v is not None)
+            elif isinstance(valeur, str) and '$$##$$' in valeur:
+                valeur = ', '.join(v for v in valeur.split('$$##$$') if v)
+            if nom in self.COLONNES_ENTIERES:
+                try:
+                    valeur = int(valeur) if valeur not in (None, '') else None
+                except (TypeError, ValueError):
+                    valeur = None
+            elif valeur is not None:
+                valeur = str(valeur)
+            enregistrement[nom] = valeur
+        return enregistrement
+
+    def params(self, apres_id: Optional[int] = None, jusqu_a_id: Optional[int] = None,
+               ordre: str = 'ASC') -> Dict[str, Any]:
+        return dict(self.glpi.parametres_recherche(self.criteres(apres_id, jusqu_a_id), list(self.champs.values())),
+                    sort=self.champs['id'], order=ordre)
+
+    def identifiant(self, ligne: Dict[str, Any]) -> int:
+        return int(ligne[str(self.champs['id'])])
+
+    def pages(self, apres_id: Optional[int], jusqu_a_id: Optional[int] = None) -> Iterable[List[Dict[str, Any]]]:
+        """Pages de la tranche ]apres_id, jusqu_a_id], chacune demandée après le dernier identifiant lu"""
+        while True:
+            lignes, _ = self.glpi.lire_page_recherche('Ticket', self.params(apres_id, jusqu_a_id), 0, self.taille_page)
+            yield lignes
+            if len(lignes) < self.taille_page:
+                return
+            apres_id = self.identifiant(lignes[-1])
+
+    def executer(self) -> Dict[str, Any]:
+        debut_export = time.perf_counter()
+        reprise = self._lire_reprise()
+        if reprise is not None:
+            logger.info("⏩ Reprise après le ticket %s", reprise)
+
+        ecrivain = EcrivainExport(self.sortie, self.format, list(self.champs), ajout=reprise is not None)
+        compteurs = {'tickets': 0, 'pages': 0}
+        dernier_note = reprise
+
+        def ecrire(lignes: List[Dict[str, Any]]):
+            nonlocal dernier_note
+            enregistrements = [e for e in map(self.convertir, lignes) if e['id'] is not None]
+            ecrivain.ecrire(enregistrements)
+            compteurs['tickets'] += len(enregistrements)
+            compteurs['pages'] += 1
+            if ecrivain.dernier_id_durable is not None and ecrivain.dernier_id_durable != dernier_note:
+                dernier_note = ecrivain.dernier_id_durable
+                self._noter_reprise(dernier_note)
+
+        try:
+            lignes, total = self.glpi.lire_page_recherche('Ticket', self.params(reprise), 0, self.taille_page)
+            ecrire(lignes)
+            if len(lignes) == self.taille_page:
+                if total is not None:
+                    logger.info("📤 %s ticket(s) à exporter vers %s (%s)", total, self.sortie, self.format)
+                dernier_lu = self.identifiant(lignes[-1])
+                fin, _ = self.glpi.lire_page_recherche('Ticket', self.params(reprise, ordre='DESC'), 0, 1)
+                dernier_id = self.identifiant(fin[0]) if fin else dernier_lu
+                # Tranches de même largeur que la première page : une page chacune en moyenne
+                largeur = dernier_lu - self.identifiant(lignes[0]) + 1
+                bornes = iter(range(dernier_lu, dernier_id, largeur))
+                with ThreadPoolExecutor(max_workers=self.paralleles, thread_name_prefix='export') as executeur:
+                    en_cours = deque()
+
+                    def soumettre():
+                        apres_id = next(bornes, None)
+                        if apres_id is not None:
+                            en_cours.append(executeur.submit(lambda a, b: list(self.pages(a, b)),
+                                                             apres_id, min(apres_id + largeur, dernier_id)))
+
+                    for _ in range(self.paralleles * 2):
+                        soumettre()
+                    while en_cours:
+                        pages = en_cours.popleft().result()
+                        soumettre()
+                        for page in pages:
+                            ecrire(page)
+
+                # Tickets créés depuis la lecture du dernier identifiant
+                for page in self.pages(max(dernier_lu, dernier_id)):
+                    ecrire(page)
+        finally:
+            ecrivain.fermer()
+            if ecrivain.dernier_id_durable is not None and ecrivain.dernier_id_durable != dernier_note:
+                dernier_note = ecrivain.dernier_id_durable
+                self._noter_reprise(dernier_note)
+
+        self._noter_reprise(dernier_note, termine=True)
+        duree = time.perf_counter() - debut_export
+        return dict(compteurs, dernier_id=dernier_note, duree_s=round(duree, 2),
+                    debit_tickets_s=round(compteurs['tickets'] / duree, 1) if duree else 0.0)
+
+
+def main_export(args: argparse.Namespace):
+    """Export des tickets (--export)"""
+    simulation = None
+    if args.simulation:
+        simulation = ServeurSimulation(args.bench_utilisateurs, args.bench_entites, args.bench_categories,
+                                       args.bench_latence, args.bench_erreurs,
+                                       tickets=args.bench_tickets).demarrer()
+        simulation.configurer_environnement()
+
+    entites = tuple(int(v) for v in re.split(r'[,;\s]+', args.export_entites or '') if v.isdigit())
+    glpi = GLPIManager(GLPIConfig())
+    try:
+        export = ExportTickets(glpi, args.export, args.export_format, args.export_depuis, args.export_jusqu_a,
+                               entites, args.export_paralleles, args.export_taille_page)
+        if not glpi.authentification():
+            logger.error("❌ Échec de l'authentification GLPI")
+            sys.exit(1)
+        try:
+            resultats = export.executer()
+        finally:
+            glpi.fermer_session()
+    except (ValueError, RuntimeError, OSError) as e:  # OSError : fichier de sortie et erreurs HTTP (requests)
+        logger.error("❌ Export impossible : %s", e)
+        sys.exit(1)
+    finally:
+        if simulation:
+            simulation.arreter()
+
+    logger.info("📤 %s ticket(s) exporté(s) vers %s en %s s (%s tickets/s), dernier ticket: %s",
+                resultats['tickets'], args.export, resultats['duree_s'], resultats['debit_tickets_s'],
+                resultats['dernier_id'])
+
+
+def main_journal(args: argparse.Namespace):
+    """Recherche dans le journal local des tickets (--journal)"""
+    journal = obtenir_journal()
+    if journal is None:
+        logger.error("❌ Journal local désactivé ou illisible (JOURNAL_TICKETS)")
+        sys.exit(1)
+
+    depuis = args.journal_depuis
+    if depuis == 'aujourdhui':
+        depuis = datetime.now().strftime('%Y-%m-%d')
+    resultats = journal.rechercher(args.journal, depuis, args.journal_limite)
+
+    if args.journal_json:
+        for resultat in resultats:
+            print(json.dumps(resultat, ensure_ascii=False))
+        return
+
+    print(f"\n📒 {len(resultats)} ticket(s) trouvé(s) dans {journal.chemin}")
+    for resultat in resultats:
+        etat = "❌ " + "; ".join(resultat['erreurs']) if resultat['erreurs'] else \
+            ("✅ clôturé" if resultat['cloture'] else "🟢 ouvert")
+        print(f"\n🎫 #{resultat['ticket_id'] or '-'}  {resultat['date']}  {resultat['titre']}  [{etat}]")
+        print(f"   👤 {resultat['nom_appelant']} ({resultat['telephone']}) pour {resultat['nom_client'] or resultat['demandeur']}"
+              + (f" · 🏷️  S/N {resultat['numero_serie']}" if resultat['numero_serie'] else ""))
+        if resultat['entite'] or resultat['instance']:
+            print(f"   🏢 {resultat['entite'] or '-'}" + (f" · 🗄️  {resultat['instance']}" if resultat['instance'] else ""))
+        print(f"   📝 {' '.join((resultat['description_finale'] or '').split())[:150]}")
+
+
+class SurveillanceTickets:
+    """
+    Suivi des tickets créés par le script (journal local) ou attribués à des techniciens.
+
+    Chaque cycle lance une recherche par périmètre : tickets dont date_mod dépasse le
+    filigrane (plus haute date_mod déjà vue, une seconde de recouvrement), première page en
+    requête conditionnelle (If-None-Match). Les suivis et solutions ne sont relus que pour
+    les tickets suivis qui ont changé. Les événements sont émis en JSONL sur la sortie
+    standard et, en option, transmis à une commande (JSON sur l'entrée standard).
+
+    La recherche du périmètre journal est bornée côté serveur à la plage d'identifiants
+    des tickets suivis non clos ; GLPI ne sait pas filtrer sur une liste d'identifiants
+    sans une URL démesurée, donc les tickets créés par d'autres dans cette plage et
+    modifiés pendant le cycle sont aussi téléchargés, puis écartés : le coût d'un cycle
+    suit l'activité GLPI sur les tickets récents, pas seulement celle des tickets suivis.
+
+    Un cycle est tout ou rien : état des tickets, ETag et filigrane ne sont mis à jour
+    qu'une fois tous les tickets modifiés relus, sinon le cycle suivant recommence.
+    """
+
+    STATUTS = {1: 'Nouveau', 2: 'En cours (attribué)', 3: 'En cours (planifié)', 4: 'En attente',
+               5: 'Résolu', 6: 'Clos'}
+    COLONNES = ('id', 'status', 'date_mod', 'users_id_assign')
+
+    def __init__(self, glpi: GLPIManager, journal: Optional[JournalTickets], techniciens: Tuple[int, ...] = (),
+                 fichier_etat: str = 'surveillance_tickets.json', commande: Optional[str] = None,
+                 taille_page: int = 500, paralleles: int = 4):
+        self.glpi = glpi
+        self.journal = journal
+        self.techniciens = tuple(techniciens)
+        self.fichier_etat = fichier_etat
+        self.commande = commande
+        self.taille_page = taille_page
+        self.paralleles = paralleles
+        self.champs = GLPIManager.CHAMPS_RECHERCHE['Ticket']
+        self.validateurs: Dict[str, Dict[str, Any]] = {}
+        self.etat = self._charger_etat()
+        # Tickets suivis : {id: {'status', 'date_mod', 'suivi', 'solution'}}
+        self.tickets: Dict[str, Dict[str, Any]] = self.etat.setdefault('tickets', {})
+
+    def _charger_etat(self) -> Dict[str, Any]:
+        try:
+            with open(self.fichier_etat, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️  État de surveillance illisible (%s) : reprise à partir de maintenant", e)
+            return {}
+
+    def _sauvegarder_etat(self):
+        temporaire = f"{self.fichier_etat}.tmp"
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            json.dump(self.etat, f, ensure_ascii=False)
+        os.replace(temporaire, self.fichier_etat)
+
+    def _emettre(self, evenement: Dict[str, Any]):
+        ligne = json.dumps(evenement, ensure_ascii=False)
+        print(ligne, flush=True)
+        if self.commande:
+            try:
+                subprocess.run(self.commande, shell=True, input=ligne + '\n', text=True, timeout=30, check=True)
+            except (OSError, subprocess.SubprocessError) as e:
+                logger.warning("⚠️  Commande de surveillance en échec pour le ticket %s: %s",
+                               evenement.get('ticket_id'), e)
+
+    def _initialiser(self):
+        """Filigrane initial : la plus récente date_mod connue du serveur (sans historique)"""
+        if not self.etat.get('filigrane'):
+            params = dict(self.glpi.parametres_recherche([], [self.champs['id'], self.champs['date_mod']]),
+                          sort=self.champs['date_mod'], order='DESC')
+            lignes, _ = self.glpi.lire_page_recherche('Ticket', params, 0, 1)
+            self.etat['filigrane'] = lignes[0].get(str(self.champs['date_mod'])) if lignes else '1970-01-01 00:00:00'
+            self.etat['debut'] = self.etat['filigrane']
+            logger.info("👀 Surveillance des modifications postérieures à %s", self.etat['filigrane'])
+
+    def _suivre_nouveaux_tickets(self):
+        """Ajoute les tickets journalisés depuis le dernier cycle (lecture incrémentale du journal)"""
+        if not self.journal:
+            return
+        ids, derniere_ligne = self.journal.tickets_crees(self.etat.get('ligne_journal', 0), self.glpi.profil)
+        for ticket_id in ids:
+            self.tickets.setdefault(str(ticket_id), {'status': 1, 'date_mod': None, 'suivi': 0, 'solution': 0})
+        self.etat['ligne_journal'] = derniere_ligne
+
+    def _modifications(self) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        Tickets modifiés depuis le filigrane (une recherche par périmètre, toutes pages)
+
+        Returns:
+            Le couple (lignes modifiées, validateurs à conserver si le cycle aboutit)
+        """
+        filigrane = datetime.strptime(self.etat['filigrane'], '%Y-%m-%d %H:%M:%S') - timedelta(seconds=1)
+        critere_date = {'field': self.champs['date_mod'], 'searchtype': 'morethan',
+                        'value': filigrane.strftime('%Y-%m-%d %H:%M:%S')}
+        perimetres = {}
+        ouverts = [int(ticket_id) for ticket_id, connu in self.tickets.items() if connu['status'] != 6]
+        if self.journal and ouverts:
+            perimetres['journal'] = [critere_date,
+                                     {'link': 'AND', 'field': self.champs['id'], 'searchtype': 'morethan',
+                                      'value': min(ouverts) - 1},
+                                     {'link': 'AND', 'field': self.champs['id'], 'searchtype': 'lessthan',
+                                      'value': max(ouverts) + 1}]
+        if self.techniciens:
+            perimetres['techniciens'] = [critere_date, {'link': 'AND', 'criteria': [
+                dict({'link': 'OR'} if i else {}, field=self.champs['users_id_assign'], searchtype='equals',
+                     value=technicien) for i, technicien in enumerate(self.techniciens)]}]
+
+        modifies: Dict[int, Dict[str, Any]] = {}
+        nouveaux_validateurs = {}
+        for perimetre, criteres in perimetres.items():
+            params = dict(self.glpi.parametres_recherche(criteres, [self.champs[c] for c in self.COLONNES]),
+                          sort=self.champs['date_mod'], order='ASC')
+            validateurs = nouveaux_validateurs[perimetre] = dict(self.validateurs.get(perimetre, {}))
+            lignes, total = self.glpi.lire_page_recherche('Ticket', params, 0, self.taille_page, validateurs)
+            if validateurs['non_modifie']:
+                continue
+            debut = len(lignes)
+            while lignes:
+                for ligne in lignes:
+                    ticket_id = int(ligne.get(str(self.champs['id'])))
+                    if perimetre == 'techniciens' or str(ticket_id) in self.tickets:
+                        modifies[ticket_id] = ligne
+                if (total is not None and debut >= total) or (total is None and len(lignes) < self.taille_page):
+                    break
+                lignes, total = self.glpi.lire_page_recherche('Ticket', params, debut, self.taille_page)
+                debut += len(lignes)
+        return list(modifies.values()), nouveaux_validateurs
+
+    def _evenements_ticket(self, ligne: Dict[str, Any]) -> Tuple[str, Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Compare un ticket modifié à son dernier état connu et relit ses suivis et solutions
+
+        Returns:
+            Le triplet (id, nouvel état, événements) ; l'état connu n'est pas modifié
+        """
+        ticket_id = int(ligne.get(str(self.champs['id'])))
+        date_mod = ligne.get(str(self.champs['date_mod']))
+        statut = int(ligne.get(str(self.champs['status'])) or 0)
+        connu = dict(self.tickets.get(str(ticket_id)) or {'status': None, 'date_mod': None, 'suivi': 0, 'solution': 0})
+        if connu['date_mod'] == date_mod:
+            return str(ticket_id), connu, []  # Déjà traité (recouvrement du filigrane)
+
+        evenements = []
+        if connu['status'] != statut:
+            evenements.append({'evenement': 'statut', 'ticket_id': ticket_id, 'ancien': connu['status'],
+                               'nouveau': statut, 'libelle': self.STATUTS.get(statut, str(statut)),
+                               'date': date_mod})
+
+        debut = self.etat.get('debut', '')
+        for sous_itemtype, cle, evenement in (('ITILFollowup', 'suivi', 'suivi'),
+                                              ('ITILSolution', 'solution', 'solution')):
+            elements = self.glpi.lister_sous_items('Ticket', ticket_id, sous_itemtype)
+            for element in sorted(elements, key=lambda e: e.get('id', 0)):
+                date_creation = str(element.get('date_creation') or element.get('date') or '')
+                if element.get('id', 0) <= connu[cle] or date_creation < debut:
+                    continue
+                evenements.append({'evenement': evenement, 'ticket_id': ticket_id, f"{cle}_id": element['id'],
+                                   'date': date_creation, 'auteur': element.get('users_id'),
+                                   'contenu': element.get('content')})
+            if elements:
+                connu[cle] = max(connu[cle], max(e.get('id', 0) for e in elements))
+
+        connu['status'], connu['date_mod'] = statut, date_mod
+        return str(ticket_id), connu, evenements
+
+    def cycle(self) -> int:
+        """Un cycle de surveillance ; retourne le nombre d'événements émis"""
+        self._initialiser()
+        self._suivre_nouveaux_tickets()
+        modifies, validateurs = self._modifications()
+        if modifies:
+            # Une erreur sur un ticket interrompt le cycle avant toute mise à jour de l'état
+            with ThreadPoolExecutor(max_workers=self.paralleles, thread_name_prefix='surveillance') as executeur:
+                resultats = list(executeur.map(self._evenements_ticket, modifies))
+        else:
+            resultats = []
+
+        nombre = 0
+        for ticket_id, connu, evenements in resultats:
+            self.tickets[ticket_id] = connu
+            for evenement in evenements:
+                self._emettre(evenement)
+                nombre += 1
+        self.validateurs.update(validateurs)
+        dates = [ligne.get(str(self.champs['date_mod'])) for ligne in modifies]
+        self.etat['filigrane'] = max([self.etat['filigrane']] + [d for d in dates if d])
+        self._sauvegarder_etat()
+        return nombre
+
+    def executer(self, intervalle: float = 30.0, cycles: int = 0):
+        """Cycles toutes les `intervalle` secondes (indéfiniment si cycles vaut 0)"""
+        numero = 0
+        while True:
+            numero += 1
+            debut = time.perf_counter()
+            try:
+                nombre = self.cycle()
+                logger.debug("👀 Cycle %s : %s événement(s), %s ticket(s) suivi(s), %.0f ms", numero, nombre,
+                             len(self.tickets), (time.perf_counter() - debut) * 1000)
+            except requests.exceptions.RequestException as e:
+                logger.warning("⚠️  Cycle de surveillance en échec: %s", e)
+            if cycles and numero >= cycles:
+                return
+            time.sleep(max(0.0, intervalle - (time.perf_counter() - debut)))
+
+
+def main_surveillance(args: argparse.Namespace):
+    """Suivi des modifications de tickets (--watch)"""
+    techniciens = tuple(int(v) for v in re.split(r'[,;\s]+', args.watch_techniciens or '') if v.isdigit())
+    journal = obtenir_journal()
+    if not journal and not techniciens:
+        logger.error("❌ Rien à surveiller : journal local désactivé et aucun technicien (--watch-techniciens)")
+        sys.exit(1)
+
+    glpi = GLPIManager(GLPIConfig())
+    if not glpi.authentification():
+        logger.error("❌ Échec de l'authentification GLPI")
+        sys.exit(1)
+
+    surveillance = SurveillanceTickets(glpi, journal, techniciens, args.watch_etat, args.watch_hook)
+    logger.info("👀 Surveillance toutes les %s s (%s)", args.watch_intervalle,
+                ', '.join(filter(None, ['tickets créés par le script' if journal else '',
+                                        f"techniciens {', '.join(map(str, techniciens))}" if techniciens else ''])))
+    try:
+        surveillance.executer(args.watch_intervalle, args.watch_cycles)
+    except KeyboardInterrupt:
+        logger.info("⏹️  Surveillance arrêtée")
+    finally:
+        glpi.fermer_session()
+
+
+class GestionnaireSimulation:
+    """Réponses simulées des endpoints GLPI et Perplexity utilisés par le script (voir serveur_http)"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _repondre(self, code: int, donnees: Any, entetes: Optional[Dict[str, str]] = None):
+        """Envoie une réponse JSON (compressée si le client accepte gzip)"""
+        corps = json.dumps(donnees, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if len(corps) > 1024 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            corps = gzip.compress(corps, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(corps)))
+        for cle, valeur in (entetes or {}).items():
+            self.send_header(cle, valeur)
+        self.end_headers()
+        self.wfile.write(corps)
+        with self.server.simulation.verrou:
+            self.server.simulation.octets_envoyes += len(corps)
+
+    def _lire_corps(self) -> Dict[str, Any]:
+        longueur = int(self.headers.get('Content-Length') or 0)
+        if self.headers.get('Content-Type', '').startswith('multipart/'):
+            # Envoi de fichier : lu par blocs et ignoré
+            while longueur > 0:
+                longueur -= len(self.rfile.read(min(longueur, 65536)) or b'x' * longueur)
+            return {}
+        corps = self.rfile.read(longueur) if longueur else b''
+        try:
+            return json.loads(corps) if corps else {}
+        except ValueError:
+            return {}
+
+    def _conditions_reseau(self) -> bool:
+        """Applique la latence et le taux d'erreur configurés (False si une erreur est simulée)"""
+        serveur = self.server.simulation
+        if serveur.latence > 0:
+            time.sleep(max(0.0, random.gauss(serveur.latence, serveur.latence * 0.2)))
+        if serveur.taux_erreur > 0 and random.random() < serveur.taux_erreur:
+            self._repondre(500, ["ERROR", "Erreur simulée"])
+            return False
+        return True
+
+    def _session_valide(self) -> bool:
+        if self.headers.get('Session-Token') not in self.server.simulation.sessions:
+            self._repondre(401, ["ERROR_SESSION_TOKEN_INVALID", "session_token semble incorrect"])
+            return False
+        return True
+
+    def _liste(self, elements: List[Dict[str, Any]], enveloppe: Optional[Dict[str, Any]] = None,
+               conversion=None):
+        """Réponse paginée façon GLPI (range + Content-Range), éventuellement dans `enveloppe['data']`"""
+        plage = parse_qs(urlparse(self.path).query).get('range', ['0-49'])[0]
+        debut, fin = (int(v) for v in plage.split('-'))
+        total = len(elements)
+        if total and debut >= total:
+            self._repondre(400, ["ERROR_RANGE_EXCEEDED_TOTAL", "Plage demandée hors limites"])
+            return
+        page = elements[debut:fin + 1]
+        if conversion:
+            page = [conversion(element) for element in page]
+        code = 206 if len(page) < total else 200
+        entetes = {'Content-Range': f"{debut}-{debut + len(page) - 1}/{total}",
+                   'Accept-Range': f"{self.path.split('?')[0]} 1000"}
+        if enveloppe is not None:
+            page = dict(enveloppe, totalcount=total, count=len(page), data=page)
+            # Validateur de la page : requête conditionnelle (If-None-Match) → 304 sans corps
+            etag = '"%s"' % hashlib.md5(json.dumps(page, sort_keys=True).encode('utf-8')).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            entetes['ETag'] = etag
+        self._repondre(code, page, entetes)
+
+    # Champs liés affichés par la recherche : itemtype référencé et colonne affichée
+    REFERENCES = {'entities_id': ('Entity', 'completename'), 'itilcategories_id': ('ITILCategory', 'completename'),
+                  'users_id_requester': ('User', 'name'), 'users_id_assign': ('User', 'name')}
+
+    @staticmethod
+    def _arbre_criteres(parametres: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        """criteria[0][criteria][1][field]=... → liste de critères imbriqués"""
+        racine: Dict[str, Any] = {}
+        for cle, valeurs in parametres.items():
+            if not cle.startswith('criteria['):
+                continue
+            noeud = racine
+            morceaux = ['criteria'] + re.findall(r'\[(\w+)\]', cle)
+            for morceau in morceaux[:-1]:
+                noeud = noeud.setdefault(morceau, {})
+            noeud[morceaux[-1]] = valeurs[0]
+
+        def liste(noeud: Dict[str, Any]) -> List[Dict[str, Any]]:
+            criteres = [noeud[i] for i in sorted(noeud, key=int)]
+            for critere in criteres:
+                if 'criteria' in critere:
+                    critere['criteria'] = liste(critere['criteria'])
+            return criteres
+
+        return liste(racine.get('criteria', {}))
+
+    def _correspond(self, element: Dict[str, Any], criteres: List[Dict[str, Any]], options: Dict[int, str]) -> bool:
+        resultat = True
+        for i, critere in enumerate(criteres):
+            if 'criteria' in critere:
+                valide = self._correspond(element, critere['criteria'], options)
+            else:
+                valeur, attendu = element.get(options.get(int(critere['field']))), critere.get('value', '')
+                recherche = critere.get('searchtype', 'contains')
+                if recherche == 'equals' and attendu == 'notold':
+                    valide = (valeur or 0) < 5
+                elif recherche == 'under':
+                    racine = self.server.simulation.par_id['Entity'].get(int(attendu), {}).get('completename', '')
+                    chemin = self.server.simulation.par_id['Entity'].get(valeur, {}).get('completename', '')
+                    valide = bool(racine) and (chemin == racine or chemin.startswith(racine + ' > '))
+                elif recherche in ('equals', 'morethan', 'lessthan'):
+                    if isinstance(valeur, int):
+                        valeur, attendu = valeur, int(attendu)
+                    else:
+                        valeur = str(valeur or '')
+                    valide = {'equals': valeur == attendu, 'morethan': valeur > attendu,
+                              'lessthan': valeur < attendu}[recherche]
+                else:
+                    valide = str(attendu).lower() in str(valeur or '').lower()
+            resultat = (resultat or valide) if i and critere.get('link') == 'OR' else (resultat and valide)
+        return resultat
+
+    def _recherche(self, itemtype: str):
+        """Moteur de recherche GLPI : critères, colonnes forcedisplay indexées par numéro d'option"""
+        simulation = self.server.simulation
+        parametres = parse_qs(urlparse(self.path).query)
+        options = {numero: nom for champs in (GLPIManager.CHAMPS_RECHERCHE, IndexAppelants.CHAMPS_RECHERCHE,
+                                              GLPIManager.FILTRES_ANNUAIRE)
+                   for nom, numero in champs.get(itemtype, {}).items()}
+        colonnes = [int(v[0]) for k, v in sorted(parametres.items()) if k.startswith('forcedisplay[')]
+        criteres = self._arbre_criteres(parametres)
+
+        if not criteres and 'sort' not in parametres:
+            elements = simulation.donnees[itemtype]
+        elif len(criteres) == 1 and criteres[0].get('field') == '2' and criteres[0].get('searchtype') == 'equals':
+            element = simulation.par_id[itemtype].get(int(criteres[0].get('value') or 0))
+            elements = [element] if element else []
+        else:
+            # Résultat filtré gardé pour les pages suivantes de la même recherche
+            cle = (itemtype, urlencode(sorted((k, v[0]) for k, v in parametres.items()
+                                              if k.startswith('criteria') or k in ('sort', 'order'))))
+            with simulation.verrou:
+                elements = simulation.recherches.get(cle)
+            if elements is None:
+                elements = [e for e in simulation.donnees[itemtype] if self._correspond(e, criteres, options)]
+                tri = options.get(int(parametres.get('sort', ['0'])[0]))
+                if tri:
+                    elements.sort(key=lambda e: (e.get(tri) is not None, e.get(tri) or 0),
+                                  reverse=parametres.get('order', ['ASC'])[0] == 'DESC')
+                with simulation.verrou:
+                    if len(simulation.recherches) > 32:
+                        simulation.recherches.clear()
+                    simulation.recherches[cle] = elements
+
+        def ligne(element: Dict[str, Any]) -> Dict[str, Any]:
+            resultat = {'2': element['id']}
+            for numero in colonnes:
+                nom = options.get(numero)
+                valeur = element.get(nom) if nom else None
+                if nom in self.REFERENCES:
+                    reference, colonne = self.REFERENCES[nom]
+                    valeur = simulation.par_id[reference].get(valeur, {}).get(colonne)
+                resultat[str(numero)] = valeur
+            return resultat
+
+        self._liste(elements, {'sort': [int(parametres.get('sort', ['1'])[0])],
+                               'order': [parametres.get('order', ['ASC'])[0]]}, ligne)
+
+    def do_GET(self):
+        if not self._conditions_reseau():
+            return
+
+        simulation = self.server.simulation
+        chemin = urlparse(self.path).path.split('/apirest.php', 1)[-1]
+
+        if chemin == '/initSession':
+            if not self.headers.get('Authorization', '').startswith('user_token '):
+                self._repondre(401, ["ERROR_LOGIN_PARAMETERS_MISSING", "Paramètres manquants"])
+                return
+            token = f"session{len(simulation.sessions) + 1}"
+            simulation.sessions.add(token)
+            self._repondre(200, {'session_token': token})
+            return
+
+        if not self._session_valide():
+            return
+
+        correspondance = re.match(r'^/(\w+)(?:/(\d+))?(?:/(\w+))?$', chemin)
+        if chemin == '/killSession':
+            simulation.sessions.discard(self.headers.get('Session-Token'))
+            self._repondre(200, {})
+        elif chemin[len('/search/'):] in simulation.donnees:
+            self._recherche(chemin[len('/search/'):])
+        elif chemin.startswith('/search/'):
+            self._repondre(200, {'totalcount': random.randint(0, 40), 'count': 0, 'data': []})
+        elif correspondance:
+            itemtype, item_id, sous_itemtype = correspondance.groups()
+            elements = simulation.donnees.get(itemtype)
+            if elements is None:
+                self._repondre(400, ["ERROR_RESOURCE_NOT_FOUND_NOR_COMMONDBTM", f"{itemtype} inconnu"])
+            elif sous_itemtype:
+                self._liste([e for e in simulation.donnees.get(sous_itemtype, [])
+                             if e.get('itemtype') == itemtype and e.get('items_id') == int(item_id or 0)])
+            elif item_id:
+                element = simulation.par_id[itemtype].get(int(item_id))
+                if element:
+                    self._repondre(200, element)
+                else:
+                    self._repondre(404, ["ERROR_ITEM_NOT_FOUND", "Élément introuvable"])
+            else:
+                # Filtres booléens des listes complètes (ex: is_requester=True)
+                filtres = {cle: valeurs[0] in ('1', 'True', 'true')
+                           for cle, valeurs in parse_qs(urlparse(self.path).query).items()
+                           if cle in GLPIManager.FILTRES_ANNUAIRE.get(itemtype, {})}
+                self._liste([e for e in elements if all(bool(e.get(cle)) == attendu
+                                                        for cle, attendu in filtres.items())])
+        else:
+            self._repondre(400, ["ERROR_BAD_ARRAY", f"Route inconnue: {chemin}"])
+
+    def do_POST(self):
+        corps = self._lire_corps()
+        if not self._conditions_reseau():
+            return
+
+        simulation = self.server.simulation
+        chemin = urlparse(self.path).path
+
+        if chemin.endswith('/chat/completions'):
+            messages = corps.get('messages') or [{}]
+            texte = str(messages[-1].get('content', ''))
+            jetons_entree = sum(len(str(m.get('content', ''))) for m in messages) // 4
+            reponse = ' '.join(texte.split()[:40])
+            if corps.get('max_tokens'):
+                reponse = reponse[:int(corps['max_tokens']) * 4]
+            self._repondre(200, {
+                'choices': [{'message': {'role': 'assistant', 'content': reponse}}],
+                'usage': {'prompt_tokens': jetons_entree, 'completion_tokens': len(reponse) // 4,
+                          'total_tokens': jetons_entree + len(reponse) // 4}
+            })
+            return
+
+        if not self._session_valide():
+            return
+
+        itemtype = chemin.rstrip('/').rsplit('/', 1)[-1]
+        entree = corps.get('input') if isinstance(corps.get('input'), dict) else {}
+        maintenant = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with simulation.verrou:
+            ticket = simulation.par_id['Ticket'].get(int(entree.get('items_id') or 0))
+            if itemtype == 'ITILSolution' and ticket and ticket.get('status') == 6:
+                self._repondre(400, ['ERROR_GLPI_ADD', "Vous n'avez pas les droits requis pour réaliser cette action."])
+                return
+            simulation.dernier_id += 1
+            nouvel_id = simulation.dernier_id
+            # Tickets, suivis et solutions sont conservés pour la surveillance (--watch)
+            if itemtype == 'Ticket':
+                simulation.ajouter('Ticket', dict(entree, id=nouvel_id, status=entree.get('status', 1),
+                                                  date=maintenant, date_mod=maintenant))
+            elif itemtype in ('ITILFollowup', 'ITILSolution'):
+                simulation.ajouter(itemtype, dict(entree, id=nouvel_id, date_creation=maintenant,
+                                                  users_id=entree.get('users_id', 2)))
+                if ticket:
+                    ticket['date_mod'] = maintenant
+                    # Comme GLPI : une solution résout le ticket
+                    if itemtype == 'ITILSolution':
+                        ticket['status'] = 5
+        self._repondre(201, {'id': nouvel_id, 'message': ''})
+
+    def do_PUT(self):
+        corps = self._lire_corps()
+        if not self._conditions_reseau() or not self._session_valide():
+            return
+        simulation = self.server.simulation
+        itemtype, item_id = urlparse(self.path).path.rstrip('/').rsplit('/', 2)[-2:]
+        entree = corps.get('input') if isinstance(corps.get('input'), dict) else {}
+        with simulation.verrou:
+            element = simulation.par_id.get(itemtype, {}).get(int(item_id)) if item_id.isdigit() else None
+            if element is not None and entree:
+                element.update(entree, date_mod=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                simulation.recherches.clear()
+        self._repondre(200, [{item_id: True, 'message': ''}])
+
+
+class ServeurSimulation:
+    """Serveur local simulant GLPI et Perplexity (latence, taux d'erreur et volumétrie configurables)"""
+
+    NOMS = ['MARTIN', 'BERNARD', 'DUBOIS', 'THOMAS', 'ROBERT', 'RICHARD', 'PETIT', 'DURAND',
+            'LEROY', 'MOREAU', 'SIMON', 'LAURENT', 'LEFEBVRE', 'MICHEL', 'GARCIA', 'DAVID']
+    PRENOMS = ['Sarah', 'Julien', 'Camille', 'Nicolas', 'Claire', 'Thomas', 'Emma', 'Lucas']
+    BRANCHES = ['CLIENTS_HORS_CONTRAT', 'CLIENTS_SOUS_CONTRAT', 'COPIEUR']
+
+    def __init__(self, utilisateurs: int = 1000, entites: int = 200, categories: int = 100,
+                 latence_ms: float = 0.0, taux_erreur: float = 0.0, graine: int = 42, tickets: int = 0):
+        self.latence = latence_ms / 1000
+        self.taux_erreur = taux_erreur
+        self.sessions = set()
+        self.octets_envoyes = 0
+        self.recherches: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self.verrou = threading.Lock()
+        self.donnees = self._generer(utilisateurs, entites, categories, tickets, random.Random(graine))
+        self.dernier_id = len(self.donnees['Ticket'])
+        self.par_id = {itemtype: {e['id']: e for e in elements} for itemtype, elements in self.donnees.items()}
+        self.serveur = None
+        self.dossier_temporaire = None
+
+    def _generer(self, nb_utilisateurs: int, nb_entites: int, nb_categories: int, nb_tickets: int,
+                 aleatoire: random.Random) -> Dict[str, List[Dict[str, Any]]]:
+        """Génère un jeu de données déterministe aux formats renvoyés par GLPI"""
+        racine = 'Entité racine'
+        entites = [{'id': 0, 'name': racine, 'completename': racine, 'entities_id': -1, 'level': 1}]
+        for i, branche in enumerate(self.BRANCHES, 1):
+            entites.append({'id': i, 'name': branche, 'completename': f"{racine} > {branche}",
+                            'entities_id': 0, 'level': 2})
+        for i in range(len(entites), nb_entites):
+            parent = entites[1 + i % len(self.BRANCHES)]
+            nom = f"{aleatoire.choice(self.NOMS)} {i}"
+            entites.append({'id': i, 'name': nom, 'completename': f"{parent['completename']} > {nom}",
+                            'entities_id': parent['id'], 'level': 3, 'comment': '', 'address': '',
+                            'postcode': '', 'town': '', 'phonenumber': '', 'email': '',
+                            'date_mod': '2025-09-01 10:00:00', 'date_creation': '2024-01-01 09:00:00'})
+
+        utilisateurs = []
+        for i in range(1, nb_utilisateurs + 1):
+            nom = aleatoire.choice(self.NOMS)
+            prenom = aleatoire.choice(self.PRENOMS)
+            utilisateurs.append({
+                'id': i, 'name': f"{prenom[0].lower()}{nom.lower()}{i}", 'realname': nom, 'firstname': prenom,
+                'entities_id': aleatoire.randrange(len(entites)), 'phone': f"01{aleatoire.randrange(10 ** 8):08d}",
+                'phone2': '', 'mobile': f"06{aleatoire.randrange(10 ** 8):08d}", 'is_active': 1, 'is_requester': 1,
+                'comment': '', 'locations_id': 0, 'language': 'fr_FR', 'use_mode': 0, 'list_limit': None,
+                'date_mod': '2025-09-01 10:00:00', 'date_creation': '2024-01-01 09:00:00',
+                'profiles_id': 1, 'usertitles_id': 0, 'usercategories_id': 0, 'csv_delimiter': None,
+                'is_deleted': 0, 'auths_id': 0, 'authtype': 1, 'last_login': '2025-09-01 08:00:00',
+                'registration_number': None, 'links': [{'rel': 'Entity', 'href': 'http://glpi/apirest.php/Entity/0'}],
+            })
+
+        categories = []
+        for i in range(1, nb_categories + 1):
+            parent = categories[aleatoire.randrange(len(categories))] if categories and i % 4 else None
+            nom = f"Catégorie {i}"
+            completename = f"{parent['completename']} > {nom}" if parent else nom
+            categories.append({'id': i, 'name': nom, 'completename': completename,
+                               'itilcategories_id': parent['id'] if parent else 0, 'level': completename.count('>') + 1})
+
+        tickets = []
+        origine = datetime(2024, 1, 1)
+        for i in range(1, nb_tickets + 1):
+            ouverture = origine + timedelta(minutes=i * 7 + aleatoire.randrange(5))
+            statut = aleatoire.choice([1, 2, 4, 5, 6, 6, 6])
+            fin = (ouverture + timedelta(hours=aleatoire.randrange(1, 72))).strftime('%Y-%m-%d %H:%M:%S')
+            tickets.append({
+                'id': i, 'name': f"Incident {i}", 'status': statut, 'type': aleatoire.choice([1, 2]),
+                'priority': aleatoire.randint(2, 5), 'date': ouverture.strftime('%Y-%m-%d %H:%M:%S'),
+                'date_mod': fin, 'solvedate': fin if statut >= 5 else None, 'closedate': fin if statut == 6 else None,
+                'entities_id': aleatoire.randrange(len(entites)),
+                'itilcategories_id': aleatoire.randint(1, nb_categories) if nb_categories else 0,
+                'users_id_requester': aleatoire.randint(1, nb_utilisateurs) if nb_utilisateurs else 0,
+                'users_id_assign': aleatoire.randint(1, nb_utilisateurs) if nb_utilisateurs else 0,
+                'content': aleatoire.choice(BancEssai.DESCRIPTIONS),
+            })
+
+        copieurs = [{'id': i, 'name': f"Copieur {i}", 'serial': f"XK{aleatoire.randrange(10 ** 6):06d}",
+                     'entities_id': aleatoire.randrange(len(entites))} for i in range(1, nb_entites // 2 + 1)]
+
+        return {'User': utilisateurs, 'Entity': entites, 'ITILCategory': categories, 'Printer': copieurs,
+                'Ticket': tickets, 'ITILSolution': [], 'ITILFollowup': [], 'Group': [], 'Profile_User': []}
+
+    def ajouter(self, itemtype: str, element: Dict[str, Any]):
+        """Enregistre un élément créé par POST (appel sous self.verrou)"""
+        self.donnees[itemtype].append(element)
+        self.par_id[itemtype][element['id']] = element
+        self.recherches.clear()
+
+    @property
+    def url(self) -> str:
+        hote, port = self.serveur.server_address[:2]
+        return f"http://{hote}:{port}"
+
+    def demarrer(self, port: int = 0) -> 'ServeurSimulation':
+        """Démarre le serveur dans un thread (port 0 : choisi par le système)"""
+        self.serveur = serveur_http(('127.0.0.1', port), GestionnaireSimulation)
+        self.serveur.simulation = self
+        threading.Thread(target=self.serveur.serve_forever, daemon=True).start()
+        return self
+
+    @staticmethod
+    def _oublier_singletons():
+        """Journal et comptabilité seront recréés d'après l'environnement au prochain appel"""
+        global comptabilite_jetons, journal_tickets
+        with verrou_comptabilite:
+            comptabilite_jetons = None
+        with verrou_journal:
+            if journal_tickets:
+                journal_tickets.fermer()
+            journal_tickets = None
+
+    def arreter(self):
+        if self.serveur:
+            self.serveur.shutdown()
+            self.serveur.server_close()
+        if self.dossier_temporaire:
+            self._oublier_singletons()
+            self.dossier_temporaire.cleanup()
+            self.dossier_temporaire = None
+
+    def configurer_environnement(self):
+        """
+        Pointe la configuration du script vers le serveur simulé (processus courant et
+        sous-processus lancés ensuite). Journal des tickets et consommation Perplexity simulés
+        vont dans un dossier temporaire supprimé par arreter : le journal réel (qui alimente
+        IndexAppelants et --watch), le fichier de consommation et les budgets restent intacts
+        """
+        if self.dossier_temporaire is None:
+            self.dossier_temporaire = tempfile.TemporaryDirectory(prefix='glpi_simulation_')
+        os.environ.update({
+            'GLPI_API_URL': f"{self.url}/apirest.php",
+            'GLPI_APP_TOKEN': 'simulation',
+            'GLPI_USER_TOKEN': 'simulation',
+            'PERPLEXITY_API_KEY': 'pplx-simulation',
+            'PERPLEXITY_API_URL': f"{self.url}/chat/completions",
+            'PERPLEXITY_FICHIER_CONSOMMATION': os.path.join(self.dossier_temporaire.name,
+                                                            'consommation_perplexity.jsonl'),
+            'JOURNAL_TICKETS': os.path.join(self.dossier_temporaire.name, 'journal_tickets.db'),
+        })
+        self._oublier_singletons()
+
+
+class BancEssai:
+    """Banc de performance hors ligne : mesure les opérations du script contre ServeurSimulation"""
+
+    DESCRIPTIONS = [
+        "L'imprimante ne répond plus depuis ce matin, le voyant rouge clignote.",
+        "Bourrage papier récurrent sur le bac 2 du copieur du 1er étage.",
+        "Impossible de scanner vers la messagerie depuis la mise à jour.",
+    ]
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.mesures = MetriquesPerformance()
+
+    def _mesurer(self, operation: str, fonction, iterations: int = 1):
+        """Exécute et chronomètre une opération plusieurs fois"""
+        for i in range(iterations):
+            debut = time.perf_counter()
+            succes = False
+            try:
+                resultat = fonction(i)
+                succes = resultat is not None and resultat is not False
+            except Exception as e:
+                logger.debug("Échec de %s: %s", operation, e)
+            finally:
+                self.mesures.enregistrer(operation, time.perf_counter() - debut, succes)
+
+    def executer(self) -> Dict[str, Any]:
+        """Lance le serveur simulé et mesure chaque opération puis la chaîne complète"""
+        args = self.args
+        simulation = ServeurSimulation(args.bench_utilisateurs, args.bench_entites, args.bench_categories,
+                                       args.bench_latence, args.bench_erreurs).demarrer()
+        simulation.configurer_environnement()
+        aleatoire = random.Random(7)
+        iterations = args.bench_iterations
+
+        try:
+            glpi = GLPIManager(GLPIConfig())
+            reformulator = PerplexityReformulator(PerplexityConfig())
+            pipeline = PipelineTicket(glpi, reformulator)
+
+            self._mesurer('authentification', lambda i: glpi.authentification())
+            self._mesurer('charger_entites', lambda i: glpi.charger_entites())
+            self._mesurer('charger_categories', lambda i: glpi.charger_categories())
+            self._mesurer('charger_utilisateurs', lambda i: glpi.charger_utilisateurs(forcer=True))
+
+            utilisateurs = simulation.donnees['User']
+            termes = [aleatoire.choice(utilisateurs)['name'] for _ in range(iterations)]
+            self._mesurer('rechercher_utilisateurs', lambda i: glpi.rechercher_utilisateurs(termes[i]), iterations)
+            self._mesurer('trouver_entite_utilisateur',
+                          lambda i: glpi.trouver_entite_utilisateur(aleatoire.choice(utilisateurs)['id'], termes[i]),
+                          iterations)
+            self._mesurer('index_entites_recherche',
+                          lambda i: glpi.index_entites.rechercher(termes[i][1:4]), iterations)
+            self._mesurer('reformuler_texte',
+                          lambda i: reformulator.reformuler_texte(self.DESCRIPTIONS[i % 3], 'description'), iterations)
+            self._mesurer('creer_ticket', lambda i: glpi.creer_ticket({'name': 'Bench', 'content': 'Bench',
+                                                                       'entities_id': 0, 'type': 1}), iterations)
+
+            def ticket_complet(i: int):
+                return pipeline.traiter({
+                    'titre': f"Bench {i}", 'nom_appelant': 'Bench', 'telephone': '01 23 45 67 89',
+                    'description': self.DESCRIPTIONS[i % 3], 'demandeur': termes[i],
+                    'solution': 'Redémarrage du copieur effectué', 'cloturer': True,
+                })['ticket_id']
+
+            debut = time.perf_counter()
+            self._mesurer('pipeline_complet', ticket_complet, iterations)
+            duree_pipeline = time.perf_counter() - debut
+
+            pipeline.fermer()
+            glpi.fermer_session()
+        finally:
+            simulation.arreter()
+
+        operations = {op: {cle: (round(v * 1000, 3) if cle not in ('nombre', 'erreurs') else v)
+                           for cle, v in stats.items()}
+                      for op, stats in self.mesures.resume().items()}
+        return {
+            'genere_le': datetime.now().isoformat(timespec='seconds'),
+            'parametres': {
+                'utilisateurs': args.bench_utilisateurs, 'entites': args.bench_entites,
+                'categories': args.bench_categories, 'latence_ms': args.bench_latence,
+                'taux_erreur': args.bench_erreurs, 'iterations': iterations,
+            },
+            'unite': 'ms',
+            'operations': operations,
+            'debit_pipeline_tickets_s': round(iterations / duree_pipeline, 2) if duree_pipeline else None,
+            'octets_recus': simulation.octets_envoyes,
+        }
+
+    def _lancer(self, arguments: List[str], repertoire: str, attendre: Optional[bytes] = None) -> bool:
+        """
+        Lance le script dans un nouvel interpréteur. Sans motif attendu, mesure jusqu'à la fin
+        du processus ; sinon jusqu'à l'apparition du motif sur la sortie, puis l'interrompt.
+        """
+        env = dict(os.environ, PYTHONUNBUFFERED='1', PYTHONDONTWRITEBYTECODE='1')
+        processus = subprocess.Popen([sys.executable] + arguments, cwd=repertoire, env=env,
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if attendre is None:
+            return processus.wait(timeout=60) == 0
+        minuterie = threading.Timer(60, processus.kill)
+        minuterie.start()
+        try:
+            sortie = b''
+            while attendre not in sortie:
+                morceau = os.read(processus.stdout.fileno(), 4096)
+                if not morceau:
+                    return False
+                sortie += morceau
+            return True
+        finally:
+            minuterie.cancel()
+            processus.kill()
+            processus.wait()
+            processus.stdin.close()
+            processus.stdout.close()
+
+    def executer_demarrage(self) -> Dict[str, Any]:
+        """
+        Mesure le démarrage à froid, chaque itération dans un nouvel interpréteur :
+        interpréteur seul (référence), import du script, --help et première question
+        du mode interactif (contre le serveur simulé, dans un dossier temporaire).
+        """
+        args = self.args
+        script = os.path.abspath(__file__)
+        simulation = ServeurSimulation(args.bench_utilisateurs, args.bench_entites, args.bench_categories,
+                                       args.bench_latence, args.bench_erreurs).demarrer()
+        simulation.configurer_environnement()
+        import_script = ("import importlib.util as u; s = u.spec_from_file_location('glpi', %r); "
+                         "s.loader.exec_module(u.module_from_spec(s))" % script)
+
+        try:
+            with tempfile.TemporaryDirectory() as repertoire:
+                operations = [
+                    ('demarrage_interpreteur', ['-c', 'pass'], None),
+                    ('demarrage_import', ['-c', import_script], None),
+                    ('demarrage_aide', [script, '--help'], None),
+                    ('premiere_saisie', [script], '→'.encode()),
+                ]
+                for operation, arguments, attendre in operations:
+                    self._mesurer(operation, lambda i: self._lancer(arguments, repertoire, attendre),
+                                  args.bench_iterations)
+        finally:
+            simulation.arreter()
+
+        return {
+            'genere_le': datetime.now().isoformat(timespec='seconds'),
+            'parametres': {'iterations': args.bench_iterations, 'python': sys.version.split()[0]},
+            'unite': 'ms',
+            'operations': {op: {cle: (round(v * 1000, 3) if cle not in ('nombre', 'erreurs') else v)
+                                for cle, v in stats.items()}
+                           for op, stats in self.mesures.resume().items()},
+        }
+
+    @staticmethod
+    def comparer(resultats: Dict[str, Any], reference: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+        """Liste les opérations dont le p50 ou le p95 s'est dégradé au-delà de la tolérance"""
+        regressions = []
+        for operation, stats in resultats['operations'].items():
+            ancien = reference.get('operations', {}).get(operation)
+            if not ancien:
+                continue
+            for quantile in ('p50', 'p95'):
+                if ancien[quantile] > 0 and stats[quantile] > ancien[quantile] * (1 + tolerance):
+                    regressions.append(f"{operation} {quantile}: {ancien[quantile]:.2f} → {stats[quantile]:.2f} ms")
+        return regressions
+
+
+def main_bench(args: argparse.Namespace):
+    """Banc de performance hors ligne (--bench)"""
+    print("\n🏁 BANC DE PERFORMANCE HORS LIGNE")
+    print("=" * 70)
+    if args.bench_demarrage:
+        print(f"  🚀 Démarrage à froid: {args.bench_iterations} lancements par mesure")
+        resultats = BancEssai(args).executer_demarrage()
+    else:
+        print(f"  👥 {args.bench_utilisateurs} utilisateurs · 🏢 {args.bench_entites} entités · "
+              f"📂 {args.bench_categories} catégories")
+        print(f"  🐢 Latence simulée: {args.bench_latence} ms · ❌ Taux d'erreur: {args.bench_erreurs:.0%}")
+        resultats = BancEssai(args).executer()
+
+    print(f"\n  {'Opération':<28}{'nb':>6}{'err':>5}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for operation, stats in resultats['operations'].items():
+        print(f"  {operation:<28}{stats['nombre']:>6}{stats['erreurs']:>5}"
+              f"{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}")
+    if not args.bench_demarrage:
+        print(f"\n  🎫 Débit de la chaîne complète: {resultats['debit_pipeline_tickets_s']} tickets/s")
+        print(f"  📦 Volume reçu du serveur: {resultats['octets_recus'] / 1024:.0f} Ko")
+
+    if args.bench_sortie:
+        with open(args.bench_sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=2)
+        print(f"  💾 Résultats sauvegardés dans {args.bench_sortie}")
+
+    if args.bench_reference:
+        with open(args.bench_reference, 'r', encoding='utf-8') as f:
+            regressions = BancEssai.comparer(resultats, json.load(f))
+        if regressions:
+            print("\n  ❌ Régressions détectées:")
+            for regression in regressions:
+                print(f"     - {regression}")
+            sys.exit(1)
+        print("\n  ✅ Aucune régression par rapport à la référence")
+
+
+class GenerateurCharge:
+    """Simule plusieurs opérateurs créant des tickets en parallèle (chacun avec sa session GLPI)"""
+
+    MIX_PAR_DEFAUT = {'recherche': 1.0, 'reformulation': 1.0, 'solution': 0.5, 'cloture': 0.5}
+
+    def __init__(self, operateurs: int, tickets_par_operateur: int, mix: Dict[str, float],
+                 reflexion_ms: float = 0.0):
+        self.operateurs = operateurs
+        self.tickets_par_operateur = tickets_par_operateur
+        self.mix = dict(self.MIX_PAR_DEFAUT, **mix)
+        self.reflexion = reflexion_ms / 1000
+        self.tickets_crees = 0
+        self.tickets_en_echec = 0
+        self.verrou = threading.Lock()
+
+    @staticmethod
+    def lire_mix(texte: str) -> Dict[str, float]:
+        """Lit un mix 'recherche=1,reformulation=0.8,solution=0.5,cloture=0.3'"""
+        mix = {}
+        for element in filter(None, (e.strip() for e in (texte or '').split(','))):
+            cle, _, valeur = element.partition('=')
+            if cle not in GenerateurCharge.MIX_PAR_DEFAUT:
+                raise ValueError(f"Étape inconnue dans le mix: {cle}")
+            mix[cle] = float(valeur)
+        return mix
+
+    def _operateur(self, numero: int, reference: GLPIManager):
+        """Boucle d'un opérateur : une session, N tickets selon le mix"""
+        aleatoire = random.Random(numero)
+        glpi = GLPIManager(reference.config)
+        reformulator = PerplexityReformulator(PerplexityConfig())
+        pipeline = PipelineTicket(glpi, reformulator)
+
+        try:
+            if not glpi.authentification():
+                with self.verrou:
+                    self.tickets_en_echec += self.tickets_par_operateur
+                return
+            glpi.partager_annuaires(reference)
+            utilisateurs = reference.annuaire_utilisateurs or [FicheUtilisateur(0, 'inconnu', entities_id=0)]
+
+            for i in range(self.tickets_par_operateur):
+                utilisateur = aleatoire.choice(utilisateurs)
+                informations = {
+                    'titre': f"Charge opérateur {numero} ticket {i}",
+                    'nom_appelant': f"Appelant {numero}",
+                    'telephone': f"01 {aleatoire.randrange(10, 99)} 45 67 89",
+                    'description': aleatoire.choice(BancEssai.DESCRIPTIONS),
+                    'demandeur': utilisateur.name or 'inconnu',
+                    'reformuler': aleatoire.random() < self.mix['reformulation'],
+                    'operateur': f"operateur-{numero}",
+                }
+                if aleatoire.random() >= self.mix['recherche'] and utilisateur.id:
+                    # Demandeur déjà connu de l'opérateur : pas de recherche
+                    informations['user_id'] = utilisateur.id
+                    informations['entite_id'] = utilisateur.entities_id or 1
+                if aleatoire.random() < self.mix['solution']:
+                    informations['solution'] = "Redémarrage du copieur effectué, impression de test OK"
+                    informations['cloturer'] = aleatoire.random() < self.mix['cloture']
+
+                try:
+                    succes = bool(pipeline.traiter(informations)['ticket_id'])
+                except Exception as e:
+                    logger.warning("⚠️  Opérateur %s: %s", numero, e)
+                    succes = False
+
+                with self.verrou:
+                    if succes:
+                        self.tickets_crees += 1
+                    else:
+                        self.tickets_en_echec += 1
+
+                if self.reflexion:
+                    time.sleep(aleatoire.expovariate(1 / self.reflexion))
+        finally:
+            pipeline.fermer()
+            glpi.fermer_session()
+
+    def executer(self) -> Dict[str, Any]:
+        """Charge les annuaires une fois puis lance les opérateurs en parallèle"""
+        reference = GLPIManager(GLPIConfig())
+        if not reference.authentification():
+            raise RuntimeError("Échec de l'authentification GLPI")
+        try:
+            reference.charger_entites()
+            reference.charger_categories()
+            reference.charger_utilisateurs()
+        finally:
+            reference.fermer_session()
+
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.operateurs) as executor:
+            for future in [executor.submit(self._operateur, n, reference) for n in range(1, self.operateurs + 1)]:
+                future.result()
+        duree = time.perf_counter() - debut
+
+        etapes = {etape: {cle: (round(v * 1000, 3) if cle not in ('nombre', 'erreurs') else v)
+                          for cle, v in stats.items()}
+                  for etape, stats in metriques.resume().items()}
+        return {
+            'genere_le': datetime.now().isoformat(timespec='seconds'),
+            'parametres': {'operateurs': self.operateurs, 'tickets_par_operateur': self.tickets_par_operateur,
+                           'mix': self.mix, 'reflexion_ms': self.reflexion * 1000},
+            'duree_s': round(duree, 2),
+            'tickets_crees': self.tickets_crees,
+            'tickets_en_echec': self.tickets_en_echec,
+            'debit_tickets_s': round(self.tickets_crees / duree, 2) if duree else None,
+            'unite': 'ms',
+            'etapes': etapes,
+        }
+
+
+def main_charge(args: argparse.Namespace):
+    """Test de charge : N opérateurs simultanés (--charge)"""
+    mix = GenerateurCharge.lire_mix(args.mix)
+    simulation = None
+    if args.simulation:
+        simulation = ServeurSimulation(args.bench_utilisateurs, args.bench_entites, args.bench_categories,
+                                       args.bench_latence, args.bench_erreurs).demarrer()
+        simulation.configurer_environnement()
+
+    generateur = GenerateurCharge(args.operateurs, args.tickets, mix, args.reflexion_ms)
+
+    print("\n📈 TEST DE CHARGE")
+    print("=" * 70)
+    print(f"  👥 {args.operateurs} opérateur(s) × {args.tickets} ticket(s) · mix: "
+          + ", ".join(f"{k}={v:g}" for k, v in generateur.mix.items()))
+    print(f"  🎯 Cible: {'serveur simulé' if simulation else os.getenv('GLPI_API_URL')}")
+
+    try:
+        resultats = generateur.executer()
+    finally:
+        if simulation:
+            simulation.arreter()
+
+    print(f"\n  ✅ {resultats['tickets_crees']} ticket(s) créé(s), ❌ {resultats['tickets_en_echec']} échec(s) "
+          f"en {resultats['duree_s']} s → {resultats['debit_tickets_s']} tickets/s")
+    print(f"\n  {'Étape':<28}{'nb':>6}{'err':>5}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for etape, stats in sorted(resultats['etapes'].items(), key=lambda e: -e[1]['somme']):
+        print(f"  {etape:<28}{stats['nombre']:>6}{stats['erreurs']:>5}"
+              f"{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}")
+
+    if args.charge_sortie:
+        with open(args.charge_sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=2)
+        print(f"\n  💾 Résultats sauvegardés dans {args.charge_sortie}")
+
+
+def main_evaluation(args: argparse.Namespace):
+    """Évaluation des instructions de reformulation sur un corpus (--evaluer-instructions)"""
+    manager = InstructionsManager()
+    variantes = {'actuelles': dict(manager.instructions)}
+    if args.candidat:
+        variantes['candidat'] = EvaluationInstructions.lire_candidat(args.candidat, manager.instructions)
+    exemples = EvaluationInstructions.lire_corpus(args.evaluer_instructions)
+    if not exemples:
+        print("❌ Aucun texte à évaluer dans le corpus")
+        sys.exit(1)
+
+    simulation = None
+    if args.simulation:
+        simulation = ServeurSimulation(args.bench_utilisateurs, args.bench_entites, args.bench_categories,
+                                       args.bench_latence, args.bench_erreurs).demarrer()
+        simulation.configurer_environnement()
+    elif not os.getenv('PERPLEXITY_API_KEY'):
+        print("❌ Clé API Perplexity non configurée. Utilisez --config d'abord (ou --simulation).")
+        sys.exit(1)
+
+    print("\n🧪 ÉVALUATION DES INSTRUCTIONS DE REFORMULATION")
+    print("=" * 70)
+    print(f"  📚 {len(exemples)} texte(s) · 🎯 {', '.join(variantes)} · ⚙️  {args.evaluer_paralleles} en parallèle")
+
+    try:
+        resultats = EvaluationInstructions(exemples, variantes, args.evaluer_paralleles).executer()
+    finally:
+        if simulation:
+            simulation.arreter()
+
+    print(f"\n  {'Variante':<22}{'nb':>5}{'inch.':>6}{'p50':>9}{'p95':>9}{'lignes':>10}"
+          f"{'hors lim.':>11}{'nombres+':>10}{'noms+':>7}")
+    for variante, rapport in resultats['variantes'].items():
+        for type_reformulation, stats in rapport['types'].items():
+            lignes = f"{stats['lignes_moyenne']}" + (f"/{stats['lignes_max']}" if stats['lignes_max'] else '')
+            print(f"  {variante + ':' + type_reformulation:<22}{stats['textes']:>5}{stats['inchanges']:>6}"
+                  f"{stats['latence_ms']['p50']:>9.0f}{stats['latence_ms']['p95']:>9.0f}{lignes:>10}"
+                  f"{stats['hors_limite']:>11}{stats['nombres_ajoutes']:>10}{stats['noms_ajoutes']:>7}")
+    print()
+    for variante, rapport in resultats['variantes'].items():
+        consommation = rapport['consommation']
+        print(f"  💰 {variante}: {consommation['appels']} appel(s), {consommation['jetons_entree']} + "
+              f"{consommation['jetons_sortie']} jetons, {consommation['cout']:.4f} $")
+    print(f"  ⏱️  Durée totale: {resultats['duree_s']} s")
+
+    for variante, rapport in resultats['variantes'].items():
+        for type_reformulation, stats in rapport['types'].items():
+            for exemple in stats['exemples_infideles'][:2]:
+                ajouts = exemple['ajouts']['nombres'] + exemple['ajouts']['noms']
+                print(f"\n  ⚠️  {variante}:{type_reformulation} ajoute {', '.join(ajouts)}")
+                print(f"     📄 {exemple['source'][:100]}")
+                print(f"     🤖 {exemple['reformulation'][:100]}")
+
+    if args.evaluer_sortie:
+        with open(args.evaluer_sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=2)
+        print(f"\n  💾 Rapport sauvegardé dans {args.evaluer_sortie}")
+
+    # Les instructions candidates ne sont enregistrées qu'une fois le rapport lu
+    if args.candidat and sys.stdin.isatty():
+        if input("\n→ Adopter les instructions candidates? (o/N): ").strip().lower() in ['o', 'oui', 'y', 'yes']:
+            manager.instructions = variantes['candidat']
+            manager.sauvegarder_instructions()
+            print(f"✅ Instructions candidates enregistrées dans {manager.FICHIER_INSTRUCTIONS}")
+
+
+def main_diagnostic(args: argparse.Namespace):
+    """Diagnostic de connectivité et de latence (--doctor)"""
+    print("\n🩺 DIAGNOSTIC DES CONNEXIONS")
+    print("=" * 70)
+    print(f"  🔁 {args.doctor_echantillons} échantillon(s) par sonde, sondes en parallèle")
+
+    resultats = DiagnosticConnexions(args.doctor_echantillons, args.doctor_delai).executer()
+    DiagnosticConnexions.afficher(resultats)
+
+    if args.doctor_sortie:
+        with open(args.doctor_sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=2)
+        print(f"\n  💾 Rapport sauvegardé dans {args.doctor_sortie}")
+
+    if any(DiagnosticConnexions.en_echec(r) for r in resultats['sondes'].values()):
+        sys.exit(1)
+
+
+def afficher_aide():
+    """Affiche l'aide du script"""
+    print("""
+🎫 SCRIPT D'AUTOMATISATION DE TICKETS GLPI
+==========================================
+
+UTILISATION:
+  python glpi_ticket_automation.py [OPTIONS]
+
+OPTIONS:
+  --config         Configuration interactive des variables d'environnement
+  --instructions   Configuration des instructions de reformulation IA
+  --evaluer-instructions C  Évalue les instructions de reformulation sur le corpus JSONL C
+                   (--candidat F : instructions comparées, --evaluer-paralleles N,
+                    --evaluer-sortie F, --simulation : Perplexity simulé)
+  --doctor         Diagnostic GLPI/Perplexity : DNS, TCP, TLS, premier octet, session, annuaires
+                   (--doctor-echantillons N, --doctor-delai S, --doctor-sortie F)
+  --lot FICHIER    Crée les tickets d'un fichier JSONL sans interaction (--lot-paralleles N)
+  --mails BOITE    Crée un ticket par nouvel email d'une boîte mbox ou Maildir
+                   (--mails-etat F : Message-ID déjà traités, --mails-paralleles N)
+  --processus [N]  Gros imports --lot/--mails : analyse et contrôles dans N processus
+                   (un par cœur sans N, --taille-paquet N enregistrements par envoi)
+  --export F       Exporte les tickets vers F.jsonl, F.csv ou F.parquet (reprise automatique)
+                   (--export-depuis/--export-jusqu-a AAAA-MM-JJ, --export-entites 12,15,
+                    --export-paralleles N, --export-taille-page N, --simulation --bench-tickets N)
+  --journal [R]    Recherche les tickets déjà créés dans le journal local (téléphone, S/N ou texte)
+                   (--journal-depuis AAAA-MM-JJ|aujourdhui, --journal-limite N, --journal-json)
+  --watch          Suit les tickets créés par le script et émet statuts, suivis et solutions en JSONL
+                   (--watch-techniciens 12,15, --watch-intervalle S, --watch-etat F, --watch-hook CMD)
+  --serveur        Lance le service local HTTP/JSON (caches et session GLPI gardés chauds)
+  --hote, --port   Adresse d'écoute du service (défaut: 127.0.0.1:8787)
+  --profile        Affiche les durées par étape (p50/p95/p99) en fin d'exécution
+  --metriques F    Exporte les métriques en fin d'exécution (F.prom Prometheus, sinon JSON)
+  --bench          Banc de performance hors ligne contre des serveurs GLPI/Perplexity simulés
+                   (--bench-utilisateurs, --bench-entites, --bench-categories, --bench-latence MS,
+                    --bench-erreurs TAUX, --bench-iterations, --bench-sortie F, --bench-reference F)
+  --bench-demarrage  Démarrage à froid : import, --help et première question du mode interactif
+                   (mêmes options --bench-iterations, --bench-sortie, --bench-reference)
+  --charge         Test de charge : --operateurs N, --tickets N (par opérateur), --mix,
+                   --reflexion-ms, --charge-sortie F, --simulation (serveurs simulés du banc)
+  --enregistrer C  Enregistre les échanges HTTP dans la cassette C (.jsonl.gz, jetons masqués)
+  --rejouer C      Rejoue la cassette C hors ligne (--echelle-temps 0.5 : deux fois plus vite)
+  --instance P     Utilise uniquement le profil GLPI P (voir GLPI_PROFILS dans .env)
+  --help, -h       Affiche cette aide
+
+EXEMPLES:
+  python glpi_ticket_automation.py --config
+    └─ Configure les tokens GLPI et la clé Perplexity
+
+  python glpi_ticket_automation.py --instructions  
+    └─ Modifie les instructions de reformulation
+
+  python glpi_ticket_automation.py
+    └─ Lance le script normal de création de tickets
+
+  python glpi_ticket_automation.py --lot tickets.jsonl
+    └─ Crée un ticket par ligne et affiche un résultat JSON par ligne
+
+  python glpi_ticket_automation.py --serveur --port 8787
+    └─ curl -X POST localhost:8787/tickets -d @ticket.json
+
+PRÉREQUIS:
+  - Fichier .env configuré (utilisez --config)
+  - Instructions de reformulation (utilisez --instructions si besoin)
+""")
+
+
+def precharger_glpi(glpi: GLPIManager) -> bool:
+    """Authentification puis chargement des entités et catégories (thread de préchargement)"""
+    if not glpi.authentification():
+        return False
+    glpi.charger_entites()
+    glpi.charger_categories()
+    return True
+
+
+def main_creation_tickets():
+    """Fonction principale de création de tickets"""
+    try:
+        # Configuration
+        glpi_config = GLPIConfig()
+        perplexity_config = PerplexityConfig()
+
+        # Initialisation des managers
+        glpi = GLPIManager(glpi_config)
+        reformulator = PerplexityReformulator(perplexity_config)
+        repartiteur = RepartiteurTechniciens(glpi)
+        reformulator.masqueur.associer_annuaires(glpi)
+        journal = obtenir_journal()
+        appelants = glpi.obtenir_appelants()
+
+        # Authentification et chargement des données GLPI en arrière-plan : la première
+        # question s'affiche aussitôt et la saisie de l'opérateur masque la latence réseau
+        prechargement = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prechargement')
+        glpi_pret = prechargement.submit(precharger_glpi, glpi)
+        prechargement.shutdown(wait=False)
+
+        try:
+            # Collecte des informations
+            informations = TicketCollector.collecter_informations()
+
+            if not glpi_pret.result():
+                logger.error("❌ Échec de l'authentification GLPI")
+                sys.exit(1)
+
+            print("\n" + "=" * 70)
+            print("  📝 RÉSUMÉ DES INFORMATIONS COLLECTÉES")
+            print("=" * 70)
+            print(f"🎯 Titre: {informations['titre']}")
+            print(f"👤 Appelant: {informations['nom_appelant']}")
+            print(f"🏢 Demandeur recherché: {informations['demandeur']}")
+            print(f"🎫 Type: {informations['type_ticket_nom']}")
+
+            # Recherche de l'utilisateur/demandeur
+            print("\n🔍 RECHERCHE DE L'UTILISATEUR DANS GLPI")
+            print("=" * 50)
+
+            user_id = None
+            entity_id = 1
+            nom_client_reel = informations['demandeur']
+
+            # Appelant déjà connu (téléphone ou numéro de série d'un ticket précédent, fiche GLPI)
+            appelant = appelants.trouver(informations['telephone'], informations.get('numero_serie'))
+            fiche = glpi.fiche_utilisateur(appelant[0]) if appelant and appelant[0] else None
+            if fiche:
+                entite = glpi.toutes_entites.get(appelant[1] or fiche.entities_id)
+                print(f"📇 Appelant reconnu par son {'téléphone' if appelant[2] == 'telephone' else 'numéro de série'}: "
+                      f"{fiche.name} ({fiche.firstname} {fiche.realname})"
+                      + (f" - {entite.completename}" if entite else ""))
+                if input("→ Utiliser ce demandeur? (O/n): ").strip().lower() not in ['n', 'non', 'no']:
+                    user_id = fiche.id
+                    nom_client_reel = (fiche.name or 'Inconnu').upper()
+                    entity_id = appelant[1] or fiche.entities_id or 1
+                    print(f"✅ Nom du client qui sera utilisé: {nom_client_reel}")
+
+            if user_id is None:
+                users_found = glpi.rechercher_utilisateurs(informations['demandeur'])
+
+                if users_found:
+                    if len(users_found) == 1:
+                        user_id = users_found[0].id
+                        user_name = users_found[0].name or 'Inconnu'
+                        nom_client_reel = user_name.upper()
+                        print(f"✅ Utilisateur trouvé: {user_name} (ID: {user_id})")
+                        print(f"✅ Nom du client qui sera utilisé: {nom_client_reel}")
+
+                        entity_id = glpi.trouver_entite_utilisateur(user_id, user_name)
+                        if not entity_id:
+                            entity_id = 1
+                            print("⚠️  Utilisation de l'entité par défaut (ID: 1)")
+
+                    else:
+                        print(f"🔍 Plusieurs utilisateurs trouvés ({len(users_found)}):")
+                        for i, user in enumerate(users_found, 1):
+                            user_info = []
+                            if user.id:
+                                user_info.append(f"ID: {user.id}")
+                            if user.name:
+                                user_info.append(f"Nom: {user.name}")
+                            if user.firstname:
+                                user_info.append(f"Prénom: {user.firstname}")
+                            if user.realname:
+                                user_info.append(f"Nom complet: {user.realname}")
+
+                            print(f"   {i}. " + " - ".join(user_info))
+
+                        while True:
+                            try:
+                                choix = input("\n→ Choisir un utilisateur (numéro) ou Entrée pour défaut: ").strip()
+                                if not choix:
+                                    break
+                                choix_idx = int(choix) - 1
+                                if 0 <= choix_idx < len(users_found):
+                                    user_id = users_found[choix_idx].id
+                                    user_name = users_found[choix_idx].name or 'Inconnu'
+                                    nom_client_reel = user_name.upper()
+                                    print(f"✅ Utilisateur sélectionné: {user_name}")
+                                    print(f"✅ Nom du client qui sera utilisé: {nom_client_reel}")
+
+                                    entity_id = glpi.trouver_entite_utilisateur(user_id, user_name)
+                                    if not entity_id:
+                                        entity_id = 1
+                                        print("⚠️  Utilisation de l'entité par défaut (ID: 1)")
+                                    break
+                            except (ValueError, IndexError):
+                                print("❌ Choix invalide")
+                else:
+                    print(f"⚠️  Utilisateur '{informations['demandeur']}' non trouvé")
+                    print(f"⚠️  Nom du client utilisé par défaut: {nom_client_reel}")
+                    print("⚠️  Utilisation de l'entité par défaut (ID: 1)")
+
+            if entity_id == 1 and appelant and appelant[1] in glpi.toutes_entites:
+                entity_id = appelant[1]
+                print(f"📇 Entité du copieur: {glpi.toutes_entites[entity_id].completename}")
+
+            # Choix manuel de l'entité si la recherche n'a rien donné
+            if entity_id == 1 and len(glpi.index_entites):
+                print("\n🏢 SÉLECTION DE L'ENTITÉ (OPTIONNEL)")
+                print("=" * 50)
+
+                entite = SelecteurHierarchique.choisir(glpi.index_entites, 'entité')
+                if entite:
+                    entity_id = entite[0]
+
+            # Attribution à un technicien
+            print("\n👨‍💻 ATTRIBUTION DU TECHNICIEN")
+            print("=" * 50)
+
+            technicien_propose, charge = repartiteur.choisir_technicien(entity_id)
+            if charge is not None:
+                print(f"💡 Technicien proposé: ID {technicien_propose} ({charge} ticket(s) ouvert(s))")
+            else:
+                print(f"💡 Technicien par défaut: ID {technicien_propose}")
+
+            technicien_id = input(f"→ Entrez l'ID du technicien ou laissez vide pour le défaut ({technicien_propose}): ").strip()
+            if not technicien_id or not technicien_id.isdigit():
+                technicien_id = technicien_propose
+                print(f"✅ Utilisation du technicien proposé: ID {technicien_id}")
+            else:
+                technicien_id = int(technicien_id)
                 print(f"✅ Technicien sélectionné: ID {technicien_id}")
 
+            # Incident résolu pendant l'appel : la solution est saisie dès maintenant pour que les
+            # deux reformulations partent ensemble, puis solution et clôture suivent la création
+            termes_sensibles = (informations['nom_appelant'], informations['demandeur'], nom_client_reel)
+            resolu_en_ligne = input("\n❓ Incident résolu pendant l'appel? (o/N): ").strip().lower() in ['o', 'oui', 'y', 'yes']
+            solution_text = TicketCollector.saisir_texte_multiligne("Saisissez la solution:") if resolu_en_ligne else ''
+            resolu_en_ligne = bool(solution_text.strip())
+            if resolu_en_ligne:
+                reformulations = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reformulation')
+                reformulation_solution = reformulations.submit(reformulator.reformuler_texte, solution_text,
+                                                               'solution', termes_sensibles)
+                reformulations.shutdown(wait=False)
+
+            def choisir_solution(solution_reformulee: str) -> str:
+                print("\n📄 APERÇU DES SOLUTIONS:")
+                print("-" * 30)
+                print("📝 Solution originale:")
+                print(f"   {solution_text}")
+                print("\n🤖 Solution reformulée:")
+                print(f"   {solution_reformulee}")
+
+                validation_sol = input("\n❓ Accepter la reformulation? (o/N): ").strip().lower()
+
+                if validation_sol in ['o', 'oui', 'y', 'yes']:
+                    print("✅ Reformulation acceptée")
+                    return solution_reformulee
+                print("⏹️  Utilisation de la solution originale")
+                return solution_text
+
             # Reformulation de la description
             print("\n🤖 REFORMULATION IA DE LA DESCRIPTION")
             print("=" * 50)
+            if obtenir_disjoncteur('perplexity').ouvert:
+                print("⚡ Perplexity indisponible pour le moment : la description originale sera proposée")
 
             description_reformulee = reformulator.reformuler_texte(
                 informations['description'], 
-                'description'
+                'description',
+                termes_sensibles
             )
 
             print("\n📄 APERÇU DES DESCRIPTIONS:")
@@ -1133,6 +6351,9 @@ def main_creation_tickets():
                 print("⏹️  Utilisation de la description originale")
                 description_finale = informations['description']
 
+            if resolu_en_ligne:
+                solution_finale = choisir_solution(reformulation_solution.result())
+
             # Création du contenu final du ticket avec le nom réel du client
             contenu_final_ticket = TicketCollector.formater_ticket(informations, description_finale, nom_client_reel)
 
@@ -1154,36 +6375,13 @@ def main_creation_tickets():
                 ticket_data["_users_id_requester"] = user_id
 
             # Ajout de catégorie si disponible
-            if glpi.categories:
+            if len(glpi.index_categories):
                 print("\n📂 SÉLECTION DE CATÉGORIE (OPTIONNEL)")
                 print("=" * 50)
-                categories_list = list(glpi.categories.items())
-
-                # Afficher TOUTES les catégories sans limitation
-                for i, (nom, cat_id) in enumerate(categories_list, 1):
-                    print(f"   {i}. {nom}")
-
-                # Validation avec gestion d'erreurs améliorée
-                while True:
-                    try:
-                        choix_cat = input("\n→ Choisir une catégorie (numéro) ou Entrée pour ignorer: ").strip()
-                        if not choix_cat:
-                            print("⏩ Aucune catégorie sélectionnée")
-                            break
 
-                        if choix_cat.isdigit():
-                            cat_index = int(choix_cat) - 1
-                            if 0 <= cat_index < len(categories_list):
-                                cat_nom, cat_id = categories_list[cat_index]
-                                ticket_data["itilcategories_id"] = cat_id
-                                print(f"✅ Catégorie sélectionnée: {cat_nom}")
-                                break
-                            else:
-                                print(f"❌ Numéro invalide. Veuillez choisir entre 1 et {len(categories_list)}")
-                        else:
-                            print("❌ Veuillez entrer un numéro valide ou appuyer sur Entrée pour ignorer")
-                    except (ValueError, IndexError):
-                        print("❌ Erreur de saisie. Veuillez entrer un numéro valide")
+                categorie = SelecteurHierarchique.choisir(glpi.index_categories, 'catégorie')
+                if categorie:
+                    ticket_data["itilcategories_id"] = categorie[0]
 
             # Création du ticket
             print("\n🎫 CRÉATION DU TICKET DANS GLPI")
@@ -1191,59 +6389,98 @@ def main_creation_tickets():
 
             ticket_id = glpi.creer_ticket(ticket_data)
 
+            informations['categorie_id'] = ticket_data.get('itilcategories_id')
+            resultat = {'ticket_id': ticket_id, 'user_id': user_id, 'entity_id': entity_id,
+                        'nom_client': nom_client_reel, 'technicien_id': technicien_id,
+                        'description_finale': description_finale, 'erreurs': []}
+
             if not ticket_id:
                 print("❌ Échec de la création du ticket")
+                if journal:
+                    resultat['erreurs'].append("Échec de la création du ticket")
+                    journal.enregistrer(informations, resultat, glpi)
                 return
 
             print(f"\n🎉 TICKET CRÉÉ AVEC SUCCÈS!")
             print(f"🆔 ID du ticket: {ticket_id}")
-
-            # Demande de résolution
-            print("\n💡 AJOUT D'UNE SOLUTION (OPTIONNEL)")
-            print("=" * 50)
-
-            resolution = input("❓ Voulez-vous ajouter une solution à ce ticket? (o/N): ").strip().lower()
-
-            if resolution in ['o', 'oui', 'y', 'yes']:
-                solution_text = TicketCollector.saisir_texte_multiligne("Saisissez la solution:")
-
-                if solution_text.strip():
-                    print("\n🤖 Reformulation de la solution...")
-                    solution_reformulee = reformulator.reformuler_texte(
-                        solution_text, 
-                        'solution'
-                    )
-
-                    print("\n📄 APERÇU DES SOLUTIONS:")
-                    print("-" * 30)
-                    print("📝 Solution originale:")
-                    print(f"   {solution_text}")
-                    print("\n🤖 Solution reformulée:")
-                    print(f"   {solution_reformulee}")
-
-                    validation_sol = input("\n❓ Accepter la reformulation? (o/N): ").strip().lower()
-
-                    if validation_sol in ['o', 'oui', 'y', 'yes']:
-                        print("✅ Reformulation acceptée")
-                        solution_finale = solution_reformulee
+            repartiteur.enregistrer_affectation(technicien_id)
+            appelants.enregistrer(informations['telephone'], informations.get('numero_serie'), user_id, entity_id)
+
+            # Les pièces jointes partent pendant la saisie de la solution
+            executeur_envois = ThreadPoolExecutor(max_workers=4, thread_name_prefix='envoi')
+            envois = [(chemin, executeur_envois.submit(glpi.joindre_document, ticket_id, chemin))
+                      for chemin in informations.get('pieces_jointes', [])]
+            if envois:
+                print(f"📎 Envoi de {len(envois)} pièce(s) jointe(s) en arrière-plan...")
+
+            def attendre_envois():
+                for chemin, envoi in envois:
+                    if envoi.result():
+                        print(f"✅ Pièce jointe envoyée: {os.path.basename(chemin)}")
                     else:
-                        print("⏹️  Utilisation de la solution originale")
-                        solution_finale = solution_text
+                        print(f"❌ Échec de l'envoi de {os.path.basename(chemin)}")
+                envois.clear()
 
-                    # Ajout de la solution
-                    if glpi.ajouter_solution(ticket_id, solution_finale):
-                        print("✅ Solution ajoutée avec succès")
+            if resolu_en_ligne:
+                print("\n💡 RÉSOLUTION ET CLÔTURE")
+                print("=" * 50)
+                informations['solution'] = solution_text
+                resultat['solution_finale'] = solution_finale
+                rapport = glpi.resoudre_ticket(ticket_id, solution_finale, True, attendre_envois)
+                resultat['erreurs'].extend(rapport.pop('erreurs'))
+                resultat.update(rapport)
+                if rapport.get('cloture'):
+                    print("✅ Solution ajoutée et ticket clôturé")
+                elif rapport['solution_ajoutee']:
+                    print("⚠️  Solution ajoutée mais échec de la clôture : le ticket reste résolu")
+                else:
+                    print(f"❌ Échec de l'ajout de la solution : le ticket {ticket_id} reste ouvert, "
+                          "ajoutez la solution dans GLPI")
+            else:
+                # Demande de résolution
+                print("\n💡 AJOUT D'UNE SOLUTION (OPTIONNEL)")
+                print("=" * 50)
 
-                        # Demande de clôture
-                        cloture = input("\n❓ Voulez-vous clôturer ce ticket? (o/N): ").strip().lower()
+                resolution = input("❓ Voulez-vous ajouter une solution à ce ticket? (o/N): ").strip().lower()
+
+                if resolution in ['o', 'oui', 'y', 'yes']:
+                    solution_text = TicketCollector.saisir_texte_multiligne("Saisissez la solution:")
+
+                    if solution_text.strip():
+                        print("\n🤖 Reformulation de la solution...")
+                        if obtenir_disjoncteur('perplexity').ouvert:
+                            print("⚡ Perplexity indisponible pour le moment : la solution originale sera proposée")
+                        solution_finale = choisir_solution(reformulator.reformuler_texte(
+                            solution_text,
+                            'solution',
+                            termes_sensibles
+                        ))
+                        informations['solution'] = solution_text
+                        resultat['solution_finale'] = solution_finale
+
+                        # Ajout de la solution
+                        if glpi.ajouter_solution(ticket_id, solution_finale):
+                            print("✅ Solution ajoutée avec succès")
+
+                            # Demande de clôture
+                            cloture = input("\n❓ Voulez-vous clôturer ce ticket? (o/N): ").strip().lower()
+
+                            if cloture in ['o', 'oui', 'y', 'yes']:
+                                attendre_envois()
+                                resultat['cloture'] = glpi.mettre_a_jour_statut(ticket_id, 6)
+                                if resultat['cloture']:
+                                    print("✅ Ticket clôturé avec succès")
+                                else:
+                                    print("❌ Échec de la clôture du ticket")
+                                    resultat['erreurs'].append("Échec de la clôture du ticket")
+                        else:
+                            print("❌ Échec de l'ajout de la solution")
+                            resultat['erreurs'].append("Échec de l'ajout de la solution")
 
-                        if cloture in ['o', 'oui', 'y', 'yes']:
-                            if glpi.mettre_a_jour_statut(ticket_id, 6):
-                                print("✅ Ticket clôturé avec succès")
-                            else:
-                                print("❌ Échec de la clôture du ticket")
-                    else:
-                        print("❌ Échec de l'ajout de la solution")
+            attendre_envois()
+            executeur_envois.shutdown()
+            if journal:
+                journal.enregistrer(informations, resultat, glpi)
 
             print("\n" + "=" * 70)
             print(f"  🎉 PROCESSUS TERMINÉ AVEC SUCCÈS!")
@@ -1251,13 +6488,15 @@ def main_creation_tickets():
             print("=" * 70)
 
         finally:
+            # Une session ouverte pendant la saisie est fermée elle aussi
+            wait([glpi_pret])
             glpi.fermer_session()
 
     except KeyboardInterrupt:
         print("\n\n⏹️  Script interrompu par l'utilisateur")
         sys.exit(0)
     except Exception as e:
-        logger.error(f"❌ Erreur inattendue: {e}")
+        logger.error("❌ Erreur inattendue: %s", e)
         sys.exit(1)
 
 
@@ -1271,6 +6510,118 @@ def main():
                        help='Configuration interactive des variables d\'environnement')
     parser.add_argument('--instructions', action='store_true',
                        help='Configuration des instructions de reformulation')
+    parser.add_argument('--lot', metavar='FICHIER',
+                       help='Création de tickets en lot depuis un fichier JSONL')
+    parser.add_argument('--mails', metavar='BOITE',
+                       help='Création de tickets depuis une boîte mbox (fichier) ou Maildir (dossier)')
+    parser.add_argument('--mails-etat', metavar='FICHIER', default='mails_traites.txt',
+                       help='Fichier des Message-ID déjà traités (défaut: mails_traites.txt)')
+    parser.add_argument('--mails-paralleles', type=int, default=4,
+                       help='Nombre de messages traités en parallèle (défaut: 4)')
+    parser.add_argument('--lot-paralleles', type=int, default=1,
+                       help='Nombre de lignes du lot traitées en parallèle (défaut: 1, dans l\'ordre)')
+    parser.add_argument('--processus', type=int, nargs='?', const=os.cpu_count() or 1, default=0,
+                       help='Analyse et contrôle des lots et emails dans N processus (sans N: un par cœur)')
+    parser.add_argument('--taille-paquet', type=int, default=64,
+                       help='Enregistrements envoyés ensemble à un processus (défaut: 64)')
+    parser.add_argument('--export', metavar='FICHIER',
+                       help='Exporte les tickets GLPI (FICHIER.jsonl, FICHIER.csv ou dossier FICHIER.parquet)')
+    parser.add_argument('--export-format', choices=EcrivainExport.FORMATS,
+                       help="Format d'export (défaut: d'après l'extension, sinon jsonl)")
+    parser.add_argument('--export-depuis', metavar='AAAA-MM-JJ',
+                       help="Tickets ouverts à partir de cette date")
+    parser.add_argument('--export-jusqu-a', metavar='AAAA-MM-JJ',
+                       help="Tickets ouverts jusqu'à cette date incluse")
+    parser.add_argument('--export-entites', metavar='IDS',
+                       help='Entités exportées, sous-entités comprises (ex: 12,15)')
+    parser.add_argument('--export-paralleles', type=int, default=4,
+                       help='Pages téléchargées en parallèle (défaut: 4)')
+    parser.add_argument('--export-taille-page', type=int, default=500,
+                       help='Tickets par page (défaut: 500)')
+    parser.add_argument('--journal', metavar='RECHERCHE', nargs='?', const='',
+                       help='Recherche dans le journal local : téléphone, numéro de série ou texte')
+    parser.add_argument('--journal-depuis', metavar='AAAA-MM-JJ',
+                       help="Tickets journalisés à partir de cette date ('aujourdhui' accepté)")
+    parser.add_argument('--journal-limite', type=int, default=20,
+                       help='Nombre maximal de résultats (défaut: 20)')
+    parser.add_argument('--journal-json', action='store_true',
+                       help='Un résultat JSON par ligne')
+    parser.add_argument('--watch', action='store_true',
+                       help='Surveille les modifications des tickets suivis (événements JSONL)')
+    parser.add_argument('--watch-techniciens', metavar='IDS',
+                       help='Suit aussi les tickets attribués à ces techniciens (ids séparés par des virgules)')
+    parser.add_argument('--watch-intervalle', type=float, default=30.0,
+                       help='Secondes entre deux cycles de surveillance')
+    parser.add_argument('--watch-etat', metavar='FICHIER', default='surveillance_tickets.json',
+                       help='État de la surveillance (filigrane et derniers statuts vus)')
+    parser.add_argument('--watch-hook', metavar='COMMANDE',
+                       help='Commande appelée pour chaque événement (JSON sur son entrée standard)')
+    parser.add_argument('--watch-cycles', type=int, default=0,
+                       help='Nombre de cycles avant arrêt (0: sans fin)')
+    parser.add_argument('--evaluer-instructions', metavar='CORPUS',
+                       help='Évalue les instructions de reformulation sur un corpus JSONL')
+    parser.add_argument('--candidat', metavar='FICHIER',
+                       help='Instructions candidates comparées aux actuelles (JSON)')
+    parser.add_argument('--evaluer-paralleles', type=int, default=4,
+                       help='Reformulations simultanées (défaut: 4)')
+    parser.add_argument('--evaluer-sortie', metavar='FICHIER',
+                       help="Rapport d'évaluation JSON")
+    parser.add_argument('--doctor', action='store_true',
+                       help='Diagnostic de connectivité et de latence GLPI/Perplexity')
+    parser.add_argument('--doctor-echantillons', type=int, default=5,
+                       help='Connexions mesurées par sonde (défaut: 5)')
+    parser.add_argument('--doctor-delai', type=float, default=10.0,
+                       help='Délai maximal par connexion en secondes (défaut: 10)')
+    parser.add_argument('--doctor-sortie', metavar='FICHIER',
+                       help='Rapport de diagnostic JSON')
+    parser.add_argument('--serveur', action='store_true',
+                       help='Lance le service local HTTP/JSON')
+    parser.add_argument('--hote', default='127.0.0.1',
+                       help="Adresse d'écoute du service")
+    parser.add_argument('--port', type=int, default=8787,
+                       help="Port d'écoute du service")
+    parser.add_argument('--profile', action='store_true',
+                       help='Affiche le profil des durées par étape en fin d\'exécution')
+    parser.add_argument('--metriques', metavar='FICHIER',
+                       help='Exporte les métriques en fin d\'exécution (.prom ou .json)')
+    parser.add_argument('--bench', action='store_true',
+                       help='Banc de performance hors ligne')
+    parser.add_argument('--bench-utilisateurs', type=int, default=10000)
+    parser.add_argument('--bench-entites', type=int, default=2000)
+    parser.add_argument('--bench-categories', type=int, default=200)
+    parser.add_argument('--bench-tickets', type=int, default=0,
+                       help='Tickets existants du serveur simulé')
+    parser.add_argument('--bench-latence', type=float, default=5.0,
+                       help='Latence simulée par requête (ms)')
+    parser.add_argument('--bench-erreurs', type=float, default=0.0,
+                       help="Taux d'erreur simulé (0 à 1)")
+    parser.add_argument('--bench-iterations', type=int, default=50)
+    parser.add_argument('--bench-demarrage', action='store_true',
+                       help='Mesure le démarrage à froid (import, --help, première question)')
+    parser.add_argument('--bench-sortie', metavar='FICHIER',
+                       help='Fichier JSON des résultats')
+    parser.add_argument('--bench-reference', metavar='FICHIER',
+                       help='Résultats de référence : code de sortie 1 en cas de régression')
+    parser.add_argument('--charge', action='store_true',
+                       help='Test de charge simulant plusieurs opérateurs')
+    parser.add_argument('--operateurs', type=int, default=10)
+    parser.add_argument('--tickets', type=int, default=10,
+                       help='Tickets créés par opérateur')
+    parser.add_argument('--mix', default='',
+                       help="Probabilité de chaque étape (ex: recherche=1,reformulation=1,solution=0.5,cloture=0.5)")
+    parser.add_argument('--reflexion-ms', type=float, default=0.0,
+                       help='Temps de réflexion moyen entre deux tickets (ms)')
+    parser.add_argument('--charge-sortie', metavar='FICHIER')
+    parser.add_argument('--simulation', action='store_true',
+                       help='Utilise les serveurs simulés du banc au lieu de la configuration .env')
+    parser.add_argument('--enregistrer', metavar='CASSETTE',
+                       help='Enregistre les échanges HTTP GLPI/Perplexity (jetons masqués)')
+    parser.add_argument('--rejouer', metavar='CASSETTE',
+                       help='Rejoue hors ligne les échanges d\'une cassette')
+    parser.add_argument('--echelle-temps', type=float, default=1.0,
+                       help='Multiplicateur des durées rejouées (0: sans attente)')
+    parser.add_argument('--instance', metavar='PROFIL',
+                       help='Limite le script à une instance GLPI de GLPI_PROFILS')
     parser.add_argument('--help', '-h', action='store_true',
                        help='Affiche cette aide')
 
@@ -1280,6 +6631,30 @@ def main():
         afficher_aide()
         return
 
+    charger_configuration()
+    configurer_journalisation()
+
+    if args.instance:
+        os.environ['GLPI_INSTANCE'] = args.instance
+
+    global cassette_active
+    if args.enregistrer or args.rejouer:
+        cassette_active = Cassette(args.enregistrer or args.rejouer,
+                                   'enregistrement' if args.enregistrer else 'rejeu', args.echelle_temps)
+
+    try:
+        executer_commande(args)
+    finally:
+        if cassette_active:
+            cassette_active.fermer()
+        if args.profile:
+            metriques.afficher_resume()
+        if args.metriques:
+            metriques.exporter(args.metriques)
+
+
+def executer_commande(args: argparse.Namespace):
+    """Lance le mode demandé sur la ligne de commande"""
     if args.config:
         ConfigManager.configurer_environnement()
         return
@@ -1289,6 +6664,46 @@ def main():
         instructions_manager.configurer_instructions()
         return
 
+    if args.lot:
+        main_lot(args)
+        return
+
+    if args.mails:
+        main_mails(args)
+        return
+
+    if args.export:
+        main_export(args)
+        return
+
+    if args.journal is not None:
+        main_journal(args)
+        return
+
+    if args.watch:
+        main_surveillance(args)
+        return
+
+    if args.evaluer_instructions:
+        main_evaluation(args)
+        return
+
+    if args.doctor:
+        main_diagnostic(args)
+        return
+
+    if args.serveur:
+        ServiceTickets(args.hote, args.port).demarrer()
+        return
+
+    if args.bench or args.bench_demarrage:
+        main_bench(args)
+        return
+
+    if args.charge:
+        main_charge(args)
+        return
+
     # Mode normal - création de tickets
     main_creation_tickets()
 
@@ -0,0 +1,74 @@
+"""
+Fixtures communes : le script est chargé comme module et testé contre ServeurSimulation,
+dans un dossier temporaire (journal, consommation et état ne touchent pas le dossier courant)
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+CHEMIN_SCRIPT = Path(__file__).resolve().parent.parent / 'glpi_ticket_automation_v1.8.py'
+VARIABLES_ISOLEES = ('GLPI_PROFILS', 'GLPI_INSTANCE', 'GLPI_TECHNICIENS', 'GLPI_GROUPES_TECHNICIENS',
+                     'GLPI_CLOTURE_AUTOMATIQUE', 'SERVICE_JETON', 'PERPLEXITY_BUDGET_JOUR',
+                     'PERPLEXITY_BUDGET_OPERATEUR', 'HTTPS_PROXY', 'HTTP_PROXY', 'https_proxy', 'http_proxy')
+
+
+def charger_script():
+    spec = importlib.util.spec_from_file_location('glpi_ticket_automation', CHEMIN_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def gta():
+    return sys.modules.get('glpi_ticket_automation') or charger_script()
+
+
+@pytest.fixture
+def isolation(gta, tmp_path, monkeypatch):
+    """Dossier temporaire et singletons du script remis à zéro"""
+    monkeypatch.chdir(tmp_path)
+    for variable in VARIABLES_ISOLEES:
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('JOURNAL_TICKETS', str(tmp_path / 'journal_tickets.db'))
+    monkeypatch.setenv('PERPLEXITY_FICHIER_CONSOMMATION', str(tmp_path / 'consommation_perplexity.jsonl'))
+    monkeypatch.setattr(gta, 'journal_tickets', None)
+    monkeypatch.setattr(gta, 'comptabilite_jetons', None)
+    monkeypatch.setattr(gta, 'disjoncteurs', {})
+    monkeypatch.setattr(gta, 'metriques', gta.MetriquesPerformance())
+    yield tmp_path
+    if gta.journal_tickets:
+        gta.journal_tickets.fermer()
+
+
+@pytest.fixture
+def simulation(gta, isolation, monkeypatch):
+    """Serveur simulé GLPI et Perplexity, configuration du script pointée dessus"""
+    serveur = gta.ServeurSimulation(utilisateurs=200, entites=30, categories=10).demarrer()
+    monkeypatch.setenv('GLPI_API_URL', f"{serveur.url}/apirest.php")
+    monkeypatch.setenv('GLPI_APP_TOKEN', 'simulation')
+    monkeypatch.setenv('GLPI_USER_TOKEN', 'simulation')
+    monkeypatch.setenv('PERPLEXITY_API_KEY', 'pplx-simulation')
+    monkeypatch.setenv('PERPLEXITY_API_URL', f"{serveur.url}/chat/completions")
+    yield serveur
+    serveur.arreter()
+
+
+@pytest.fixture
+def glpi(gta, simulation):
+    """Gestionnaire GLPI authentifié sur le serveur simulé"""
+    gestionnaire = gta.GLPIManager(gta.GLPIConfig())
+    assert gestionnaire.authentification()
+    yield gestionnaire
+    gestionnaire.fermer_session()
+
+
+@pytest.fixture
+def pipeline(gta, glpi):
+    pipeline = gta.PipelineTicket(glpi, gta.PerplexityReformulator(gta.PerplexityConfig()))
+    yield pipeline
+    pipeline.fermer()
@@ -0,0 +1,42 @@
+"""Annuaires GLPI réduits en fiches : valeurs nulles renvoyées par GLPI"""
+
+
+def test_entite_sans_nom(gta, glpi, simulation):
+    simulation.par_id['Entity'][3]['name'] = None
+    assert glpi.charger_entites()
+    fiche = glpi.toutes_entites[3]
+    assert fiche.name == '' and fiche.completename
+
+    # La recherche d'entité par nom parcourt toutes les fiches sans échouer
+    utilisateur = simulation.donnees['User'][2]
+    assert glpi.trouver_entite_utilisateur(utilisateur['id'], utilisateur['name'])
+
+
+def test_fiche_utilisateur_champs_nuls(gta):
+    fiche = gta.FicheUtilisateur.depuis_glpi({'id': '4', 'name': None, 'realname': None, 'firstname': 'Ana'})
+    assert fiche.id == 4 and fiche.name == '' and fiche.cle_recherche == '\n\nana'
+
+
+def test_annuaire_limite_aux_demandeurs(gta, glpi, simulation, monkeypatch):
+    with simulation.verrou:
+        simulation.ajouter('User', dict(simulation.donnees['User'][0], id=9001, name='technicien-seul',
+                                        realname='Seul', firstname='Technicien', phone='01 98 76 54 32',
+                                        is_requester=0))
+    assert glpi.projection
+    identifiants = {u.id for u in glpi.charger_utilisateurs(forcer=True)}
+    assert 9001 not in identifiants and len(identifiants) == len(simulation.donnees['User']) - 1
+    assert not glpi.rechercher_utilisateurs('technicien-seul')
+
+    index = glpi.obtenir_appelants()
+    index.charger_glpi()
+    assert index.trouver('01 98 76 54 32') is None
+
+    # Liste complète (GLPI_PROJECTION=0) : même filtre, en paramètre de la liste
+    glpi.projection = False
+    assert {u.id for u in glpi.charger_utilisateurs(forcer=True)} == identifiants
+
+
+def test_fiche_entite_identifiants_entiers(gta):
+    fiche = gta.FicheEntite.depuis_glpi({'id': '7', 'name': 'Nord', 'completename': 'Racine > Nord', 'entities_id': '1'})
+    assert (fiche.id, fiche.entities_id) == (7, 1)
+    assert gta.FicheEntite.depuis_glpi({'id': 3, 'name': 'Racine'}).entities_id is None
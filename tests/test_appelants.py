@@ -0,0 +1,23 @@
+"""IndexAppelants : un index par instance GLPI, partagé par les pipelines"""
+
+
+def test_index_partage_par_les_pipelines(gta, glpi):
+    reformulator = gta.PerplexityReformulator(gta.PerplexityConfig())
+    pipelines = [gta.PipelineTicket(glpi, reformulator) for _ in range(3)]
+    try:
+        assert all(p.appelants is glpi.obtenir_appelants() for p in pipelines)
+        operateur = gta.GLPIManager(glpi.config)
+        operateur.partager_annuaires(glpi)
+        assert operateur.appelants is glpi.appelants
+    finally:
+        for pipeline in pipelines:
+            pipeline.fermer()
+
+
+def test_chargement_glpi_par_recherche_publique(gta, glpi, simulation):
+    utilisateur = simulation.donnees['User'][0]
+    utilisateur['phone'] = '01 23 45 67 89'
+    index = glpi.obtenir_appelants()
+    index.charger_glpi()
+    user_id, _, source = index.trouver('+33 1 23 45 67 89')
+    assert (user_id, source) == (utilisateur['id'], 'telephone')
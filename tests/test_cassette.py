@@ -0,0 +1,39 @@
+"""Cassette : les réponses lues en flux le restent pendant l'enregistrement et au rejeu"""
+
+import gzip
+import json
+
+
+def charger_annuaire(gta, glpi, monkeypatch):
+    """Identifiants de l'annuaire, et pour chaque page si son corps était déjà chargé à la lecture"""
+    elements_flux = gta.GLPIManager._elements_json_flux
+    deja_charges = []
+
+    def elements_observes(response, *args, **kwargs):
+        deja_charges.append(response._content_consumed)
+        return elements_flux(response, *args, **kwargs)
+
+    monkeypatch.setattr(gta.GLPIManager, '_elements_json_flux', staticmethod(elements_observes))
+    assert glpi.authentification()
+    try:
+        return [u.id for u in glpi.charger_utilisateurs(forcer=True)], deja_charges
+    finally:
+        glpi.fermer_session()
+
+
+def test_enregistrement_et_rejeu_en_flux(gta, simulation, isolation, monkeypatch):
+    chemin = str(isolation / 'trafic.jsonl.gz')
+    monkeypatch.setattr(gta, 'cassette_active', gta.Cassette(chemin, 'enregistrement'))
+    identifiants, deja_charges = charger_annuaire(gta, gta.GLPIManager(gta.GLPIConfig()), monkeypatch)
+    gta.cassette_active.fermer()
+
+    assert identifiants and deja_charges and not any(deja_charges)
+    with gzip.open(chemin, 'rt', encoding='utf-8') as f:
+        echanges = [json.loads(ligne) for ligne in f]
+    recherches = [e for e in echanges if e['url'].startswith('/apirest.php/search/User')]
+    assert [ligne['2'] for e in recherches for ligne in json.loads(e['corps'])['data']] == identifiants
+
+    simulation.arreter()  # Le rejeu se passe du serveur
+    monkeypatch.setattr(gta, 'cassette_active', gta.Cassette(chemin, 'rejeu', echelle_temps=0))
+    rejoues, deja_charges = charger_annuaire(gta, gta.GLPIManager(gta.GLPIConfig()), monkeypatch)
+    assert rejoues == identifiants and not any(deja_charges)
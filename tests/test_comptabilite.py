@@ -0,0 +1,72 @@
+"""ComptabiliteJetons : fichier en ajout seul partagé entre processus, budgets et simulation"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+
+def comptabilite(gta, chemin, **budgets):
+    return gta.ComptabiliteJetons(str(chemin) if chemin else None, prix_entree=3, prix_sortie=15, **budgets)
+
+
+def test_une_ligne_ajoutee_par_appel(gta, isolation):
+    chemin = isolation / 'consommation.jsonl'
+    compta = comptabilite(gta, chemin)
+    compta.enregistrer('alice', 1000, 500)
+    compta.enregistrer('bob', 2000, 0)
+    lignes = [json.loads(ligne) for ligne in chemin.read_text().splitlines()]
+    assert [ligne['operateur'] for ligne in lignes] == ['alice', 'bob']
+    jour = compta.resume_jour()
+    assert jour['appels'] == 2 and jour['jetons_entree'] == 3000
+    assert jour['operateurs']['alice']['cout'] == 0.0105
+
+
+def test_budget_partage_entre_processus(gta, isolation):
+    chemin = isolation / 'consommation.jsonl'
+    poste_1 = comptabilite(gta, chemin, budget_jour=0.01)
+    poste_2 = comptabilite(gta, chemin, budget_jour=0.01)
+    poste_1.enregistrer('alice', 0, 1000)
+    assert poste_2.depassement('bob') is not None
+    poste_2.enregistrer('bob', 10, 0)
+    assert poste_1.resume_jour()['appels'] == 2
+
+
+def test_ligne_incomplete_et_anciennes_lignes(gta, isolation):
+    chemin = isolation / 'consommation.jsonl'
+    ancien = (datetime.now() - timedelta(days=200)).strftime('%Y-%m-%d')
+    chemin.write_text(json.dumps({'date': ancien, 'operateur': 'x', 'jetons_entree': 1,
+                                  'jetons_sortie': 1, 'cout': 1}) + '\n')
+    compta = comptabilite(gta, chemin)
+    assert chemin.read_text() == ''
+    with open(chemin, 'a') as f:
+        f.write('{"date": "')  # Écriture en cours dans un autre processus
+    assert compta.resume_jour()['appels'] == 0
+
+
+def test_memoire_sans_fichier(gta, isolation):
+    compta = comptabilite(gta, None)
+    compta.enregistrer('alice', 10, 10)
+    assert compta.resume_jour()['appels'] == 1
+    assert os.listdir(isolation) == []
+
+
+def test_simulation_hors_fichiers_reels(gta, isolation, monkeypatch):
+    for variable in ('GLPI_API_URL', 'GLPI_APP_TOKEN', 'GLPI_USER_TOKEN', 'PERPLEXITY_API_KEY',
+                     'PERPLEXITY_API_URL', 'PERPLEXITY_FICHIER_CONSOMMATION'):
+        monkeypatch.setenv(variable, os.environ.get(variable, ''))
+    monkeypatch.setenv('JOURNAL_TICKETS', os.environ['JOURNAL_TICKETS'])
+    reel = gta.obtenir_comptabilite()
+    journal_reel = gta.obtenir_journal().chemin
+    serveur = gta.ServeurSimulation(utilisateurs=10, entites=5, categories=5).demarrer()
+    try:
+        serveur.configurer_environnement()
+        simulee = gta.obtenir_comptabilite()
+        simulee.enregistrer('banc', 100, 100)
+        assert simulee is not reel
+        assert simulee.chemin.startswith(serveur.dossier_temporaire.name)
+        assert gta.obtenir_journal().chemin.startswith(serveur.dossier_temporaire.name)
+    finally:
+        serveur.arreter()
+    assert not os.path.exists(simulee.chemin)
+    assert reel.resume_jour()['appels'] == 0
+    assert gta.journal_tickets is None and journal_reel == str(isolation / 'journal_tickets.db')
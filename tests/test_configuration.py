@@ -0,0 +1,68 @@
+"""Variables d'environnement numériques : valeur par défaut et avertissement si elles sont invalides"""
+
+import pytest
+
+
+@pytest.mark.parametrize('valeur, attendu, avertissement', [
+    (None, 5, False), ('', 5, False), (' 12 ', 12, False), ('0', 0, False),
+    ('abc', 5, True), ('-3', 5, True), ('2.5', 5, True),
+])
+def test_lire_entier(gta, monkeypatch, caplog, valeur, attendu, avertissement):
+    if valeur is not None:
+        monkeypatch.setenv('GLPI_TEST_ENTIER', valeur)
+    assert gta.lire_entier('GLPI_TEST_ENTIER', 5) == attendu
+    assert ('GLPI_TEST_ENTIER invalide' in caplog.text) == avertissement
+
+
+@pytest.mark.parametrize('valeur, attendu', [(None, 1.5), ('2.5', 2.5), ('2,5', 2.5), ('0', 0.0), ('abc', 1.5),
+                                             ('-1', 1.5), ('inf', 1.5), ('nan', 1.5)])
+def test_lire_decimal(gta, monkeypatch, valeur, attendu):
+    if valeur is not None:
+        monkeypatch.setenv('GLPI_TEST_DECIMAL', valeur)
+    assert gta.lire_decimal('GLPI_TEST_DECIMAL', 1.5) == attendu
+
+
+def test_journalisation_avec_valeurs_invalides(gta, isolation, monkeypatch, caplog):
+    monkeypatch.setenv('GLPI_LOG_ARCHIVES', 'cinq')
+    monkeypatch.setenv('GLPI_LOG_TAILLE_MAX', '10Mo')
+    racine = gta.logging.getLogger()
+    handlers, niveau = list(racine.handlers), racine.level
+    try:
+        gta.configurer_journalisation('INFO')
+    finally:
+        for handler in list(racine.handlers):
+            racine.removeHandler(handler)
+        for handler in handlers:
+            racine.addHandler(handler)
+        racine.setLevel(niveau)
+    assert 'GLPI_LOG_ARCHIVES invalide' in caplog.text and 'GLPI_LOG_TAILLE_MAX invalide' in caplog.text
+
+
+def test_disjoncteur_avec_valeurs_invalides(gta, isolation, monkeypatch):
+    monkeypatch.setattr(gta, 'disjoncteurs', {})
+    monkeypatch.setenv('DISJONCTEUR_SEUIL_ECHECS', 'trois')
+    monkeypatch.setenv('DISJONCTEUR_SEUIL_LENTEUR_GLPI', '10s')
+    monkeypatch.setenv('DISJONCTEUR_DELAI_S', '45.5')
+    disjoncteur = gta.obtenir_disjoncteur('glpi')
+    assert (disjoncteur.seuil_echecs, disjoncteur.seuil_lenteur, disjoncteur.delai_reouverture) == (3, 10, 45.5)
+
+
+def test_perplexity_avec_valeurs_invalides(gta, isolation, monkeypatch):
+    monkeypatch.setenv('PERPLEXITY_API_KEY', 'cle')
+    monkeypatch.setenv('PERPLEXITY_JETONS_ENTREE_MAX', '2k')
+    monkeypatch.setenv('PERPLEXITY_PRIX_ENTREE', '3 $')
+    monkeypatch.setenv('PERPLEXITY_BUDGET_JOUR', '0,50')
+    assert gta.PerplexityConfig().jetons_entree_max == 2000
+    comptabilite = gta.obtenir_comptabilite()
+    assert (comptabilite.prix_entree, comptabilite.budget_jour) == (3, 0.5)
+
+
+def test_glpi_avec_valeurs_invalides(gta, glpi, monkeypatch):
+    monkeypatch.setenv('GLPI_CACHE_ANNUAIRE_TTL', '10 min')
+    monkeypatch.setenv('GLPI_ENVOIS_PARALLELES', 'quatre')
+    assert gta.GLPIManager(glpi.config).duree_cache_annuaire == 600
+    pipeline = gta.PipelineTicket(glpi, gta.PerplexityReformulator(gta.PerplexityConfig()))
+    try:
+        assert pipeline.envois._max_workers == 4
+    finally:
+        pipeline.fermer()
@@ -0,0 +1,33 @@
+"""Démarrage : requests n'est importé que par les objets qui parlent HTTP"""
+
+import os
+import subprocess
+import sys
+
+from conftest import CHEMIN_SCRIPT
+
+
+def executer(code: str, **environnement: str) -> str:
+    prologue = ("import importlib.util, sys\n"
+                f"spec = importlib.util.spec_from_file_location('gta', {str(CHEMIN_SCRIPT)!r})\n"
+                "gta = importlib.util.module_from_spec(spec)\n"
+                "spec.loader.exec_module(gta)\n")
+    return subprocess.run([sys.executable, '-c', prologue + code], capture_output=True, text=True,
+                          check=True, timeout=60, env=dict(os.environ, **environnement)).stdout
+
+
+def test_import_sans_requests():
+    assert executer("print('requests' in sys.modules)").strip() == 'False'
+
+
+def test_requests_importe_par_le_client_glpi():
+    sortie = executer("gta.GLPIManager(gta.GLPIConfig())\n"
+                      "print('requests' in sys.modules, issubclass(gta.CircuitOuvert, gta.requests.RequestException))",
+                      GLPI_APP_TOKEN='jeton', GLPI_USER_TOKEN='jeton')
+    assert sortie.strip() == 'True True'
+
+
+def test_aide_sans_requests():
+    sortie = subprocess.run([sys.executable, '-X', 'importtime', str(CHEMIN_SCRIPT), '--help'],
+                            capture_output=True, text=True, timeout=60)
+    assert sortie.returncode == 0 and '| requests' not in sortie.stderr
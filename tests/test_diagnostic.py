@@ -0,0 +1,38 @@
+"""DiagnosticConnexions : sondes à travers le mandataire et les certificats de requests"""
+
+import shutil
+
+import pytest
+
+
+def test_sonde_a_travers_le_mandataire(gta, simulation, monkeypatch):
+    # Le serveur simulé sert de mandataire HTTP : il reçoit l'URL complète et y répond
+    monkeypatch.setenv('HTTP_PROXY', simulation.url)
+    monkeypatch.setenv('NO_PROXY', '')
+    monkeypatch.setenv('no_proxy', '')
+    diagnostic = gta.DiagnosticConnexions(echantillons=1, delai=5)
+    assert diagnostic.mandataire('http://glpi.invalid/apirest.php') == simulation.url
+
+    mesure = diagnostic.mesurer_requete('http://glpi.invalid/apirest.php/initSession',
+                                        entetes={'Authorization': 'user_token simulation', 'App-Token': 'x'})
+    assert 'echec' not in mesure, mesure.get('echec')
+    assert b'session_token' in mesure['contenu']
+
+
+def test_mandataire_exclu_par_no_proxy(gta, isolation, monkeypatch):
+    monkeypatch.setenv('HTTPS_PROXY', 'http://mandataire.invalid:3128')
+    monkeypatch.setenv('NO_PROXY', 'glpi.local')
+    monkeypatch.delenv('no_proxy', raising=False)
+    assert gta.DiagnosticConnexions.mandataire('https://glpi.local/apirest.php') is None
+    assert gta.DiagnosticConnexions.mandataire('https://api.perplexity.ai/') == 'http://mandataire.invalid:3128'
+
+
+def test_certificats_de_requests_ca_bundle(gta, isolation, monkeypatch):
+    bundle = isolation / 'ca.pem'
+    gta.importer_http()
+    shutil.copy(gta.requests.utils.DEFAULT_CA_BUNDLE_PATH, bundle)
+    monkeypatch.setenv('REQUESTS_CA_BUNDLE', str(bundle))
+    assert gta.DiagnosticConnexions.contexte_tls().cert_store_stats()['x509_ca'] > 0
+    bundle.write_text('')
+    with pytest.raises(gta.ssl.SSLError):
+        gta.DiagnosticConnexions.contexte_tls()
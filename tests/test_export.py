@@ -0,0 +1,82 @@
+"""ExportTickets : tranches d'identifiants, suppressions pendant l'export et reprise"""
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def serveur(gta, isolation, monkeypatch):
+    serveur = gta.ServeurSimulation(utilisateurs=20, entites=5, categories=5, tickets=120).demarrer()
+    monkeypatch.setenv('GLPI_API_URL', f"{serveur.url}/apirest.php")
+    monkeypatch.setenv('GLPI_APP_TOKEN', 'simulation')
+    monkeypatch.setenv('GLPI_USER_TOKEN', 'simulation')
+    yield serveur
+    serveur.arreter()
+
+
+@pytest.fixture
+def glpi(gta, serveur):
+    gestionnaire = gta.GLPIManager(gta.GLPIConfig())
+    assert gestionnaire.authentification()
+    yield gestionnaire
+    gestionnaire.fermer_session()
+
+
+def supprimer(serveur, *identifiants):
+    with serveur.verrou:
+        serveur.donnees['Ticket'] = [t for t in serveur.donnees['Ticket'] if t['id'] not in identifiants]
+        for identifiant in identifiants:
+            serveur.par_id['Ticket'].pop(identifiant, None)
+        serveur.recherches.clear()
+
+
+def exportes(chemin):
+    return [json.loads(ligne)['id'] for ligne in chemin.read_text().splitlines()]
+
+
+def test_suppression_pendant_l_export_ne_saute_aucun_ticket(gta, serveur, glpi, isolation, monkeypatch):
+    lire_page = glpi.lire_page_recherche
+    appels = []
+
+    def lire_puis_supprimer(*args, **kwargs):
+        resultat = lire_page(*args, **kwargs)
+        appels.append(1)
+        if len(appels) == 1:
+            supprimer(serveur, 3, 4)  # Décalerait toutes les pages suivantes d'une pagination par décalage
+        return resultat
+
+    monkeypatch.setattr(glpi, 'lire_page_recherche', lire_puis_supprimer)
+    sortie = isolation / 'tickets.jsonl'
+    resultats = gta.ExportTickets(glpi, str(sortie), paralleles=3, taille_page=10).executer()
+
+    assert exportes(sortie) == list(range(1, 121))
+    assert resultats['tickets'] == 120 and resultats['dernier_id'] == 120
+
+
+def test_reprise_apres_interruption(gta, serveur, glpi, isolation, monkeypatch):
+    lire_page = glpi.lire_page_recherche
+    appels = []
+
+    def lire_puis_couper(*args, **kwargs):
+        appels.append(1)
+        if len(appels) == 6:
+            raise gta.requests.ConnectionError("coupure")
+        return lire_page(*args, **kwargs)
+
+    sortie = isolation / 'tickets.jsonl'
+    monkeypatch.setattr(glpi, 'lire_page_recherche', lire_puis_couper)
+    with pytest.raises(gta.requests.ConnectionError):
+        gta.ExportTickets(glpi, str(sortie), paralleles=1, taille_page=10).executer()
+    reprise = json.loads((isolation / 'tickets.jsonl.reprise.json').read_text())
+    assert not reprise['termine'] and reprise['dernier_id'] == exportes(sortie)[-1]
+
+    monkeypatch.setattr(glpi, 'lire_page_recherche', lire_page)
+    supprimer(serveur, reprise['dernier_id'] + 1)
+    gta.ExportTickets(glpi, str(sortie), paralleles=2, taille_page=10).executer()
+    assert exportes(sortie) == [i for i in range(1, 121) if i != reprise['dernier_id'] + 1]
+
+    # Relancé avec les mêmes filtres : seuls les tickets créés depuis sont ajoutés
+    assert glpi.creer_ticket({'name': 'Nouveau', 'content': 'Nouveau', 'entities_id': 0, 'type': 1}) == 121
+    resultats = gta.ExportTickets(glpi, str(sortie), paralleles=2, taille_page=10).executer()
+    assert resultats['tickets'] == 1 and exportes(sortie)[-1] == 121
@@ -0,0 +1,120 @@
+"""ImportParallele : contre-pression entre la lecture de la source et l'étage réseau"""
+
+import threading
+import time
+
+
+def preparer(cle, brut):
+    return (cle, {'brut': brut}, None) if brut != 'invalide' else (cle, None, 'invalide')
+
+
+def test_la_lecture_s_interrompt_quand_l_etage_reseau_ralentit(gta):
+    lus, en_cours, maximum = [], [], []
+    debloquer = threading.Event()
+    verrou = threading.Lock()
+
+    def source():
+        for numero in range(1000):
+            lus.append(numero)
+            yield numero, f"ligne {numero}"
+
+    def traiter(cle, informations):
+        with verrou:
+            en_cours.append(cle)
+            maximum.append(len(en_cours))
+        debloquer.wait(10)
+        with verrou:
+            en_cours.remove(cle)
+        return {'ticket_id': cle + 1}
+
+    import_parallele = gta.ImportParallele(preparer, traiter, lambda cle, erreur: None,
+                                           processus=0, paralleles=2, taille_paquet=1)
+    resultat = {}
+    fil = threading.Thread(target=lambda: resultat.update(import_parallele.executer(source())))
+    fil.start()
+    try:
+        time.sleep(0.5)
+        # 2×paralleles tickets en attente, un paquet dans l'aiguillage, 2 en file et un en lecture
+        assert len(lus) <= 2 * 2 + 4
+        lus_bloque = len(lus)
+        time.sleep(0.3)
+        assert len(lus) == lus_bloque
+    finally:
+        debloquer.set()
+        fil.join(10)
+    assert not fil.is_alive()
+    assert resultat == {'lus': 1000, 'ignores': 0, 'crees': 1000, 'echecs': 0}
+    assert max(maximum) <= 2
+
+
+def test_refus_ignores_et_echecs_comptes(gta):
+    rejets = []
+
+    def traiter(cle, informations):
+        if cle == 3:
+            raise RuntimeError("GLPI indisponible")
+        return {'ticket_id': cle if cle != 4 else None}
+
+    enregistrements = [(1, 'a'), (2, 'invalide'), (3, 'b'), (4, 'c'), (5, 'd'), (6, 'e')]
+    compteurs = gta.ImportParallele(preparer, traiter, lambda cle, erreur: rejets.append((cle, erreur)),
+                                    paralleles=3, taille_paquet=2,
+                                    ignorer=lambda cle: cle == 6).executer(iter(enregistrements))
+
+    assert rejets == [(2, 'invalide')]
+    assert compteurs == {'lus': 6, 'ignores': 1, 'crees': 2, 'echecs': 3}
+
+
+def test_erreur_de_l_aiguillage_relevee_sans_bloquer(gta):
+    lus = []
+
+    def source():
+        for numero in range(100):
+            lus.append(numero)
+            yield numero, f"ligne {numero}"
+
+    def ignorer(cle):
+        if cle == 2:
+            raise OSError("registre des tickets déjà créés illisible")
+        return False
+
+    import_parallele = gta.ImportParallele(preparer, lambda cle, informations: {'ticket_id': cle},
+                                           lambda cle, erreur: None, paralleles=1, taille_paquet=1,
+                                           ignorer=ignorer)
+    erreurs = []
+
+    def executer():
+        try:
+            import_parallele.executer(source())
+        except OSError as e:
+            erreurs.append(e)
+
+    fil = threading.Thread(target=executer, daemon=True)
+    fil.start()
+    fil.join(10)
+    assert not fil.is_alive()
+    assert [str(e) for e in erreurs] == ["registre des tickets déjà créés illisible"]
+    assert len(lus) < 100  # La lecture s'arrête dès l'erreur
+
+
+def test_preparation_dans_un_pool_de_processus(gta, tmp_path, monkeypatch):
+    # Les processus spawn réimportent le script par son nom de module
+    (tmp_path / 'glpi_ticket_automation.py').symlink_to(gta.__file__)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    resultats, rejets = [], []
+    lignes = [(1, '{"titre": "Copieur HS", "nom_appelant": "Jean Dupont", "telephone": "0123456789", '
+                  '"description": "Bourrage", "demandeur": "jdupont"}'),
+              (2, '[1, 2]'),
+              (3, '{"titre": "Écran noir", "nom_appelant": "Marie Curie", "telephone": "0698765432", '
+                  '"description": "Plus d\'image", "demandeur": "mcurie"}')]
+
+    def traiter(cle, informations):
+        resultats.append((cle, informations['titre']))
+        return {'ticket_id': cle}
+
+    compteurs = gta.ImportParallele(gta.PipelineTicket.preparer, traiter,
+                                    lambda cle, erreur: rejets.append((cle, erreur)),
+                                    processus=2, paralleles=1, taille_paquet=1).executer(iter(lignes))
+
+    assert compteurs == {'lus': 3, 'ignores': 0, 'crees': 2, 'echecs': 1}
+    assert resultats == [(1, 'Copieur HS'), (3, 'Écran noir')]
+    assert rejets == [(2, 'Un objet JSON est attendu')]
@@ -0,0 +1,55 @@
+"""IndexHierarchique : recherche par préfixe, accents, fautes de frappe et classement"""
+
+import pytest
+
+CHEMINS = [
+    (1, 'Matériel'),
+    (2, 'Matériel > Copieur'),
+    (3, 'Matériel > Copieur > Bourrage papier'),
+    (4, 'Matériel > Imprimante > Bourrage'),
+    (5, 'Logiciel > Messagerie'),
+    (6, 'Réseau > Wifi > Copieur connecté'),
+]
+
+
+@pytest.fixture
+def index(gta):
+    index = gta.IndexHierarchique()
+    index.construire(CHEMINS)
+    return index
+
+
+def ids(resultats):
+    return [element_id for element_id, _ in resultats]
+
+
+def test_prefixe_sans_accents(index):
+    assert set(ids(index.rechercher('mess'))) == {5}
+    assert set(ids(index.rechercher('reseau'))) == {6}
+
+
+def test_tous_les_termes_sont_requis(index):
+    assert set(ids(index.rechercher('copieur bourr'))) == {3}
+    assert index.rechercher('copieur messagerie') == []
+
+
+def test_faute_de_frappe(index):
+    assert 5 in ids(index.rechercher('mesagerie'))
+
+
+def test_feuille_exacte_puis_profondeur(index):
+    # La feuille nommée exactement comme la requête passe avant les chemins qui la contiennent
+    assert ids(index.rechercher('copieur'))[0] == 2
+    assert ids(index.rechercher('bourrage')) == [4, 3]
+
+
+def test_filtrage_incremental(index):
+    candidats = index.filtrer('materiel')
+    assert candidats == {0, 1, 2, 3}
+    assert index.filtrer('imprimante', candidats) == {3}
+
+
+def test_limite_et_reconstruction(index):
+    assert len(index.rechercher('', limite=2)) == 2
+    index.construire([(9, 'Autre')])
+    assert len(index) == 1 and ids(index.rechercher('autre')) == [9]
@@ -0,0 +1,23 @@
+"""InstancesGLPI : instance principale et profils nommés"""
+
+
+def test_premier_profil_garde_l_instance_principale(gta, simulation, monkeypatch):
+    monkeypatch.setenv('GLPI_PROFILS', 'nord')
+    for variable in ('API_URL', 'APP_TOKEN', 'USER_TOKEN'):
+        monkeypatch.setenv(f'GLPI_NORD_{variable}', gta.os.environ[f'GLPI_{variable}'])
+    assert gta.GLPIConfig.instances() == [None, 'nord']
+
+    instances = gta.InstancesGLPI(gta.PerplexityReformulator(gta.PerplexityConfig()))
+    try:
+        assert list(instances.glpi) == [None, 'nord']
+        assert instances.principal.profil is None
+    finally:
+        instances.fermer_sessions()
+
+
+def test_profils_seuls_et_instance_forcee(gta, isolation, monkeypatch):
+    monkeypatch.delenv('GLPI_USER_TOKEN', raising=False)
+    monkeypatch.setenv('GLPI_PROFILS', 'nord,sud')
+    assert gta.GLPIConfig.instances() == ['nord', 'sud']
+    monkeypatch.setenv('GLPI_INSTANCE', 'sud')
+    assert gta.GLPIConfig.instances() == ['sud']
@@ -0,0 +1,44 @@
+"""MasqueurDonnees : masquage local avant Perplexity et restauration"""
+
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def masqueur(gta):
+    annuaire = SimpleNamespace(
+        annuaire_utilisateurs=[gta.FicheUtilisateur(1, 'normal', 'Martin', 'Sarah'),
+                               gta.FicheUtilisateur(2, 'tech', 'Durand', 'Paul'),
+                               gta.FicheUtilisateur(3, 'support', '', 'Luc')],
+        toutes_entites={10: gta.FicheEntite(10, 'COPIEUR', 'Racine > COPIEUR'),
+                        11: gta.FicheEntite(11, 'Support', 'Racine > Support')})
+    masqueur = gta.MasqueurDonnees()
+    masqueur.associer_annuaires(annuaire)
+    return masqueur
+
+
+def test_mots_courants_intacts(masqueur):
+    texte = "Le copieur ne fonctionne pas normal, le tech du support est passé"
+    assert masqueur.masquer(texte) == (texte, {})
+
+
+def test_paires_prenom_nom_de_l_annuaire(masqueur):
+    masque, correspondances = masqueur.masquer("Appel de Sarah Martin puis de DURAND Paul. Martin rappellera.")
+    assert masque == "Appel de [NOM_1] puis de [NOM_2]. Martin rappellera."
+    assert correspondances == {'[NOM_1]': 'Sarah Martin', '[NOM_2]': 'DURAND Paul'}
+
+
+def test_termes_du_ticket_email_et_telephone(masqueur):
+    texte = "Jean Dupont (jean.dupont@exemple.fr, 06 12 34 56 78) : Dupont signale un bourrage"
+    masque, correspondances = masqueur.masquer(texte, ('Jean Dupont',))
+    assert masque == "[NOM_1] ([EMAIL_1], [TEL_1]) : [NOM_2] signale un bourrage"
+    assert masqueur.restaurer(masque, correspondances) == texte
+
+
+def test_references_inconnues_conservees(masqueur):
+    assert masqueur.restaurer("Voir [NOM_3] et [NOM_1]", {'[NOM_1]': 'Sarah Martin'}) == "Voir [NOM_3] et Sarah Martin"
+
+
+def test_desactive(gta):
+    assert gta.MasqueurDonnees(actif=False).masquer("Sarah Martin 0612345678") == ("Sarah Martin 0612345678", {})
@@ -0,0 +1,85 @@
+"""PipelineTicket : contrôles de valider et création de bout en bout contre le serveur simulé"""
+
+import pytest
+
+
+def informations(**champs):
+    valeurs = {'titre': 'Copieur HS', 'nom_appelant': 'Jean Dupont', 'telephone': '01 23 45 67 89',
+               'description': 'Bourrage papier bac 2', 'demandeur': 'inconnu', 'reformuler': False}
+    valeurs.update(champs)
+    return valeurs
+
+
+class TestValider:
+    def test_normalise_les_champs_optionnels(self, gta):
+        resultat = gta.PipelineTicket.valider(informations(email='', type_ticket=2, pieces_jointes='a.png'))
+        assert resultat['email'] == 'Non renseigné'
+        assert resultat['type_ticket'] == '2' and resultat['type_ticket_nom'] == 'Demande'
+        assert resultat['pieces_jointes'] == ['a.png']
+
+    @pytest.mark.parametrize('champs, message', [
+        ({'titre': ''}, 'manquants: titre'),
+        ({'telephone': 123456789}, 'en texte: telephone'),
+        ({'demandeur': ['jdupont']}, 'en texte: demandeur'),
+        ({'telephone': '12'}, 'téléphone invalide'),
+        ({'email': 'pas-un-email'}, "email invalide"),
+        ({'type_ticket': '3'}, 'type de ticket invalide'),
+        ({'pieces_jointes': [1]}, 'pieces_jointes'),
+        ({'resolu_en_ligne': True}, 'demande une solution'),
+    ])
+    def test_refuse_les_informations_invalides(self, gta, champs, message):
+        with pytest.raises(ValueError, match=f"(?i){message}"):
+            gta.PipelineTicket.valider(informations(**champs))
+
+    def test_preparer_ne_leve_pas(self, gta):
+        assert gta.PipelineTicket.preparer(3, '[1, 2]') == (3, None, 'Un objet JSON est attendu')
+        numero, valide, erreur = gta.PipelineTicket.preparer(4, '{"titre": "x"}')
+        assert valide is None and 'manquants' in erreur
+
+
+class TestTraiter:
+    def test_cree_le_ticket_pour_le_demandeur_connu(self, simulation, pipeline):
+        utilisateur = simulation.donnees['User'][5]
+        resultat = pipeline.traiter(informations(demandeur=utilisateur['name'], technicien_id=7))
+
+        assert resultat['ticket_id'] and not resultat['erreurs']
+        assert resultat['user_id'] == utilisateur['id']
+        ticket = simulation.par_id['Ticket'][resultat['ticket_id']]
+        assert ticket['name'] == 'Copieur HS' and ticket['status'] == 1
+        assert 'Bourrage papier bac 2' in ticket['content']
+
+    def test_demandeur_inconnu_entite_racine(self, simulation, pipeline):
+        resultat = pipeline.traiter(informations(demandeur='personne-inconnue', technicien_id=7))
+        assert resultat['ticket_id'] and resultat['user_id'] is None and resultat['entity_id'] == 1
+
+    def test_solution_et_cloture(self, simulation, pipeline):
+        resultat = pipeline.traiter(informations(solution='Bac nettoyé', cloturer=True, technicien_id=7))
+        assert resultat['solution_ajoutee'] and resultat['cloture']
+        assert simulation.par_id['Ticket'][resultat['ticket_id']]['status'] == 6
+
+    def test_informations_invalides(self, pipeline):
+        with pytest.raises(ValueError):
+            pipeline.traiter(informations(telephone=123))
+
+    @pytest.mark.parametrize('champs', [{'cloturer': True}, {'resolu_en_ligne': True}])
+    def test_solution_refusee_le_ticket_reste_ouvert(self, gta, simulation, pipeline, monkeypatch, champs):
+        monkeypatch.setattr(pipeline.glpi, 'ajouter_solution', lambda ticket_id, solution: False)
+        resultat = pipeline.traiter(informations(solution='Bac nettoyé', technicien_id=7, **champs))
+
+        assert resultat['ticket_id'] and not resultat['solution_ajoutee'] and not resultat.get('cloture')
+        assert any('resté ouvert' in erreur for erreur in resultat['erreurs'])
+        ticket = simulation.par_id['Ticket'][resultat['ticket_id']]
+        assert ticket['status'] == 1 and not ticket.get('is_deleted')
+
+        ligne, = gta.obtenir_journal().rechercher('Copieur')
+        assert ligne['ticket_id'] == resultat['ticket_id'] and ligne['erreurs'] == resultat['erreurs']
+
+    def test_metriques_ticket_non_cree(self, gta, simulation, pipeline, monkeypatch, caplog):
+        monkeypatch.setattr(pipeline.glpi, 'creer_ticket', lambda ticket_data: None)
+        with caplog.at_level('INFO', logger=gta.logger.name):
+            resultat = pipeline.traiter(informations(technicien_id=7))
+
+        assert resultat['ticket_id'] is None
+        assert gta.metriques.erreurs.get('pipeline_ticket') == 1
+        # Durées par étape en DEBUG seulement : pas de ligne ⏱️ par ticket dans le journal d'exploitation
+        assert not [r for r in caplog.records if '⏱️' in r.getMessage()]
@@ -0,0 +1,67 @@
+"""ServiceTickets : pièces jointes reçues par POST /tickets limitées à SERVICE_DOSSIER_PIECES, routes GET"""
+
+import os
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def service(gta, simulation):
+    """Fabrique de services (créés après les réglages du test), fermés en fin de test"""
+    services = []
+
+    def creer():
+        services.append(gta.ServiceTickets())
+        return services[-1]
+
+    yield creer
+    for service in services:
+        service.pipeline.fermer_sessions()
+
+
+def test_pieces_jointes_refusees_sans_dossier(service):
+    with pytest.raises(ValueError, match='SERVICE_DOSSIER_PIECES'):
+        service().verifier_pieces_jointes({'pieces_jointes': ['/etc/passwd']})
+    assert service().verifier_pieces_jointes({'titre': 'x'}) == {'titre': 'x'}
+
+
+def test_pieces_jointes_contenues_dans_le_dossier(service, isolation, monkeypatch):
+    dossier = isolation / 'pieces'
+    dossier.mkdir()
+    (dossier / 'ecran.png').write_bytes(b'png')
+    os.symlink('/etc/passwd', dossier / 'lien')
+    monkeypatch.setenv('SERVICE_DOSSIER_PIECES', str(dossier))
+    service = service()
+
+    donnees = service.verifier_pieces_jointes({'pieces_jointes': 'ecran.png'})
+    assert donnees['pieces_jointes'] == [os.path.realpath(dossier / 'ecran.png')]
+    for piece in ('../journal_tickets.db', '/etc/passwd', 'lien', '.'):
+        with pytest.raises(ValueError):
+            service.verifier_pieces_jointes({'pieces_jointes': [piece]})
+
+
+def test_fermer_arrete_le_pool_d_envois(gta, glpi):
+    pipeline = gta.PipelineTicket(glpi, gta.PerplexityReformulator(gta.PerplexityConfig()))
+    pipeline.fermer()
+    with pytest.raises(RuntimeError):
+        pipeline.envois.submit(print)
+
+
+def test_limite_du_journal_validee(gta, service):
+    serveur = gta.serveur_http(('127.0.0.1', 0), gta.GestionnaireRequetesService)
+    serveur.service = service()
+    threading.Thread(target=serveur.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{serveur.server_address[1]}/journal"
+        for limite in ('abc', '0', '-3', '1.5'):
+            reponse = gta.requests.get(url, params={'limite': limite}, timeout=5)
+            assert reponse.status_code == 400 and 'limite' in reponse.json()['erreur']
+
+        for ticket_id in (1, 2):
+            serveur.service.pipeline.journal.enregistrer({'titre': 'Copieur HS'}, {'ticket_id': ticket_id})
+        reponse = gta.requests.get(url, params={'limite': 10 ** 9}, timeout=5)
+        assert reponse.status_code == 200 and len(reponse.json()) == 2
+    finally:
+        serveur.shutdown()
+        serveur.server_close()
@@ -0,0 +1,76 @@
+"""SurveillanceTickets : filigrane, périmètre journal et cycles tout ou rien"""
+
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def tickets(glpi):
+    return [glpi.creer_ticket({'name': f"Ticket {i}", 'content': 'x', 'entities_id': 0, 'type': 1})
+            for i in range(2)]
+
+
+@pytest.fixture
+def surveillance(gta, glpi, tickets, isolation):
+    journal = SimpleNamespace(tickets_crees=lambda apres, instance: (tickets, 1))
+    return gta.SurveillanceTickets(glpi, journal, fichier_etat=str(isolation / 'etat.json'))
+
+
+def modifier(simulation, ticket_id, statut, secondes):
+    with simulation.verrou:
+        ticket = simulation.par_id['Ticket'][ticket_id]
+        ticket['status'] = statut
+        ticket['date_mod'] = (datetime.now() + timedelta(seconds=secondes)).strftime('%Y-%m-%d %H:%M:%S')
+        simulation.recherches.clear()
+
+
+def evenements(capsys):
+    return [json.loads(ligne) for ligne in capsys.readouterr().out.splitlines()]
+
+
+def test_cycle_en_echec_sans_perte_d_evenement(gta, glpi, simulation, surveillance, tickets, capsys, monkeypatch):
+    assert surveillance.cycle() == 0  # Tickets journalisés à l'état Nouveau : rien à signaler
+    filigrane = surveillance.etat['filigrane']
+    for ticket_id in tickets:
+        modifier(simulation, ticket_id, 2, 5)
+
+    lister = glpi.lister_sous_items
+
+    def lister_en_echec(itemtype, item_id, sous_itemtype):
+        if item_id == tickets[1]:
+            raise gta.requests.ConnectionError("coupure")
+        return lister(itemtype, item_id, sous_itemtype)
+
+    monkeypatch.setattr(glpi, 'lister_sous_items', lister_en_echec)
+    with pytest.raises(gta.requests.ConnectionError):
+        surveillance.cycle()
+    assert evenements(capsys) == []
+    assert surveillance.etat['filigrane'] == filigrane
+    assert all(surveillance.tickets[str(t)]['status'] == 1 for t in tickets)
+
+    monkeypatch.setattr(glpi, 'lister_sous_items', lister)
+    assert surveillance.cycle() == 2
+    emis = evenements(capsys)
+    assert sorted(e['ticket_id'] for e in emis) == sorted(tickets)
+    assert {(e['ancien'], e['nouveau']) for e in emis} == {(1, 2)}
+    assert surveillance.etat['filigrane'] > filigrane
+    assert surveillance.cycle() == 0  # Recouvrement du filigrane : pas de doublon
+
+
+def test_perimetre_journal_borne_aux_tickets_suivis(gta, glpi, simulation, surveillance, tickets, capsys):
+    surveillance.cycle()
+    capsys.readouterr()
+    autre = glpi.creer_ticket({'name': 'Autre', 'content': 'x', 'entities_id': 0, 'type': 1})
+    modifier(simulation, autre, 2, 5)
+    modifier(simulation, tickets[0], 6, 5)  # Clos : sort de la plage recherchée
+    modifies, _ = surveillance._modifications()
+    assert tickets[0] in [int(ligne['2']) for ligne in modifies]
+    assert surveillance.cycle() == 1
+    modifier(simulation, tickets[0], 6, 10)
+    modifier(simulation, tickets[1], 2, 10)
+    modifier(simulation, autre, 3, 10)
+    # Ticket clos hors de la plage, ticket étranger après le dernier suivi : non téléchargés
+    assert [int(ligne['2']) for ligne in surveillance._modifications()[0]] == [tickets[1]]